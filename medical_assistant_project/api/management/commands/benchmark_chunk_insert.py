@@ -0,0 +1,45 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import Document, DocumentChunk, StandardType
+from api.utils import chunk_insert
+
+EMBEDDING_DIMENSIONS = 384
+METHODS = ['orm', 'values', 'copy']
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks DocumentChunk insertion (bulk_create vs execute_values vs binary COPY) in rows/sec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Synthetic chunks inserted per method')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per statement for orm/values')
+        parser.add_argument('--methods', nargs='+', choices=METHODS, default=METHODS)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        text = ("Clinical staff must verify patient identity before administering medication. " * 11)[:900]
+        embeddings = [[random.random() for _ in range(EMBEDDING_DIMENSIONS)] for _ in range(min(rows, 1000))]
+
+        # Everything runs in one transaction that is rolled back, so no benchmark rows are kept
+        with transaction.atomic():
+            standard_type = StandardType.objects.create(name='benchmark-chunk-insert', is_deleted=True)
+            document = Document.objects.create(
+                file_name='benchmark.pdf', standard_type=standard_type, supabase_storage_path='benchmark/none'
+            )
+            for method in options['methods']:
+                chunks = [
+                    DocumentChunk(
+                        document=document,
+                        chunk_text=text,
+                        embedding=embeddings[i % len(embeddings)],
+                        metadata={'chunk_index': i, 'page': i // 4 + 1}
+                    )
+                    for i in range(rows)
+                ]
+                start = time.perf_counter()
+                chunk_insert.insert_chunks(chunks, method=method, batch_size=options['batch_size'])
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{method:<7} {rows} rows in {elapsed:.2f}s = {rows / elapsed:,.0f} rows/sec")
+            transaction.set_rollback(True)
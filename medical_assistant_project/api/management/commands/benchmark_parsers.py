@@ -0,0 +1,116 @@
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from api.services import document_processor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def _peak_rss_mb():
+    """Peak resident set size of the current process in MB (None if unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_backend(backend, paths, results):
+    """
+    Parses every file with one backend and reports throughput and memory growth.
+    The backend is called directly, bypassing the parallel PDF pool that
+    iter_document_pages uses for long files, so every figure is for a single
+    process parsing sequentially.
+    """
+    parse_pages = document_processor.PARSER_BACKENDS[backend]
+    baseline_rss = _peak_rss_mb()
+    pages = 0
+    chars = 0
+    elapsed = 0.0
+    errors = 0
+    for path in paths:
+        file_content = Path(path).read_bytes()
+        start = time.perf_counter()
+        try:
+            for _, text in parse_pages(file_content):
+                pages += 1
+                chars += len(text)
+        except Exception:
+            errors += 1
+        elapsed += time.perf_counter() - start
+        del file_content
+
+    peak_rss = _peak_rss_mb()
+    results.put({
+        'backend': backend,
+        'files': len(paths),
+        'errors': errors,
+        'pages': pages,
+        'chars': chars,
+        'seconds': elapsed,
+        'peak_rss_growth_mb': (peak_rss - baseline_rss) if peak_rss is not None else None,
+    })
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the document parser backends over a folder of sample files (pages/sec and peak memory)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder', help='Folder containing sample PDF/DOCX files')
+        parser.add_argument(
+            '--backends', nargs='+', choices=list(document_processor.PARSER_BACKENDS.keys()),
+            help='Backends to benchmark (default: all available)'
+        )
+
+    def handle(self, *args, **options):
+        folder = Path(options['folder'])
+        if not folder.is_dir():
+            raise CommandError(f"{folder} is not a directory")
+
+        files_by_extension = {}
+        for path in sorted(folder.rglob('*')):
+            extension = path.suffix.lower()
+            if path.is_file() and extension in document_processor.BACKENDS_BY_EXTENSION:
+                files_by_extension.setdefault(extension, []).append(str(path))
+        if not files_by_extension:
+            raise CommandError(f"No PDF or DOCX files found in {folder}")
+
+        # Each backend runs in a forked child so its peak memory is measured in isolation
+        use_fork = 'fork' in multiprocessing.get_all_start_methods()
+        if not use_fork:
+            self.stdout.write(self.style.WARNING('fork is unavailable; running in-process, memory figures are cumulative'))
+
+        for extension, paths in files_by_extension.items():
+            backends = document_processor.available_backends(extension)
+            if options['backends']:
+                backends = [b for b in backends if b in options['backends']]
+            for backend in backends:
+                if use_fork:
+                    context = multiprocessing.get_context('fork')
+                    results = context.Queue()
+                    process = context.Process(target=_run_backend, args=(backend, paths, results))
+                    process.start()
+                    result = results.get()
+                    process.join()
+                else:
+                    results = multiprocessing.Queue()
+                    _run_backend(backend, paths, results)
+                    result = results.get()
+                self._report(extension, result)
+
+    def _report(self, extension, result):
+        seconds = result['seconds'] or 1e-9
+        memory = (
+            f"{result['peak_rss_growth_mb']:.1f} MB" if result['peak_rss_growth_mb'] is not None else 'n/a'
+        )
+        self.stdout.write(
+            f"{extension} {result['backend']:<8} files={result['files']} errors={result['errors']} "
+            f"pages={result['pages']} time={result['seconds']:.2f}s "
+            f"pages/sec={result['pages'] / seconds:.1f} chars/sec={result['chars'] / seconds:.0f} "
+            f"peak_rss_growth={memory}"
+        )
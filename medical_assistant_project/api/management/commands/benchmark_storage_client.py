@@ -0,0 +1,59 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from supabase import create_client
+from api.services import document_processor
+from api.utils import supabase_client
+from api.utils.ingestion_metrics import percentile
+
+
+def _fresh_client():
+    """A client built per request, as every storage call did before clients were pooled."""
+    return create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_KEY"))
+
+
+class Command(BaseCommand):
+    help = 'Measures per-request storage download latency with a fresh client per request versus the pooled client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('storage_path', help='Path of an existing file in the documents bucket')
+        parser.add_argument('--requests', type=int, default=20, help='Downloads per mode (default: 20)')
+        parser.add_argument(
+            '--interval', type=float, default=0.0,
+            help='Seconds to wait between downloads, to test keep-alive expiry (default: 0)'
+        )
+        parser.add_argument('--bucket', default=document_processor.DOCUMENTS_BUCKET)
+
+    def handle(self, *args, **options):
+        if not os.environ.get("SUPABASE_URL") or not os.environ.get("SUPABASE_SERVICE_KEY"):
+            raise CommandError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set")
+        if options['requests'] < 1:
+            raise CommandError("--requests must be at least 1")
+
+        results = {}
+        for mode, get_client in (('fresh', _fresh_client), ('pooled', supabase_client.get_supabase_client)):
+            timings = []
+            size = 0
+            for i in range(options['requests']):
+                if i and options['interval']:
+                    time.sleep(options['interval'])
+                start = time.perf_counter()
+                try:
+                    size = len(get_client().storage.from_(options['bucket']).download(options['storage_path']))
+                except Exception as e:
+                    raise CommandError(f"Download of {options['storage_path']} failed: {e}")
+                timings.append((time.perf_counter() - start) * 1000)
+            results[mode] = timings
+            self.stdout.write(
+                f"{mode:<7} requests={len(timings)} bytes={size} "
+                f"mean={sum(timings) / len(timings):.1f}ms p50={percentile(timings, 0.5):.1f}ms "
+                f"p95={percentile(timings, 0.95):.1f}ms first={timings[0]:.1f}ms"
+            )
+
+        saving = percentile(results['fresh'], 0.5) - percentile(results['pooled'], 0.5)
+        self.stdout.write(self.style.SUCCESS(f"Median saving per download: {saving:.1f}ms"))
+        stats = supabase_client.get_pool_stats()
+        self.stdout.write(
+            f"pooled client: requests={stats['requests']} new_connections={stats['new_connections']} "
+            f"tls_handshakes={stats['tls_handshakes']} connect_ms_total={stats['connect_ms_total']}"
+        )
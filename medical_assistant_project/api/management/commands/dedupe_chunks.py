@@ -0,0 +1,123 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import DocumentChunk
+from api.utils import minhash
+
+# Chunks of linked duplicate documents hold no vector of their own; their canonical_chunk link is fixed
+_scanned_chunks = DocumentChunk.objects.filter(embedding__isnull=False)
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # The lower index (older chunk) stays the root, so it becomes the canonical chunk
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+class Command(BaseCommand):
+    help = 'Reports near-duplicate document chunks (MinHash/LSH) and optionally collapses them onto a canonical chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collapse', action='store_true', help='Point each duplicate at its canonical chunk')
+        parser.add_argument('--backfill', action='store_true', help='Compute missing signatures for older chunks first')
+        parser.add_argument(
+            '--threshold', type=float, default=minhash.NEAR_DUPLICATE_THRESHOLD,
+            help='Estimated Jaccard similarity at which chunks count as duplicates'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--show', type=int, default=10, help='Largest duplicate groups to list')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['backfill']:
+            self._backfill(batch_size)
+
+        missing = _scanned_chunks.filter(minhash__isnull=True).count()
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f"{missing} chunk(s) have no signature and are skipped; run with --backfill to include them"
+            ))
+
+        # Oldest first, so the earliest copy of a passage becomes the canonical chunk
+        ids = []
+        signatures = []
+        rows = (
+            _scanned_chunks.filter(minhash__isnull=False)
+            .order_by('created_at', 'id')
+            .values_list('id', 'minhash')
+            .iterator(chunk_size=batch_size)
+        )
+        for chunk_id, signature in rows:
+            ids.append(chunk_id)
+            signatures.append(bytes(signature))
+
+        groups = self._find_groups(signatures, options['threshold'])
+        duplicate_count = sum(len(members) - 1 for members in groups.values())
+        self.stdout.write(
+            f"{len(ids)} chunks scanned: {len(groups)} duplicate group(s), "
+            f"{duplicate_count} redundant chunk(s) ({duplicate_count / max(len(ids), 1):.1%})"
+        )
+        self._show_groups(ids, groups, options['show'])
+
+        if options['collapse']:
+            self._collapse(ids, groups, batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Collapsed {duplicate_count} chunk(s) onto {len(groups)} canonical chunk(s)"))
+
+    def _backfill(self, batch_size):
+        updated = 0
+        while True:
+            batch = list(_scanned_chunks.filter(minhash__isnull=True).only('id', 'chunk_text')[:batch_size])
+            if not batch:
+                break
+            for chunk in batch:
+                chunk.minhash = minhash.compute_signature(chunk.chunk_text)
+            DocumentChunk.objects.bulk_update(batch, ['minhash'])
+            updated += len(batch)
+        self.stdout.write(f"Computed {updated} missing signature(s)")
+
+    def _find_groups(self, signatures, threshold):
+        """Groups signature indexes whose estimated similarity reaches threshold; returns root -> members."""
+        union_find = _UnionFind(len(signatures))
+        buckets = defaultdict(list)
+        for index, signature in enumerate(signatures):
+            for key in minhash.band_keys(signature):
+                bucket = buckets[key]
+                for other in bucket:
+                    if union_find.find(other) != union_find.find(index) and \
+                            minhash.similarity(signature, signatures[other]) >= threshold:
+                        union_find.union(index, other)
+                bucket.append(index)
+
+        groups = defaultdict(list)
+        for index in range(len(signatures)):
+            groups[union_find.find(index)].append(index)
+        return {root: members for root, members in groups.items() if len(members) > 1}
+
+    def _show_groups(self, ids, groups, limit):
+        largest = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)[:limit]
+        for root, members in largest:
+            canonical = DocumentChunk.objects.select_related('document').get(id=ids[root])
+            snippet = ' '.join(canonical.chunk_text.split())[:80]
+            self.stdout.write(f"  {len(members)} copies of chunk {canonical.id} ({canonical.document.file_name}): {snippet}...")
+
+    def _collapse(self, ids, groups, batch_size):
+        with transaction.atomic():
+            # Recompute from scratch so chunks that are no longer duplicates are visible again
+            _scanned_chunks.filter(canonical_chunk__isnull=False).update(canonical_chunk=None)
+            for root, members in groups.items():
+                duplicate_ids = [ids[index] for index in members if index != root]
+                for start in range(0, len(duplicate_ids), batch_size):
+                    DocumentChunk.objects.filter(id__in=duplicate_ids[start:start + batch_size]).update(
+                        canonical_chunk_id=ids[root]
+                    )
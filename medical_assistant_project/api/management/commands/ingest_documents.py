@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.models import Document, DocumentChunk, StandardType
+from api.services import document_processor
+
+CHECKPOINT_FILE_NAME = '.ingest_checkpoint.json'
+
+
+class Checkpoint:
+    """
+    Per-file progress record for a bulk ingestion run, stored as JSON.
+
+    A file is marked 'started' with a pre-assigned document ID before it is
+    processed and 'done' once its transaction has committed. On resume, a
+    'started' file whose document exists in the database is treated as done,
+    so a crash between commit and checkpoint write never causes a duplicate.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if path.exists():
+            self.entries = json.loads(path.read_text(encoding='utf-8'))
+
+    def get(self, key):
+        with self._lock:
+            return self.entries.get(key)
+
+    def record(self, key, **entry):
+        with self._lock:
+            self.entries[key] = entry
+            temp_path = self.path.with_suffix('.tmp')
+            temp_path.write_text(json.dumps(self.entries, indent=2), encoding='utf-8')
+            os.replace(temp_path, self.path)  # Atomic, so an interrupted write never corrupts the file
+
+
+class Command(BaseCommand):
+    help = 'Bulk-ingests every PDF/DOCX file in a directory, resuming from a checkpoint if interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to scan (recursively) for PDF and DOCX files')
+        parser.add_argument('--standard-type', required=True, help='StandardType ID or name for the documents')
+        parser.add_argument('--workers', type=int, default=2, help='Files parsed and embedded concurrently')
+        parser.add_argument(
+            '--batch-size', type=int, default=document_processor.EMBEDDING_BATCH_SIZE,
+            help='Chunks embedded and bulk-inserted per batch'
+        )
+        parser.add_argument(
+            '--checkpoint', help=f'Checkpoint file (default: <directory>/{CHECKPOINT_FILE_NAME})'
+        )
+
+    def handle(self, *args, **options):
+        directory = Path(options['directory'])
+        if not directory.is_dir():
+            raise CommandError(f"{directory} is not a directory")
+
+        standard_type = self._resolve_standard_type(options['standard_type'])
+        checkpoint = Checkpoint(Path(options['checkpoint']) if options['checkpoint'] else directory / CHECKPOINT_FILE_NAME)
+        extensions = set(document_processor.BACKENDS_BY_EXTENSION.keys())
+        files = sorted(p for p in directory.rglob('*') if p.is_file() and p.suffix.lower() in extensions)
+
+        pending = [path for path in files if not self._already_ingested(checkpoint, directory, path)]
+        self.stdout.write(
+            f"Found {len(files)} file(s); {len(files) - len(pending)} already ingested, {len(pending)} to process"
+        )
+        if not pending:
+            return
+
+        start = time.perf_counter()
+        ingested = duplicates = failed = total_chunks = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            futures = {
+                executor.submit(
+                    self._ingest_file, checkpoint, directory, path, standard_type, options['batch_size']
+                ): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    chunk_count, duplicate_of = future.result()
+                    if duplicate_of is not None:
+                        duplicates += 1
+                        self.stdout.write(f"Skipped {path.name}: same content as document {duplicate_of}")
+                        continue
+                    ingested += 1
+                    total_chunks += chunk_count
+                    self.stdout.write(self.style.SUCCESS(f"Ingested {path.name} ({chunk_count} chunks)"))
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"Failed {path.name}: {e}"))
+
+        elapsed = time.perf_counter() - start
+        files_per_min = ingested / elapsed * 60 if elapsed else 0
+        chunks_per_sec = total_chunks / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {ingested} ingested, {duplicates} duplicate(s), {failed} failed in {elapsed:.1f}s "
+            f"({files_per_min:.1f} files/min, {chunks_per_sec:.1f} chunks/sec)"
+        ))
+
+    def _resolve_standard_type(self, value):
+        try:
+            return StandardType.objects.get(id=uuid.UUID(value), is_deleted=False)
+        except ValueError:
+            pass
+        except StandardType.DoesNotExist:
+            raise CommandError(f"Standard type with ID {value} not found.")
+        matches = list(StandardType.objects.filter(name__iexact=value, is_deleted=False)[:2])
+        if len(matches) != 1:
+            raise CommandError(f"Standard type '{value}' not found or ambiguous; pass its ID instead.")
+        return matches[0]
+
+    def _checkpoint_key(self, directory, path):
+        return path.relative_to(directory).as_posix()
+
+    def _already_ingested(self, checkpoint, directory, path):
+        key = self._checkpoint_key(directory, path)
+        entry = checkpoint.get(key)
+        if not entry:
+            return False
+        stat = path.stat()
+        if entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime:
+            return False  # File changed since it was recorded
+        if entry.get('status') == 'done':
+            return True
+        # Interrupted after 'started': the run may still have committed the document
+        if Document.objects.filter(id=entry['document_id']).exists():
+            checkpoint.record(key, **dict(entry, status='done'))
+            return True
+        return False
+
+    def _ingest_file(self, checkpoint, directory, path, standard_type, batch_size):
+        """
+        Ingests one file. Returns (new_chunk_count, duplicate_of): a file whose
+        content was already ingested resolves to the existing (or a linked)
+        document, which is returned as duplicate_of with no new chunks.
+        """
+        key = self._checkpoint_key(directory, path)
+        stat = path.stat()
+        document_id = uuid.uuid4()
+        checkpoint.record(key, status='started', document_id=str(document_id), size=stat.st_size, mtime=stat.st_mtime)
+        try:
+            with path.open('rb') as file_obj:
+                document = document_processor.process_and_store_document(
+                    file_obj=file_obj,
+                    original_filename=path.name,
+                    standard_type_id=standard_type.id,
+                    batch_size=batch_size,
+                    document_id=document_id
+                )
+            checkpoint.record(key, status='done', document_id=str(document.id), size=stat.st_size, mtime=stat.st_mtime)
+            if document.id != document_id:
+                return 0, document.id
+            return DocumentChunk.objects.filter(document=document).count(), None
+        finally:
+            connection.close()  # Each worker thread holds its own DB connection
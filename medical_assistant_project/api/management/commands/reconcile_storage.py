@@ -0,0 +1,56 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.models import StorageDeletion
+from api.services import storage_gc
+from api.utils.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = 'Lists storage objects that no database row references, optionally queueing them for deletion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bucket', action='append', choices=[storage_gc.DOCUMENTS_BUCKET, storage_gc.ATTACHMENTS_BUCKET],
+            help='Bucket to check (repeatable; default: all buckets)'
+        )
+        parser.add_argument(
+            '--min-age-hours', type=float, default=24,
+            help='Ignore objects modified more recently than this, which may belong to an upload in flight (default: 24)'
+        )
+        parser.add_argument('--delete', action='store_true', help='Queue the orphaned objects for the storage sweeper')
+        parser.add_argument('--verbose-list', action='store_true', help='Print every orphaned path')
+
+    def handle(self, *args, **options):
+        if options['min_age_hours'] < 0:
+            raise CommandError("--min-age-hours cannot be negative")
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        storage = get_storage()
+
+        for bucket in options['bucket'] or [storage_gc.DOCUMENTS_BUCKET, storage_gc.ATTACHMENTS_BUCKET]:
+            # Read the references before listing, so an object stored meanwhile is too young to count
+            referenced = storage_gc.referenced_paths(bucket)
+            queued = set(StorageDeletion.objects.filter(bucket=bucket).values_list('storage_path', flat=True))
+            orphans, orphan_bytes, listed = [], 0, 0
+            try:
+                for path, size, modified_at in storage.list_objects(bucket):
+                    listed += 1
+                    if path in referenced or path in queued:
+                        continue
+                    if modified_at is None or modified_at > cutoff:
+                        continue
+                    orphans.append(path)
+                    orphan_bytes += size or 0
+            except Exception as e:
+                raise CommandError(f"Failed to list bucket {bucket}: {e}")
+
+            if options['verbose_list']:
+                for path in orphans:
+                    self.stdout.write(f"  {bucket}/{path}")
+            self.stdout.write(
+                f"{bucket}: {listed} objects, {len(referenced)} referenced, {len(queued)} already queued, "
+                f"{len(orphans)} orphaned ({orphan_bytes / (1024 * 1024):.1f} MB)"
+            )
+            if options['delete'] and orphans:
+                storage_gc.enqueue_deletion(bucket, orphans)
+                self.stdout.write(self.style.SUCCESS(f"Queued {len(orphans)} orphaned object(s) in {bucket} for deletion"))
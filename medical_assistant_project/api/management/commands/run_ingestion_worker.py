@@ -0,0 +1,44 @@
+import threading
+from django.core.management.base import BaseCommand
+from api.services import ingestion_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs background workers that process queued document ingestion jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=ingestion_jobs.WORKER_THREADS,
+            help='Number of worker threads to run'
+        )
+        parser.add_argument(
+            '--exit-when-idle', action='store_true',
+            help='Exit once the queue is empty instead of polling for new jobs'
+        )
+
+    def handle(self, *args, **options):
+        thread_count = max(1, options['threads'])
+        stop_event = threading.Event()
+        threads = []
+        for i in range(thread_count):
+            thread = threading.Thread(
+                target=ingestion_jobs.run_worker_loop,
+                args=(ingestion_jobs.make_worker_id(i), stop_event, options['exit_when_idle']),
+                name=f"ingestion-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+        self.stdout.write(self.style.SUCCESS(f'Started {thread_count} ingestion worker thread(s)'))
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopping workers after their current job...'))
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS('Ingestion workers stopped'))
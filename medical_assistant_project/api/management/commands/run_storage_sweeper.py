@@ -0,0 +1,34 @@
+import threading
+from django.core.management.base import BaseCommand
+from api.services import storage_gc
+
+
+class Command(BaseCommand):
+    help = 'Deletes storage objects queued in the storage deletion outbox, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no deletions are due instead of polling for new ones'
+        )
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=storage_gc.run_sweeper_loop,
+            args=(stop_event, options['once']),
+            name="storage-sweeper",
+            daemon=True
+        )
+        thread.start()
+
+        self.stdout.write(self.style.SUCCESS('Started storage sweeper'))
+        try:
+            while thread.is_alive():
+                thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopping sweeper after its current batch...'))
+            stop_event.set()
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS('Storage sweeper stopped'))
@@ -0,0 +1,31 @@
+# Generated manually
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageDeletion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('bucket', models.CharField(max_length=255)),
+                ('storage_path', models.CharField(max_length=1024)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['next_attempt_at'],
+                'indexes': [models.Index(fields=['next_attempt_at'], name='api_storagedeletion_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'storage_path'), name='unique_storage_deletion_path')],
+            },
+        ),
+    ]
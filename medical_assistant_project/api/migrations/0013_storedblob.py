@@ -0,0 +1,32 @@
+# Generated manually
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_storagedeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('bucket', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('storage_path', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('bucket', 'content_hash'), name='unique_blob_content'),
+                    models.UniqueConstraint(fields=('bucket', 'storage_path'), name='unique_blob_path'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated manually
+
+import pgvector.django.vector
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_ingestionjob_replaces_document'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=384, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated manually
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_documentchunk_nullable_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadPart',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('part_number', models.PositiveIntegerField()),
+                ('size', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('storage_path', models.CharField(max_length=1024)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='api.uploadsession')),
+            ],
+            options={
+                'ordering': ['part_number'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'part_number'), name='unique_upload_part')],
+            },
+        ),
+    ]
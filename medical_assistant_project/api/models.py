@@ -11,6 +11,20 @@ class Document(models.Model):
     supabase_storage_path = models.CharField(max_length=1024)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     metadata = models.JSONField(null=True, blank=True) # Optional: Store original metadata
+    content_hash = models.CharField(max_length=64, null=True, blank=True) # SHA-256 of the original file bytes
+
+    class Meta:
+        constraints = [
+            # The same file can only be ingested once per standard type
+            models.UniqueConstraint(
+                fields=['standard_type', 'content_hash'],
+                condition=models.Q(content_hash__isnull=False),
+                name='unique_document_content_per_standard_type'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['content_hash'], name='api_document_content_hash_idx'),
+        ]
 
     def __str__(self):
         return f"{self.standard_type.name}: {self.file_name}"
@@ -20,13 +34,184 @@ class DocumentChunk(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
     chunk_text = models.TextField()
     # Ensure embedding dimensions match your chosen model (e.g., all-MiniLM-L6-v2 uses 384)
-    embedding = VectorField(dimensions=384)
+    # Empty on the chunks of a linked duplicate document, which use their canonical chunk's vector
+    embedding = VectorField(dimensions=384, null=True, blank=True)
     metadata = models.JSONField(null=True, blank=True) # e.g., page number, chunk index
+    # MinHash signature of the chunk text (see api/utils/minhash.py), for near-duplicate detection
+    minhash = models.BinaryField(null=True, blank=True, editable=False)
+    # Set on near-duplicates of another chunk by the dedupe_chunks command, and on the chunks of a
+    # linked duplicate document (see document_processor.resolve_duplicate_upload); retrieval skips these
+    canonical_chunk = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Chunk {self.id} from {self.document.file_name}"
 
+class IngestionJob(models.Model):
+    """
+    Model for tracking background ingestion of an uploaded document.
+    The original file is already in storage when the job is created, except for
+    a resumable upload, whose parts the worker assembles and stores first
+    (supabase_storage_path is empty until then); workers claim queued jobs and
+    run parsing, chunking, embedding and DB insert.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    standard_type = models.ForeignKey('StandardType', on_delete=models.CASCADE, related_name='ingestion_jobs')
+    supabase_storage_path = models.CharField(max_length=1024, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='ingestion_jobs')
+    # Set for a revised file that replaces this document's content instead of creating a new document
+    replaces_document = models.ForeignKey(
+        Document, on_delete=models.CASCADE, null=True, blank=True, related_name='replacement_jobs'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    stage = models.CharField(max_length=50, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # Percentage 0-100
+    error = models.TextField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='api_ingestionjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ingestion of {self.file_name} ({self.status})"
+
+class UploadSession(models.Model):
+    """
+    Model for a resumable, chunked document upload.
+    Numbered parts are stored in object storage as they arrive (in any order,
+    retried individually; see UploadPart), so any app server or worker can use
+    them; completing the session queues an IngestionJob, whose worker
+    assembles, checks and stores the file before ingesting it.
+    """
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETING = 'completing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_ABORTED = 'aborted'
+
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_COMPLETING, 'Completing'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_ABORTED, 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    standard_type = models.ForeignKey('StandardType', on_delete=models.CASCADE, related_name='upload_sessions')
+    total_size = models.BigIntegerField()
+    part_size = models.PositiveIntegerField()
+    total_parts = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64, null=True, blank=True)  # Optional SHA-256 given by the client
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    job = models.ForeignKey(IngestionJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='api_uploadsession_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Upload of {self.file_name} ({self.status})"
+
+class UploadPart(models.Model):
+    """
+    A received part of an UploadSession, stored in the documents bucket. A
+    re-sent part gets a new row and path; the replaced object is queued for
+    deletion like any other released file.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='parts')
+    part_number = models.PositiveIntegerField()
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    storage_path = models.CharField(max_length=1024)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['part_number']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'part_number'], name='unique_upload_part'),
+        ]
+
+    def __str__(self):
+        return f"Part {self.part_number} of upload {self.session_id}"
+
+class StorageDeletion(models.Model):
+    """
+    Outbox of storage objects to delete. Deleting a row that owns a file
+    records its path here in the same transaction; a background sweeper
+    removes the objects in batches and retries failures with backoff.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    bucket = models.CharField(max_length=255)
+    storage_path = models.CharField(max_length=1024)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'storage_path'], name='unique_storage_deletion_path'),
+        ]
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='api_storagedeletion_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Delete {self.bucket}/{self.storage_path} (attempt {self.attempts})"
+
+class StoredBlob(models.Model):
+    """
+    A stored file shared by every attachment or complaint upload with the same
+    content. Rows that use it hold its storage_path; ref_count counts them, and
+    the file is queued for deletion when the last reference is released.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    bucket = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)  # SHA-256 of the file bytes
+    storage_path = models.CharField(max_length=1024)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'content_hash'], name='unique_blob_content'),
+            models.UniqueConstraint(fields=['bucket', 'storage_path'], name='unique_blob_path'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket}/{self.storage_path} ({self.ref_count} references)"
+
 class GeneratedContent(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     topic = models.CharField(max_length=255)
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     Document, GeneratedContent, DocumentChunk, Standard, StandardType,
     QuestionOption, AuditQuestion, Practice, FeedbackMethod, Feedback, FeedbackAttachment,
-    Complaint, SimpleChatbotConversation, SimpleChatbotMessage
+    Complaint, SimpleChatbotConversation, SimpleChatbotMessage, IngestionJob, UploadSession
 )
 from .services.llm_engine import AVAILABLE_MODELS
 
@@ -12,6 +12,24 @@ class DocumentSerializer(serializers.ModelSerializer):
         fields = ['id', 'file_name', 'standard_type', 'uploaded_at', 'metadata']
         read_only_fields = ['id', 'uploaded_at', 'supabase_storage_path'] # Path is internal
 
+class IngestionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id', 'file_name', 'standard_type', 'status', 'stage', 'progress',
+            'error', 'attempts', 'document', 'replaces_document', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'file_name', 'standard_type', 'total_size', 'part_size', 'total_parts',
+            'status', 'job', 'document', 'created_at', 'expires_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
 class GeneratedContentSerializer(serializers.ModelSerializer):
     class Meta:
         model = GeneratedContent
@@ -0,0 +1,111 @@
+"""
+Deduplicated storage of attachment and complaint files.
+
+The same referral letter or screenshot is often attached to several
+records. Each distinct file is stored once per bucket as a StoredBlob,
+found by the SHA-256 of its bytes; a repeat upload only increments the
+blob's reference count and skips the storage upload. Releasing the last
+reference deletes the blob row and queues the file for the storage sweeper.
+
+Blob paths still contain a random UUID, so a file re-uploaded after its
+blob was released gets a new path and can never be removed by the pending
+deletion of the old one.
+"""
+import logging
+import uuid
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from api.models import StoredBlob
+from api.services import storage_gc
+from api.utils import uploads
+from api.utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+MAX_CREATE_ATTEMPTS = 3
+
+
+def _reference_existing(bucket: str, content_hash: str):
+    """Adds a reference to the blob with this content, if there is one."""
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(bucket=bucket, content_hash=content_hash).first()
+        if blob is None:
+            return None
+        blob.ref_count += 1  # The row is locked, so a plain increment is safe
+        blob.save(update_fields=['ref_count'])
+    return blob
+
+
+def acquire_blob(bucket: str, source, path_prefix: str, file_name: str, content_type: str = 'application/octet-stream'):
+    """
+    Returns the blob holding a source's content, uploading it only if no blob
+    in the bucket has the same content. Either way the caller holds one new
+    reference, which it must hand back with release_blob() when the row that
+    uses blob.storage_path is deleted (or fails to save).
+
+    Returns:
+        tuple: (blob, uploaded) where uploaded is False for a duplicate
+
+    Raises:
+        ConnectionError: If the upload to storage fails
+    """
+    content_hash = uploads.hash_source(source)
+    for _ in range(MAX_CREATE_ATTEMPTS):
+        blob = _reference_existing(bucket, content_hash)
+        if blob is not None:
+            logger.info(f"Reusing stored file {blob.storage_path} for {file_name}")
+            return blob, False
+
+        storage_path = f"{path_prefix}/{uuid.uuid4()}_{file_name}"
+        try:
+            get_storage().put(bucket, storage_path, source, content_type=content_type)
+        except Exception as e:
+            logger.error(f"Failed to upload file to storage: {e}")
+            raise ConnectionError("Failed to upload file to storage.") from e
+        try:
+            with transaction.atomic():
+                blob = StoredBlob.objects.create(
+                    bucket=bucket, content_hash=content_hash, storage_path=storage_path,
+                    size=uploads.source_size(source), ref_count=1
+                )
+            logger.info(f"File uploaded to storage: {storage_path}")
+            return blob, True
+        except IntegrityError:
+            # A concurrent upload of the same content created the blob first; use that one
+            storage_gc.enqueue_deletion(bucket, [storage_path])
+    raise ConnectionError(f"Could not store {file_name}: its stored copy kept changing.")
+
+
+def release_blob(bucket: str, storage_path: str):
+    """
+    Drops one reference to the file at storage_path, queueing the file for
+    deletion when none are left. Call it in the transaction that deletes the
+    row using the file. Files stored before deduplication have no blob and
+    are queued straight away.
+    """
+    if not storage_path:
+        return
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(bucket=bucket, storage_path=storage_path).first()
+        if blob is not None and blob.ref_count > 1:
+            blob.ref_count -= 1
+            blob.save(update_fields=['ref_count'])
+            return
+        if blob is not None:
+            blob.delete()
+        storage_gc.enqueue_deletion(bucket, [storage_path])
+
+
+def get_blob_stats() -> dict:
+    """Summarises how much storage deduplication saves."""
+    totals = StoredBlob.objects.aggregate(
+        blobs=Count('id'), references=Sum('ref_count'), stored_bytes=Sum('size'),
+        referenced_bytes=Sum(F('size') * F('ref_count'))
+    )
+    stored_bytes = totals['stored_bytes'] or 0
+    return {
+        'blobs': totals['blobs'],
+        'references': totals['references'] or 0,
+        'stored_bytes': stored_bytes,
+        'deduplicated_bytes': (totals['referenced_bytes'] or 0) - stored_bytes,
+    }
@@ -1,41 +1,46 @@
 import logging
-import uuid
 from django.db import transaction
 from ..models import Complaint
-from ..utils.supabase_client import get_supabase_client
+from . import blob_store
+from ..utils import uploads
 
 logger = logging.getLogger(__name__)
 
 def upload_complaint_file(file_obj, original_filename: str):
     """
-    Uploads a complaint file to Supabase storage and returns the storage path.
+    Uploads a complaint file to storage and returns the storage path.
+    A file already stored for another complaint is reused instead of uploaded again.
+    The caller owns a reference to the file and must hand it back with
+    release_complaint_file() if no complaint ends up using the path.
     
     Args:
         file_obj: File object to upload
         original_filename: Original filename of the uploaded file
     
     Returns:
-        str: The storage path in Supabase
+        str: The storage path of the uploaded file
     """
-    supabase = get_supabase_client()
-    file_content = file_obj.read()
-    
-    # Create a unique storage path
-    storage_path = f"complaints/{uuid.uuid4()}_{original_filename}"
-    
     try:
-        # Upload file to Supabase storage
-        upload_response = supabase.storage.from_("medical-documents").upload(
-            path=storage_path,
-            file=file_content,
-            file_options={"content-type": "application/octet-stream"}
-        )
-        logger.info(f"Complaint file uploaded to Supabase Storage: {storage_path}")
-        return storage_path, None
+        # Upload file to storage, streamed from disk for large files
+        with uploads.spooled_file(file_obj) as source:
+            blob, uploaded = blob_store.acquire_blob("medical-documents", source, "complaints", original_filename)
+        if uploaded:
+            logger.info(f"Complaint file uploaded to storage: {blob.storage_path}")
+        return blob.storage_path, None
     except Exception as e:
-        logger.error(f"Failed to upload complaint file to Supabase Storage: {e}")
+        logger.error(f"Failed to upload complaint file to storage: {e}")
         return None, str(e)
 
+def release_complaint_file(storage_path: str):
+    """
+    Drops a reference to a complaint file; the storage sweeper deletes the file
+    once no complaint uses it.
+    """
+    try:
+        blob_store.release_blob("medical-documents", storage_path)
+    except Exception as e:
+        logger.error(f"Failed to release complaint file {storage_path}: {e}")
+
 def get_all_complaints():
     """
     Retrieves all complaints.
@@ -71,7 +76,8 @@ def get_complaint_by_id(complaint_id):
 
 def delete_complaint(complaint_id):
     """
-    Deletes a complaint and its associated file in storage.
+    Deletes a complaint and releases its associated file in storage, which the
+    storage sweeper deletes once no other complaint uses it.
     
     Args:
         complaint_id: UUID of the complaint to delete
@@ -82,18 +88,10 @@ def delete_complaint(complaint_id):
     try:
         complaint = Complaint.objects.get(id=complaint_id)
         
-        # Delete file from storage if it exists
-        if complaint.file_upload_path:
-            try:
-                supabase = get_supabase_client()
-                supabase.storage.from_("medical-documents").remove([complaint.file_upload_path])
-                logger.info(f"Deleted file from storage: {complaint.file_upload_path}")
-            except Exception as e:
-                logger.error(f"Error deleting file from storage: {e}")
-                # Continue with complaint deletion even if file deletion fails
-        
-        # Delete the complaint
-        complaint.delete()
+        with transaction.atomic():
+            if complaint.file_upload_path:
+                blob_store.release_blob("medical-documents", complaint.file_upload_path)
+            complaint.delete()
         return True, None
     except Complaint.DoesNotExist:
         return False, f"Complaint with ID {complaint_id} not found."
@@ -1,172 +1,782 @@
+import hashlib
 import io
+from array import array
 from pypdf import PdfReader
+try:
+    import fitz  # PyMuPDF, much faster PDF text extraction
+except ImportError:  # Fall back to pypdf when PyMuPDF is not installed
+    fitz = None
 from docx import Document as DocxDocument
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from api.utils.embeddings import embed_texts
-from api.utils.supabase_client import get_supabase_client
+from api.utils import chunk_insert, pdf_pages, signed_urls, uploads
+from api.utils.boilerplate import BoilerplateStripper
+from api.utils.ingestion_metrics import STAGES, IngestionMetrics, percentile
+from api.utils.embeddings import embed_texts, get_cached_tokenizer
+from api.utils.token_chunker import TokenChunker
+from api.utils.storage import get_storage
 from api.models import Document, DocumentChunk
+from api.services import storage_gc
 import logging
 import os
-from django.db import transaction
+import tempfile
+import threading
+import time
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
 import uuid
 
 logger = logging.getLogger(__name__)
 
-# Configure chunking
+# Configure chunking. Chunks are sized in embedding-model tokens: all-MiniLM-L6-v2
+# reads 256 tokens including [CLS]/[SEP], and truncates anything longer.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "250"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Character-based LangChain splitter settings, kept for chunk_text() and benchmarks
 CHUNK_SIZE = 1000 # Characters
 CHUNK_OVERLAP = 150
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))  # Chunks embedded and inserted per batch
 
-def parse_pdf(file_content: bytes) -> str:
-    """Extracts text from PDF content."""
-    text = ""
+# Storage configuration
+DOCUMENTS_BUCKET = "medical-documents"
+CONTENT_TYPE_MAP = {
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+# Parsers take a "source": the bytes of a file, or the path of a file on disk
+# (see api/utils/uploads.py), so large uploads are never read into memory whole.
+
+def _open_pymupdf(source):
+    if uploads.is_path(source):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+def _iter_pages_pymupdf(source):
+    """Yields (page_number, text) for each PDF page using PyMuPDF."""
+    with _open_pymupdf(source) as pdf:
+        for page_number, page in enumerate(pdf, start=1):
+            yield page_number, page.get_text()
+
+def _iter_pages_pypdf(source):
+    """Yields (page_number, text) for each PDF page using pypdf."""
+    with uploads.mapped_source(source) as stream:
+        reader = PdfReader(stream)
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield page_number, page.extract_text() or ""
+
+def _iter_pages_docx(source):
+    """
+    Yields (page_number, text) for a DOCX file. DOCX has no fixed pages, so
+    pages are split on the page breaks Word recorded when the file was last saved.
+    """
+    doc = DocxDocument(source if uploads.is_path(source) else io.BytesIO(source))
+    page_number = 1
+    paragraphs = []
+    for para in doc.paragraphs:
+        paragraphs.append(para.text)
+        if para.contains_page_break:
+            yield page_number, "\n".join(paragraphs)
+            page_number += 1
+            paragraphs = []
+    if paragraphs:
+        yield page_number, "\n".join(paragraphs)
+
+# Parser registry: backend name -> page iterator. Backends for an extension are
+# tried in order of preference; PDF_PARSER_BACKEND forces a specific PDF backend.
+PARSER_BACKENDS = {
+    'pymupdf': _iter_pages_pymupdf,
+    'pypdf': _iter_pages_pypdf,
+    'docx': _iter_pages_docx,
+}
+BACKENDS_BY_EXTENSION = {
+    '.pdf': ['pymupdf', 'pypdf'],
+    '.docx': ['docx'],
+}
+PDF_PARSER_BACKEND = os.getenv("PDF_PARSER_BACKEND")
+
+# Parallel PDF extraction: large PDFs are split into page ranges across a process
+# pool. PDF_PARALLEL_WORKERS=1 disables it; smaller PDFs are always parsed in-process.
+PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", "4"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "100"))
+PDF_PARALLEL_PAGES_PER_TASK = int(os.getenv("PDF_PARALLEL_PAGES_PER_TASK", "25"))
+
+def available_backends(file_extension: str) -> list[str]:
+    """Returns the usable parser backends for an extension, in order of preference."""
+    backends = BACKENDS_BY_EXTENSION.get(file_extension, [])
+    return [name for name in backends if name != 'pymupdf' or fitz is not None]
+
+def get_parser_backend(file_extension: str, backend: str = None) -> str:
+    """Selects the parser backend to use for a file extension."""
+    candidates = available_backends(file_extension)
+    if not candidates:
+        raise ValueError("Unsupported file type. Only PDF and DOCX are allowed.")
+    requested = backend or (PDF_PARSER_BACKEND if file_extension == '.pdf' else None)
+    if requested:
+        if requested not in candidates:
+            raise ValueError(f"Parser backend '{requested}' is not available for {file_extension} files.")
+        return requested
+    return candidates[0]
+
+def _count_pdf_pages(source, backend: str) -> int:
+    if backend == 'pymupdf':
+        with _open_pymupdf(source) as pdf:
+            return pdf.page_count
+    with uploads.mapped_source(source) as stream:
+        return len(PdfReader(stream).pages)
+
+def _iter_pdf_pages(source, backend: str):
+    """
+    Yields PDF pages, extracting them in a process pool when the document is
+    large enough to be worth the overhead. Workers open the file on disk
+    themselves; bytes are written to a shared temp file first rather than
+    being pickled to each process.
+    """
+    if PDF_PARALLEL_WORKERS <= 1:
+        yield from PARSER_BACKENDS[backend](source)
+        return
+
+    page_count = _count_pdf_pages(source, backend)
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        yield from PARSER_BACKENDS[backend](source)
+        return
+
+    logger.info(f"Extracting {page_count} PDF pages with {PDF_PARALLEL_WORKERS} processes")
+    if uploads.is_path(source):
+        yield from pdf_pages.iter_pages_parallel(
+            os.fspath(source), page_count, backend,
+            workers=PDF_PARALLEL_WORKERS,
+            pages_per_task=PDF_PARALLEL_PAGES_PER_TASK
+        )
+        return
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+        temp_file.write(source)
+    try:
+        yield from pdf_pages.iter_pages_parallel(
+            temp_file.name, page_count, backend,
+            workers=PDF_PARALLEL_WORKERS,
+            pages_per_task=PDF_PARALLEL_PAGES_PER_TASK
+        )
+    finally:
+        os.remove(temp_file.name)
+
+def iter_document_pages(source, file_extension: str, backend: str = None):
+    """
+    Yields (page_number, text) for each page of a document as it is parsed,
+    so downstream stages can start before the whole file has been read.
+
+    Args:
+        source: Raw bytes of the file, or the path of the file on disk
+        file_extension: Lower-case extension including the dot, e.g. '.pdf'
+        backend: Optional parser backend name from PARSER_BACKENDS
+    """
+    backend = get_parser_backend(file_extension, backend)
+    file_label = file_extension.lstrip('.').upper()
     try:
-        reader = PdfReader(io.BytesIO(file_content))
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n" # Add newline between pages
+        if file_extension == '.pdf':
+            yield from _iter_pdf_pages(source, backend)
+        else:
+            yield from PARSER_BACKENDS[backend](source)
     except Exception as e:
-        logger.error(f"Error parsing PDF: {e}")
-        raise ValueError("Could not parse PDF file.") from e
-    return text
+        logger.error(f"Error parsing {file_label} with {backend}: {e}")
+        raise ValueError(f"Could not parse {file_label} file.") from e
+
+def parse_pdf(file_content: bytes) -> str:
+    """Extracts text from PDF content."""
+    return "\n".join(text for _, text in iter_document_pages(file_content, '.pdf') if text)
 
 def parse_docx(file_content: bytes) -> str:
     """Extracts text from DOCX content."""
-    text = ""
-    try:
-        doc = DocxDocument(io.BytesIO(file_content))
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    except Exception as e:
-        logger.error(f"Error parsing DOCX: {e}")
-        raise ValueError("Could not parse DOCX file.") from e
-    return text
+    return "\n".join(text for _, text in iter_document_pages(file_content, '.docx'))
+
+# Splitters are stateless, so a single instance is shared across calls
+_text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len,
+)
 
 def chunk_text(text: str) -> list[str]:
     """Chunks text using LangChain's splitter."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        add_start_index=True, # Helpful for potential metadata later
-    )
-    # Langchain splitter returns Document objects, extract page_content
-    chunks = text_splitter.split_text(text)
-    return chunks # Returns list of text strings
+    return _text_splitter.split_text(text) # Returns list of text strings
 
-def process_and_store_document(file_obj, original_filename: str, standard_type_id: str):
+def iter_text_chunks(pages):
     """
-    Full pipeline: Reads file, uploads to Supabase Storage, parses, chunks,
-    embeds, and saves everything to the database.
-    
-    Args:
-        file_obj: File object to process
-        original_filename: Original filename of the uploaded file
-        standard_type_id: ID of the StandardType for this document
+    Incrementally chunks a stream of (page_number, text) pages by token count
+    (see api/utils/token_chunker.py). Only the overlap tail of the previous
+    page is kept between pages, so memory does not grow with the document.
+
+    Yields:
+        tuple: (page_number, chunk_text, span) where span holds the chunk's
+            page-relative 'start_offset'/'end_offset' for chunk metadata
     """
+    chunker = TokenChunker(get_cached_tokenizer(), CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+    yield from chunker.chunk_pages(pages)
+
+def _counted_pages(pages, metrics: IngestionMetrics):
+    """Passes pages through, counting pages and characters into metrics."""
+    for page_number, text in pages:
+        metrics.add('pages')
+        metrics.add('characters', len(text))
+        yield page_number, text
+
+def _batched(iterable, size: int):
+    """Groups an iterable into lists of at most size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def count_pages(source, file_extension: str):
+    """Returns the page count of a PDF (used for progress reporting), or None if unknown."""
+    if file_extension != '.pdf':
+        return None
+    try:
+        return _count_pdf_pages(source, get_parser_backend(file_extension))
+    except Exception:
+        return None
+
+def get_standard_type(standard_type_id):
+    """Looks up the StandardType for an upload, raising ValueError if missing."""
     from api.models import StandardType  # Import here to avoid circular imports
-    
-    supabase = get_supabase_client()
-    file_content = file_obj.read()
-    file_extension = os.path.splitext(original_filename)[1].lower()
 
-    # Validate standard_type_id
     try:
-        standard_type = StandardType.objects.get(id=standard_type_id)
-    except StandardType.DoesNotExist:
+        return StandardType.objects.get(id=standard_type_id)
+    except (StandardType.DoesNotExist, ValueError, DjangoValidationError):
         raise ValueError(f"Standard type with ID {standard_type_id} not found.")
 
-    # 1. Upload original file to Supabase Storage
-    storage_path = f"documents/{uuid.uuid4()}_{original_filename}" # Ensure unique path
+def _report_progress(progress_callback, stage: str, progress: int):
+    """Forwards a pipeline stage/progress update to the caller, if it asked for one."""
+    if progress_callback is not None:
+        progress_callback(stage, progress)
+
+def make_storage_path(original_filename: str) -> str:
+    """Returns a new, unique storage path for an original document file."""
+    return f"documents/{uuid.uuid4()}_{original_filename}"
+
+def upload_original_file(source, original_filename: str, storage_path: str = None) -> str:
+    """
+    Uploads the original document file to storage. A file on disk is
+    streamed from an open handle instead of being read into memory.
+
+    Returns:
+        str: The storage path of the uploaded file
+    """
+    file_extension = os.path.splitext(original_filename)[1].lower()
+    storage_path = storage_path or make_storage_path(original_filename) # Ensure unique path
     try:
         # Use correct content-type based on extension
-        content_type_map = {'.pdf': 'application/pdf', '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'}
-        content_type = content_type_map.get(file_extension, 'application/octet-stream')
+        content_type = CONTENT_TYPE_MAP.get(file_extension, 'application/octet-stream')
 
-        upload_response = supabase.storage.from_("medical-documents").upload( # Bucket name
-            path=storage_path,
-            file=file_content,
-            file_options={"content-type": content_type}
-        )
-        logger.info(f"File uploaded to Supabase Storage: {storage_path}")
+        get_storage().put(DOCUMENTS_BUCKET, storage_path, source, content_type=content_type)
+        logger.info(f"File uploaded to storage: {storage_path}")
     except Exception as e:
-        logger.error(f"Failed to upload file to Supabase Storage: {e}")
+        logger.error(f"Failed to upload file to storage: {e}")
         raise ConnectionError("Failed to upload to storage.") from e
+    return storage_path
 
-    # 2. Parse text content
-    if file_extension == ".pdf":
-        text = parse_pdf(file_content)
-    elif file_extension == ".docx":
-        text = parse_docx(file_content)
-    else:
-        raise ValueError("Unsupported file type. Only PDF and DOCX are allowed.")
+def download_original_file(storage_path: str):
+    """
+    Fetches an original document file from storage onto local disk, streamed
+    in blocks so large files never sit in memory.
 
-    if not text or text.isspace():
-         raise ValueError("No text content extracted from the document.")
+    Returns:
+        tuple: (file_path, temporary) where the caller must delete file_path when temporary is True
+    """
+    try:
+        return get_storage().fetch_to_path(DOCUMENTS_BUCKET, storage_path)
+    except Exception as e:
+        logger.error(f"Failed to download file {storage_path} from storage: {e}")
+        raise ConnectionError("Failed to download from storage.") from e
 
-    # 3. Chunk the text
-    text_chunks = chunk_text(text)
-    if not text_chunks:
-        logger.warning(f"No text chunks generated for document: {original_filename}")
-        # Decide if you want to proceed without chunks or raise an error
-        raise ValueError("Document processed but resulted in no text chunks.")
+def remove_original_file(storage_path: str):
+    """Queues an original document file for deletion by the storage sweeper."""
+    try:
+        storage_gc.enqueue_deletion(DOCUMENTS_BUCKET, [storage_path])
+        logger.info(f"Queued storage file {storage_path} for cleanup.")
+    except Exception as cleanup_e:
+        logger.error(f"Failed to queue cleanup of storage file {storage_path}: {cleanup_e}")
 
+class _BackgroundUpload:
+    """
+    Uploads an original file on a background thread, so the network transfer
+    overlaps with parsing and embedding. The storage path is fixed up front,
+    so the Document row can reference it before the upload has finished.
+    """
 
-    # 4. Generate Embeddings (batch for efficiency)
-    try:
-        embeddings = embed_texts(text_chunks)
-        logger.info(f"Generated {len(embeddings)} embeddings for {len(text_chunks)} chunks.")
-    except Exception as e:
-         logger.error(f"Failed to generate embeddings: {e}")
-         # Consider cleaning up the uploaded file if embeddings fail
-         # supabase.storage.from_("medical_documents").remove([storage_path])
-         raise RuntimeError("Failed to generate embeddings.") from e
+    def __init__(self, source, original_filename: str, metrics: IngestionMetrics = None):
+        self.storage_path = make_storage_path(original_filename)
+        self._metrics = metrics
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(source, original_filename),
+            name=f"storage-upload-{self.storage_path}", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, source, original_filename: str):
+        start = time.perf_counter()
+        try:
+            upload_original_file(source, original_filename, storage_path=self.storage_path)
+        except Exception as e:
+            self._error = e
+        if self._metrics is not None:
+            # Wall time only: this thread's CPU cannot be separated from the pipeline's
+            self._metrics.record('upload', time.perf_counter() - start)
+
+    def join(self):
+        """Waits for the upload, re-raising its error (a ConnectionError) if it failed."""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def discard(self):
+        """Waits for the upload to settle, then removes the uploaded file if it was stored."""
+        self._thread.join()
+        if self._error is None:
+            remove_original_file(self.storage_path)
 
-    # 5. Store in Database (using a transaction)
+def compute_content_hash(source) -> str:
+    """Returns the SHA-256 hex digest used to detect re-uploads of identical files."""
+    return uploads.hash_source(source)
+
+def _link_duplicate_document(source, original_filename: str, standard_type, batch_size: int = None):
+    """
+    Creates a Document for another standard type that shares the source
+    document's stored file instead of parsing and embedding the file again.
+    Its chunks carry the text and metadata but no embedding: each points at
+    the source chunk holding the vector (canonical_chunk), so retrieval finds
+    the passage once.
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
     try:
         with transaction.atomic():
-            # Create Document record with standard_type as foreign key
             doc_instance = Document.objects.create(
                 file_name=original_filename,
-                standard_type=standard_type,  # Use the StandardType object
-                supabase_storage_path=storage_path
-                # Add any other metadata if needed
+                standard_type=standard_type,
+                supabase_storage_path=source.supabase_storage_path,
+                content_hash=source.content_hash,
+                metadata={
+                    'linked_from_document_id': str(source.id),
+                    'boilerplate_lines_removed': (source.metadata or {}).get('boilerplate_lines_removed', 0)
+                }
             )
-
-            # Create DocumentChunk records in bulk
-            chunks_to_create = []
-            for i, chunk in enumerate(text_chunks):
-                 if i < len(embeddings): # Safety check
-                    chunk_data = DocumentChunk(
+            # A source chunk that is itself linked passes on its own canonical chunk
+            source_chunks = source.chunks.annotate(
+                linked=ExpressionWrapper(Q(embedding__isnull=True), output_field=BooleanField())
+            ).values_list('id', 'chunk_text', 'metadata', 'minhash', 'canonical_chunk_id', 'linked').iterator(chunk_size=batch_size)
+            chunk_count = 0
+            for batch in _batched(source_chunks, batch_size):
+                chunk_count += chunk_insert.insert_chunks([
+                    DocumentChunk(
                         document=doc_instance,
-                        chunk_text=chunk,
-                        embedding=embeddings[i],
-                        metadata={'chunk_index': i} # Example metadata
+                        chunk_text=chunk_text,
+                        embedding=None,
+                        metadata=metadata,
+                        minhash=signature,
+                        canonical_chunk_id=canonical_chunk_id if linked else chunk_id
                     )
-                    chunks_to_create.append(chunk_data)
-                 else:
-                     logger.warning(f"Mismatch between chunks and embeddings count for {original_filename}")
-                     break # Avoid index error
-
-            if chunks_to_create:
-                 DocumentChunk.objects.bulk_create(chunks_to_create)
-                 logger.info(f"Stored {len(chunks_to_create)} chunks in DB for document {doc_instance.id}")
+                    for chunk_id, chunk_text, metadata, signature, canonical_chunk_id, linked in batch
+                ], batch_size=batch_size)
+    except IntegrityError:
+        # A concurrent upload of the same file for this standard type got there first
+        return Document.objects.get(standard_type=standard_type, content_hash=source.content_hash)
+
+    logger.info(f"Linked {original_filename} to existing content of document {source.id} ({chunk_count} chunks linked)")
+    return doc_instance
+
+def _release_linked_chunks(chunk_ids, batch_size: int = None):
+    """
+    Hands the embeddings of chunks about to be deleted to the linked chunks
+    that point at them: the oldest linked copy of each chunk takes over the
+    embedding, and the other copies are pointed at it. Call inside the
+    transaction that deletes the chunks.
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    chunk_ids = list(chunk_ids)
+    for start in range(0, len(chunk_ids), batch_size):
+        linked = list(
+            DocumentChunk.objects.filter(canonical_chunk_id__in=chunk_ids[start:start + batch_size], embedding__isnull=True)
+            .order_by('created_at', 'id')
+            .values_list('id', 'canonical_chunk_id')
+        )
+        if not linked:
+            continue
+        embeddings = dict(
+            DocumentChunk.objects.filter(id__in={canonical_id for _, canonical_id in linked}).values_list('id', 'embedding')
+        )
+        successors = {}
+        updates = []
+        for chunk_id, canonical_id in linked:
+            if canonical_id not in successors:
+                successors[canonical_id] = chunk_id
+                updates.append(DocumentChunk(id=chunk_id, embedding=embeddings[canonical_id], canonical_chunk_id=None))
             else:
-                 logger.warning(f"No chunks were created in DB for document {doc_instance.id}")
-                 # Potentially delete the doc_instance if no chunks were saved? Depends on requirements.
+                updates.append(DocumentChunk(id=chunk_id, embedding=None, canonical_chunk_id=successors[canonical_id]))
+        DocumentChunk.objects.bulk_update(updates, ['embedding', 'canonical_chunk'], batch_size=batch_size)
+        logger.info(f"Handed {len(successors)} embedding(s) to linked chunks before deleting their canonical chunks")
+
+def resolve_duplicate_upload(content_hash: str, original_filename: str, standard_type, batch_size: int = None):
+    """
+    Short-circuits an upload whose exact bytes have been ingested before.
+
+    Returns:
+        Document or None: The existing document for this standard type, a new
+        document linked to the existing chunks if the file was ingested under a
+        different standard type, or None if the content is new.
+    """
+    existing = Document.objects.filter(content_hash=content_hash).order_by('uploaded_at')
+    same_type = existing.filter(standard_type=standard_type).first()
+    if same_type is not None:
+        logger.info(f"Upload of {original_filename} matches existing document {same_type.id}; skipping ingestion")
+        return same_type
+
+    source = existing.first()
+    if source is None:
+        return None
+    return _link_duplicate_document(source, original_filename, standard_type, batch_size)
+
+def ingest_stored_document(source, original_filename: str, standard_type, storage_path: str,
+                           progress_callback=None, batch_size: int = None, document_id=None,
+                           content_hash: str = None, before_commit=None, metrics: IngestionMetrics = None):
+    """
+    Parses, chunks, embeds and saves a document whose original file is already
+    in Supabase Storage. Storage cleanup on failure is left to the caller.
+
+    Args:
+        source: Raw bytes of the original file, or its path on disk
+        original_filename: Original filename of the uploaded file
+        standard_type: StandardType instance for this document
+        storage_path: Path of the original file in Supabase Storage
+        progress_callback: Optional callable(stage, progress_percent)
+        batch_size: Chunks embedded and inserted per batch (default EMBEDDING_BATCH_SIZE)
+        document_id: Optional pre-assigned UUID for the Document row
+        content_hash: SHA-256 of the file; if a document with this hash already
+            exists for the standard type, that document is returned instead
+        before_commit: Optional callable run just before the transaction commits;
+            an exception from it rolls everything back
+        metrics: Optional IngestionMetrics to add to; the per-stage timings and
+            counts are saved in Document.metadata['ingestion']
+    """
+    file_extension = os.path.splitext(original_filename)[1].lower()
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    metrics = metrics or IngestionMetrics()
+
+    if content_hash:
+        existing = Document.objects.filter(standard_type=standard_type, content_hash=content_hash).first()
+        if existing is not None:
+            return existing
+
+    if file_extension not in BACKENDS_BY_EXTENSION:
+        raise ValueError("Unsupported file type. Only PDF and DOCX are allowed.")
+
+    # Pages stream into the chunker, chunks are embedded in fixed-size batches and
+    # each batch is inserted before the next is produced, so memory is bounded by
+    # the batch size rather than by the size of the document.
+    _report_progress(progress_callback, 'parsing', 10)
+    metrics.add('file_bytes', uploads.source_size(source))
+    with metrics.stage('parse'):
+        total_pages = count_pages(source, file_extension)
+    stripper = BoilerplateStripper()
+    pages = _counted_pages(stripper.strip(metrics.timed_iter(iter_document_pages(source, file_extension), 'parse')), metrics)
+    chunks = metrics.timed_iter(iter_text_chunks(pages), 'chunk')
+
+    try:
+        with transaction.atomic():
+            # Create Document record with standard_type as foreign key
+            try:
+                with transaction.atomic(), metrics.stage('insert'):
+                    doc_instance = Document.objects.create(
+                        id=document_id or uuid.uuid4(),
+                        file_name=original_filename,
+                        standard_type=standard_type,  # Use the StandardType object
+                        supabase_storage_path=storage_path,
+                        content_hash=content_hash
+                    )
+            except IntegrityError:
+                if not content_hash:
+                    raise
+                # The same file was ingested concurrently; use that document
+                return Document.objects.get(standard_type=standard_type, content_hash=content_hash)
+
+            chunk_count = 0
+            for batch in _batched(chunks, batch_size):
+                try:
+                    with metrics.stage('embed'):
+                        embeddings = embed_texts([chunk for _, chunk, _ in batch])
+                except Exception as e:
+                    logger.error(f"Failed to generate embeddings: {e}")
+                    raise RuntimeError("Failed to generate embeddings.") from e
+
+                with metrics.stage('insert'):
+                    chunk_insert.insert_chunks([
+                        DocumentChunk(
+                            document=doc_instance,
+                            chunk_text=chunk,
+                            embedding=embedding,
+                            metadata={'chunk_index': chunk_count + i, 'page': page_number, **span}
+                        )
+                        for i, ((page_number, chunk, span), embedding) in enumerate(zip(batch, embeddings))
+                    ], batch_size=batch_size)
+                chunk_count += len(batch)
+                metrics.add('chunks', len(batch))
+                metrics.add('tokens', sum(span.get('token_count', 0) for _, _, span in batch))
+
+                if total_pages:
+                    last_page = batch[-1][0]
+                    _report_progress(progress_callback, 'embedding', 10 + int(85 * last_page / total_pages))
+                else:
+                    _report_progress(progress_callback, 'embedding', 50)
+
+            if chunk_count == 0:
+                raise ValueError("No text content extracted from the document.")
+            logger.info(f"Stored {chunk_count} chunks in DB for document {doc_instance.id}")
 
+            if before_commit is not None:
+                with metrics.stage('upload_wait'):
+                    before_commit()
+
+            doc_instance.metadata = dict(
+                doc_instance.metadata or {},
+                boilerplate_lines_removed=stripper.lines_removed,
+                ingestion=dict(metrics.as_dict(), recorded_at=timezone.now().isoformat())
+            )
+            doc_instance.save(update_fields=['metadata'])
+
+        _report_progress(progress_callback, 'completed', 100)
         return doc_instance # Return the created Document object
 
+    except (ValueError, RuntimeError):
+        raise
     except Exception as e:
         logger.error(f"Failed to save document and chunks to database: {e}")
-        # Clean up uploaded file if DB transaction fails
-        try:
-            supabase.storage.from_("medical-documents").remove([storage_path])
-            logger.info(f"Cleaned up storage file {storage_path} after DB error.")
-        except Exception as cleanup_e:
-            logger.error(f"Failed to cleanup storage file {storage_path}: {cleanup_e}")
         raise
 
+def process_and_store_document(file_obj, original_filename: str, standard_type_id: str,
+                               batch_size: int = None, document_id=None):
+    """
+    Full pipeline: Reads file, uploads to Supabase Storage, parses, chunks,
+    embeds, and saves everything to the database in the calling thread.
+    
+    Args:
+        file_obj: File object to process
+        original_filename: Original filename of the uploaded file
+        standard_type_id: ID of the StandardType for this document
+        batch_size: Chunks embedded and inserted per batch (default EMBEDDING_BATCH_SIZE)
+        document_id: Optional pre-assigned UUID for the Document row
+    """
+    # Validate standard_type_id before touching storage
+    standard_type = get_standard_type(standard_type_id)
+
+    # Large files stay on disk: they are hashed, uploaded and parsed from there
+    file_extension = os.path.splitext(original_filename)[1].lower()
+    with uploads.spooled_file(file_obj, suffix=file_extension) as source:
+        return _process_and_store_source(
+            source, original_filename, standard_type, batch_size=batch_size, document_id=document_id
+        )
+
+def _process_and_store_source(source, original_filename: str, standard_type, batch_size: int = None, document_id=None):
+    metrics = IngestionMetrics()
+    # Identical bytes never reach storage or the embedding model twice
+    with metrics.stage('hash'):
+        content_hash = compute_content_hash(source)
+    duplicate = resolve_duplicate_upload(content_hash, original_filename, standard_type, batch_size)
+    if duplicate is not None:
+        return duplicate
+
+    # The upload runs alongside parsing and embedding and is joined before the
+    # commit, so a Document never commits pointing at a file that failed to upload
+    upload = _BackgroundUpload(source, original_filename, metrics)
+    try:
+        doc_instance = ingest_stored_document(
+            source, original_filename, standard_type, upload.storage_path,
+            batch_size=batch_size, document_id=document_id, content_hash=content_hash,
+            before_commit=upload.join, metrics=metrics
+        )
+    except Exception:
+        # Clean up uploaded file if any stage fails (once the upload has settled)
+        upload.discard()
+        raise
+
+    if doc_instance.supabase_storage_path != upload.storage_path:
+        # Resolved to a concurrently ingested copy, so our upload is unused
+        upload.discard()
+    return doc_instance
+
+def _chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+def get_replacement_target(document_id, original_filename: str):
+    """
+    Looks up a document that is about to be replaced and checks the new file type.
+
+    Raises:
+        ValueError: If the document does not exist or the file type is unsupported
+    """
+    file_extension = os.path.splitext(original_filename)[1].lower()
+    if file_extension not in BACKENDS_BY_EXTENSION:
+        raise ValueError("Unsupported file type. Only PDF and DOCX are allowed.")
+    try:
+        return Document.objects.get(id=document_id)
+    except (Document.DoesNotExist, ValueError, DjangoValidationError):
+        raise ValueError(f"Document with ID {document_id} not found.")
+
+def check_replacement_conflict(document, content_hash: str):
+    """Rejects a revision whose bytes are already stored as another document of the same standard type."""
+    conflict = (
+        Document.objects.filter(standard_type=document.standard_type, content_hash=content_hash)
+        .exclude(id=document.id).first()
+    )
+    if conflict is not None:
+        raise ValueError(f"This file is already stored as document {conflict.id}.")
+
+def replace_document(document, source, original_filename: str, storage_path: str, content_hash: str,
+                     progress_callback=None, batch_size: int = None, before_commit=None,
+                     metrics: IngestionMetrics = None):
+    """
+    Replaces a document with a revised version of its file, re-embedding only
+    what changed. Called by the ingestion worker for a replacement job; the
+    revised file is already in storage at storage_path.
+
+    The new file is chunked exactly as on upload and each chunk is matched to
+    an old chunk with identical text (by SHA-256). Matched rows and their
+    embeddings are kept, and only unmatched new chunks are embedded. Parsing
+    and embedding run without any lock; the new embeddings are held until the
+    end, when a short transaction locks the document, inserts them, deletes
+    old chunks with no match and updates the document. Chunking restarts at
+    every page, so an edit only disturbs the chunks of the pages it touches
+    and of the page after each: that page's first chunk takes its overlap
+    prefix from the end of the edited page, and a prefix of a different token
+    length also moves the cuts after it (see api/utils/token_chunker.py).
+
+    Args:
+        before_commit: Optional callable run inside the swap transaction just before it commits;
+            an exception from it rolls the swap back
+
+    Returns:
+        tuple: (document, stats) where stats counts kept, embedded and deleted chunks
+
+    Raises:
+        ValueError: If the revision has no text, or the file is already stored as another document
+        RuntimeError: If embedding fails, or the document changed while the revision was processed
+    """
+    file_extension = os.path.splitext(original_filename)[1].lower()
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    metrics = metrics or IngestionMetrics()
+    check_replacement_conflict(document, content_hash)
+    previous_hash = document.content_hash
+
+    # Old chunk IDs by text hash; a list per hash so repeated text matches once per copy.
+    # Read without a lock: the swap below checks that the document did not change meanwhile.
+    old_chunks = {}
+    for chunk_id, text, metadata in document.chunks.values_list('id', 'chunk_text', 'metadata'):
+        old_chunks.setdefault(_chunk_hash(text), []).append((chunk_id, metadata))
+
+    # Boilerplate is stripped exactly as on upload so unchanged chunks hash the same
+    _report_progress(progress_callback, 'parsing', 10)
+    metrics.add('file_bytes', uploads.source_size(source))
+    with metrics.stage('parse'):
+        total_pages = count_pages(source, file_extension)
+    stripper = BoilerplateStripper()
+    pages = _counted_pages(stripper.strip(metrics.timed_iter(iter_document_pages(source, file_extension), 'parse')), metrics)
+    chunks = metrics.timed_iter(iter_text_chunks(pages), 'chunk')
+    stats = {'kept': 0, 'embedded': 0, 'deleted': 0}
+
+    moved = []
+    # New chunks wait for the swap with their embeddings packed as float32 (1.5 KB per chunk)
+    staged = []
+    chunk_index = 0
+    for batch in _batched(chunks, batch_size):
+        new_chunks = []
+        for page_number, chunk, span in batch:
+            metadata = {'chunk_index': chunk_index, 'page': page_number, **span}
+            chunk_index += 1
+            matches = old_chunks.get(_chunk_hash(chunk))
+            if matches:
+                chunk_id, old_metadata = matches.pop()
+                stats['kept'] += 1
+                if old_metadata != metadata:
+                    moved.append(DocumentChunk(id=chunk_id, metadata=dict(old_metadata or {}, **metadata)))
+            else:
+                new_chunks.append((chunk, metadata))
+
+        if new_chunks:
+            try:
+                with metrics.stage('embed'):
+                    embeddings = embed_texts([chunk for chunk, _ in new_chunks])
+            except Exception as e:
+                logger.error(f"Failed to generate embeddings: {e}")
+                raise RuntimeError("Failed to generate embeddings.") from e
+            staged.extend(
+                (chunk, metadata, array('f', embedding)) for (chunk, metadata), embedding in zip(new_chunks, embeddings)
+            )
+        metrics.add('chunks', len(batch))
+        metrics.add('tokens', sum(span.get('token_count', 0) for _, _, span in batch))
+        if total_pages:
+            _report_progress(progress_callback, 'embedding', 10 + int(80 * batch[-1][0] / total_pages))
+        else:
+            _report_progress(progress_callback, 'embedding', 50)
+
+    if chunk_index == 0:
+        raise ValueError("No text content extracted from the document.")
+
+    _report_progress(progress_callback, 'saving', 95)
+    old_storage_path = document.supabase_storage_path
+    with transaction.atomic():
+        document = Document.objects.select_for_update().get(id=document.id)
+        if document.content_hash != previous_hash:
+            # Another revision was committed meanwhile; the chunk matches above are stale
+            raise RuntimeError(f"Document {document.id} changed while the revision was processed.")
+        old_storage_path = document.supabase_storage_path
+
+        with metrics.stage('insert'):
+            for start in range(0, len(staged), batch_size):
+                stats['embedded'] += chunk_insert.insert_chunks([
+                    DocumentChunk(document=document, chunk_text=chunk, embedding=list(embedding), metadata=metadata)
+                    for chunk, metadata, embedding in staged[start:start + batch_size]
+                ], batch_size=batch_size)
+            # Kept chunks whose position changed get their page/index updated in place
+            DocumentChunk.objects.bulk_update(moved, ['metadata'], batch_size=batch_size)
+
+            removed_ids = [chunk_id for matches in old_chunks.values() for chunk_id, _ in matches]
+            # Linked documents keep the previous revision's text, so they take over its vectors
+            _release_linked_chunks(removed_ids, batch_size)
+            for start in range(0, len(removed_ids), batch_size):
+                DocumentChunk.objects.filter(id__in=removed_ids[start:start + batch_size]).delete()
+        stats['deleted'] = len(removed_ids)
+
+        if before_commit is not None:
+            before_commit()
+
+        document.file_name = original_filename
+        document.supabase_storage_path = storage_path
+        document.content_hash = content_hash
+        document.metadata = dict(
+            document.metadata or {},
+            boilerplate_lines_removed=stripper.lines_removed,
+            last_revision=dict(stats, replaced_at=timezone.now().isoformat()),
+            ingestion=dict(metrics.as_dict(), recorded_at=timezone.now().isoformat())
+        )
+        document.save(update_fields=['file_name', 'supabase_storage_path', 'content_hash', 'metadata'])
+
+    # URLs signed for the previous original must not be handed out for the revision
+    signed_urls.invalidate(DOCUMENTS_BUCKET, old_storage_path)
+    # The previous original is no longer needed unless a linked document still uses it
+    if not Document.objects.filter(supabase_storage_path=old_storage_path).exists():
+        remove_original_file(old_storage_path)
+
+    logger.info(
+        f"Replaced document {document.id}: {stats['kept']} chunks kept, "
+        f"{stats['embedded']} embedded, {stats['deleted']} deleted"
+    )
+    return document, stats
+
 def get_all_documents():
     """
     Retrieves all documents with metadata including derived extension type.
@@ -262,6 +872,7 @@ def get_document_by_id(document_id):
             'standard_type_name': document.standard_type.name,
             'uploaded_at': document.uploaded_at,
             'document_extension_type': ext,
+            'ingestion': (document.metadata or {}).get('ingestion'),  # Per-stage timings, if recorded
         }
         
         return result, None  # Return data and no error
@@ -270,9 +881,57 @@ def get_document_by_id(document_id):
         logger.exception(f"Error retrieving document {document_id}: {e}")
         return None, f"Failed to retrieve document: {str(e)}"
 
+def get_ingestion_stats(limit: int = 100):
+    """
+    Aggregates the per-stage ingestion metrics of the most recent uploads.
+
+    Args:
+        limit: Number of most recent documents with recorded metrics to include
+
+    Returns:
+        tuple: (stats, error_message) where stats has p50/p95 wall and CPU
+            milliseconds per stage and for the whole run
+    """
+    try:
+        samples = list(
+            Document.objects.filter(metadata__has_key='ingestion')
+            .order_by('-uploaded_at')
+            .values_list('metadata', flat=True)[:limit]
+        )
+        ingestions = [metadata['ingestion'] for metadata in samples]
+
+        def summarize(values):
+            return {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95)}
+
+        stages = {}
+        for stage in STAGES:
+            timings = [item['stages'][stage] for item in ingestions if stage in item.get('stages', {})]
+            if timings:
+                stages[stage] = {
+                    'samples': len(timings),
+                    'wall_ms': summarize([t['wall_ms'] for t in timings]),
+                    'cpu_ms': summarize([t['cpu_ms'] for t in timings]),
+                }
+
+        stats = {
+            'documents': len(ingestions),
+            'oldest_recorded_at': min((item['recorded_at'] for item in ingestions if item.get('recorded_at')), default=None),
+            'total_wall_ms': summarize([item['total_wall_ms'] for item in ingestions]),
+            'stages': stages,
+            'counts': {
+                name: summarize([item['counts'][name] for item in ingestions if name in item.get('counts', {})])
+                for name in ('file_bytes', 'pages', 'characters', 'chunks', 'tokens')
+            },
+        }
+        return stats, None
+    except Exception as e:
+        logger.exception(f"Error aggregating ingestion metrics: {e}")
+        return None, f"Failed to aggregate ingestion metrics: {str(e)}"
+
 def delete_document(document_id):
     """
-    Deletes a document by ID, including its file in storage and related chunks.
+    Deletes a document by ID and its related chunks, and queues its file in
+    storage for deletion by the storage sweeper.
     
     Args:
         document_id: UUID of the document to delete
@@ -289,22 +948,26 @@ def delete_document(document_id):
         except Document.DoesNotExist:
             return False, f"Document with ID {document_id} not found."
         
-        # Get Supabase client
-        supabase = get_supabase_client()
-        
-        # 1. Delete file from Supabase storage
         storage_path = document.supabase_storage_path
-        try:
-            # Delete from the medical-documents bucket
-            supabase.storage.from_("medical-documents").remove([storage_path])
-            logger.info(f"Deleted file {storage_path} from Supabase storage")
-        except Exception as e:
-            logger.error(f"Failed to delete file from storage: {e}")
-            # Continue with DB deletion even if storage deletion fails
-        
-        # 2. Delete document and related chunks from database
-        # Django will automatically delete related chunks due to CASCADE
-        document.delete()
+        shared = Document.objects.filter(supabase_storage_path=storage_path).exclude(id=document.id).exists()
+        with transaction.atomic():
+            # 1. Queue the file for deletion, unless a linked document still uses it.
+            # The sweeper checks references again before deleting anything.
+            if shared:
+                logger.info(f"Keeping {storage_path} in storage; it is shared with another document")
+            else:
+                storage_gc.enqueue_deletion(DOCUMENTS_BUCKET, [storage_path])
+            # Pending replacements are deleted with the document (by cascade); so are their revised files
+            storage_gc.enqueue_deletion(
+                DOCUMENTS_BUCKET, document.replacement_jobs.values_list('supabase_storage_path', flat=True)
+            )
+
+            # 2. Delete document and related chunks from database
+            # Django will automatically delete related chunks due to CASCADE;
+            # chunks of linked documents that used their vectors take them over first
+            _release_linked_chunks(document.chunks.values_list('id', flat=True))
+            document.delete()
+        signed_urls.invalidate(DOCUMENTS_BUCKET, storage_path)
         logger.info(f"Deleted document {document_id} and its chunks from database")
         
         return True, None  # Success, no error
@@ -313,55 +976,39 @@ def delete_document(document_id):
         logger.exception(f"Error deleting document {document_id}: {e}")
         return False, f"Failed to delete document: {str(e)}"
 
-def download_document(document_id):
+def get_document_file(document_id):
     """
-    Retrieves document file content and metadata for download.
+    Looks up where a document's original file is stored, for streaming it to a client.
     
     Args:
         document_id: UUID of the document to download
         
     Returns:
-        tuple: (file_content, file_name, content_type, error_message)
-            - file_content: Binary content of the file or None if error
-            - file_name: Original filename or None if error
-            - content_type: MIME type of the file or None if error
+        tuple: (file_info, error_message)
+            - file_info: dict with bucket, storage_path, file_name and content_type, or None if error
             - error_message: Error message or None if successful
     """
     try:
-        # Get document from database
         try:
             document = Document.objects.get(id=document_id)
         except Document.DoesNotExist:
-            return None, None, None, f"Document with ID {document_id} not found."
-        
-        # Get Supabase client
-        supabase = get_supabase_client()
-        
-        # Get storage path from document
-        storage_path = document.supabase_storage_path
-        
-        try:
-            # Download file from Supabase storage
-            file_content = supabase.storage.from_("medical-documents").download(storage_path)
-            
-            # Determine content type based on file extension
-            import mimetypes
-            _, ext = os.path.splitext(document.file_name)
-            content_type = mimetypes.guess_type(document.file_name)[0]
-            if not content_type:
-                # Default content types for common document formats
-                content_type_map = {
-                    '.pdf': 'application/pdf',
-                    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                }
-                content_type = content_type_map.get(ext.lower(), 'application/octet-stream')
-            
-            return file_content, document.file_name, content_type, None
-            
-        except Exception as e:
-            logger.error(f"Failed to download file from storage: {e}")
-            return None, None, None, f"Failed to download document: {str(e)}"
-            
+            return None, f"Document with ID {document_id} not found."
+
+        # Determine content type based on file extension
+        import mimetypes
+        _, ext = os.path.splitext(document.file_name)
+        content_type = mimetypes.guess_type(document.file_name)[0]
+        if not content_type:
+            # Default content types for common document formats
+            content_type = CONTENT_TYPE_MAP.get(ext.lower(), 'application/octet-stream')
+
+        return {
+            'bucket': DOCUMENTS_BUCKET,
+            'storage_path': document.supabase_storage_path,
+            'file_name': document.file_name,
+            'content_type': content_type,
+            'content_hash': document.content_hash,
+        }, None
     except Exception as e:
-        logger.exception(f"Error downloading document {document_id}: {e}")
-        raise
+        logger.exception(f"Error retrieving document {document_id} for download: {e}")
+        return None, f"Failed to retrieve document: {str(e)}"
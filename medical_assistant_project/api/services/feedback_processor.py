@@ -1,16 +1,42 @@
 import io
-import uuid
 import logging
-from django.db import transaction
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.db import connection, transaction
 from api.models import Feedback, FeedbackAttachment
-from api.utils.supabase_client import get_supabase_client
-import os
+from api.services import blob_store
+from api.utils import uploads, zip_export
 
 logger = logging.getLogger(__name__)
 
+ATTACHMENT_UPLOAD_WORKERS = getattr(settings, 'ATTACHMENT_UPLOAD_WORKERS', 4)
+ATTACHMENT_EXPORT_MAX_FILES = getattr(settings, 'ATTACHMENT_EXPORT_MAX_FILES', 1000)
+
+def _store_attachment_file(file_obj):
+    """Uploads an attachment file, or references the stored copy of identical content. Returns the blob."""
+    # Use correct content-type based on extension
+    import mimetypes
+    content_type = mimetypes.guess_type(file_obj.name)[0]
+    if not content_type:
+        content_type = 'application/octet-stream'
+
+    # Streamed from the spooled temp file for large uploads
+    with uploads.spooled_file(file_obj) as source:
+        blob, _ = blob_store.acquire_blob(
+            "feedback-attachments", source, "feedback-attachments", file_obj.name, content_type=content_type
+        )
+    return blob
+
+def _store_attachment_file_in_thread(file_obj):
+    try:
+        return _store_attachment_file(file_obj)
+    finally:
+        connection.close()  # Each pool thread opens its own database connection
+
 def process_and_store_attachment(file_obj, feedback_instance):
     """
-    Uploads a feedback attachment file to Supabase Storage and creates a FeedbackAttachment record.
+    Stores a feedback attachment file and creates a FeedbackAttachment record.
+    A file already stored for another attachment is reused instead of uploaded again.
     
     Args:
         file_obj: File object to process
@@ -19,94 +45,162 @@ def process_and_store_attachment(file_obj, feedback_instance):
     Returns:
         FeedbackAttachment: The created attachment instance
     """
-    supabase = get_supabase_client()
-    file_content = file_obj.read()
-    original_filename = file_obj.name
-    file_extension = os.path.splitext(original_filename)[1].lower()
-    
-    # 1. Upload file to Supabase Storage
-    storage_path = f"feedback-attachments/{uuid.uuid4()}_{original_filename}"  # Ensure unique path
-    try:
-        # Use correct content-type based on extension
-        import mimetypes
-        content_type = mimetypes.guess_type(original_filename)[0]
-        if not content_type:
-            content_type = 'application/octet-stream'
-            
-        upload_response = supabase.storage.from_("feedback-attachments").upload(  # Bucket name
-            path=storage_path,
-            file=file_content,
-            file_options={"content-type": content_type}
-        )
-        logger.info(f"File uploaded to Supabase Storage: {storage_path}")
-    except Exception as e:
-        logger.error(f"Failed to upload file to Supabase Storage: {e}")
-        raise ConnectionError("Failed to upload attachment to storage.") from e
+    # 1. Upload file to storage, or reference the stored copy of identical content
+    blob = _store_attachment_file(file_obj)
     
     # 2. Create FeedbackAttachment record
     try:
         attachment = FeedbackAttachment.objects.create(
             feedback=feedback_instance,
-            file_name=original_filename,
-            supabase_storage_path=storage_path
+            file_name=file_obj.name,
+            supabase_storage_path=blob.storage_path
         )
         logger.info(f"Created attachment record for feedback {feedback_instance.reference_number}")
         return attachment
     except Exception as e:
-        # Clean up uploaded file if DB transaction fails
+        # Give back the file reference if the DB insert fails
         try:
-            supabase.storage.from_("feedback-attachments").remove([storage_path])
-            logger.info(f"Cleaned up storage file {storage_path} after DB error.")
+            blob_store.release_blob("feedback-attachments", blob.storage_path)
         except Exception as cleanup_e:
-            logger.error(f"Failed to cleanup storage file {storage_path}: {cleanup_e}")
+            logger.error(f"Failed to release storage file {blob.storage_path}: {cleanup_e}")
         raise
 
+def store_attachments(files, feedback_instance):
+    """
+    Stores several attachment files concurrently and creates their
+    FeedbackAttachment records with a single insert, so a submission takes
+    about as long as its slowest upload. A file that fails does not stop the others.
+    
+    Args:
+        files: Uploaded file objects
+        feedback_instance: Feedback instance to associate the attachments with
+        
+    Returns:
+        tuple: (attachments, errors) where errors lists {'file_name', 'error'}
+            for each file that could not be stored, in upload order
+    """
+    if not files:
+        return [], []
+
+    results = [None] * len(files)
+    workers = min(len(files), max(1, ATTACHMENT_UPLOAD_WORKERS))
+    if workers == 1:
+        for index, file_obj in enumerate(files):
+            try:
+                results[index] = _store_attachment_file(file_obj)
+            except Exception as e:
+                results[index] = e
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='attachment-upload') as executor:
+            futures = {executor.submit(_store_attachment_file_in_thread, file_obj): index for index, file_obj in enumerate(files)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+
+    errors = []
+    stored = []
+    for file_obj, result in zip(files, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to store attachment {file_obj.name}: {result}")
+            errors.append({'file_name': file_obj.name, 'error': str(result)})
+        else:
+            stored.append((file_obj, result))
+    if not stored:
+        return [], errors
+
+    try:
+        attachments = FeedbackAttachment.objects.bulk_create([
+            FeedbackAttachment(feedback=feedback_instance, file_name=file_obj.name, supabase_storage_path=blob.storage_path)
+            for file_obj, blob in stored
+        ])
+    except Exception as e:
+        logger.exception(f"Failed to create attachment records for feedback {feedback_instance.reference_number}: {e}")
+        for file_obj, blob in stored:
+            try:
+                blob_store.release_blob("feedback-attachments", blob.storage_path)
+            except Exception as cleanup_e:
+                logger.error(f"Failed to release storage file {blob.storage_path}: {cleanup_e}")
+            errors.append({'file_name': file_obj.name, 'error': f"Failed to save attachment: {str(e)}"})
+        return [], errors
+
+    logger.info(f"Created {len(attachments)} attachment record(s) for feedback {feedback_instance.reference_number}")
+    return attachments, errors
+
 def get_feedback_attachment(attachment_id):
     """
-    Retrieves a feedback attachment file from Supabase Storage.
+    Looks up where a feedback attachment is stored, for streaming it to a client.
     
     Args:
         attachment_id: UUID of the attachment to retrieve
         
     Returns:
-        tuple: (file_content, file_name, content_type, error_message)
+        tuple: (file_info, error_message) where file_info has bucket, storage_path,
+            file_name and content_type
     """
     try:
-        # Get attachment from database
         try:
             attachment = FeedbackAttachment.objects.get(id=attachment_id)
         except FeedbackAttachment.DoesNotExist:
-            return None, None, None, f"Attachment with ID {attachment_id} not found."
-        
-        # Get Supabase client
-        supabase = get_supabase_client()
-        
-        # Get storage path from attachment
-        storage_path = attachment.supabase_storage_path
+            return None, f"Attachment with ID {attachment_id} not found."
+
+        # Determine content type based on file extension
+        import mimetypes
+        content_type = mimetypes.guess_type(attachment.file_name)[0]
+        if not content_type:
+            content_type = 'application/octet-stream'
+
+        return {
+            'bucket': "feedback-attachments",
+            'storage_path': attachment.supabase_storage_path,
+            'file_name': attachment.file_name,
+            'content_type': content_type,
+        }, None
+    except Exception as e:
+        logger.exception(f"Error retrieving attachment {attachment_id}: {e}")
+        return None, f"Error retrieving attachment: {str(e)}"
+
+def get_attachment_export(feedback_queryset, single_feedback: bool = False):
+    """
+    Lists the attachments of a set of feedback entries as ZIP archive entries.
+    Files are grouped in a folder per feedback reference number unless the
+    export is for a single feedback entry.
+    
+    Args:
+        feedback_queryset: Feedback entries whose attachments to export
+        single_feedback: Put the files at the top level of the archive
         
-        try:
-            # Download file from Supabase storage
-            file_content = supabase.storage.from_("feedback-attachments").download(storage_path)
-            
-            # Determine content type based on file extension
-            import mimetypes
-            content_type = mimetypes.guess_type(attachment.file_name)[0]
-            if not content_type:
-                content_type = 'application/octet-stream'
-            
-            return file_content, attachment.file_name, content_type, None
-            
-        except Exception as e:
-            logger.error(f"Failed to download file from storage: {e}")
-            return None, None, None, f"Failed to download attachment: {str(e)}"
-            
+    Returns:
+        tuple: (entries, error_message) where entries are (bucket, storage_path, archive_name)
+    """
+    try:
+        attachments = list(
+            FeedbackAttachment.objects.filter(feedback__in=feedback_queryset)
+            .select_related('feedback')
+            .order_by('feedback__reference_number', 'uploaded_at')[:ATTACHMENT_EXPORT_MAX_FILES + 1]
+        )
+        if len(attachments) > ATTACHMENT_EXPORT_MAX_FILES:
+            return None, f"Too many attachments to export at once (limit {ATTACHMENT_EXPORT_MAX_FILES}); narrow the filters."
+
+        used_names = set()
+        entries = []
+        for attachment in attachments:
+            file_name = attachment.file_name.replace('/', '_').replace('\\', '_') or 'attachment'
+            if not single_feedback:
+                file_name = f"{attachment.feedback.reference_number or attachment.feedback_id}/{file_name}"
+            entries.append((
+                "feedback-attachments", attachment.supabase_storage_path, zip_export.unique_name(file_name, used_names)
+            ))
+        return entries, None
     except Exception as e:
-        logger.exception(f"Error downloading attachment {attachment_id}: {e}")
-        return None, None, None, f"Error retrieving attachment: {str(e)}"
+        logger.exception(f"Error listing attachments for export: {e}")
+        return None, f"Error listing attachments: {str(e)}"
 
 def delete_feedback_attachment(attachment_id):
     """
-    Deletes a feedback attachment by ID, including its file in storage.
+    Deletes a feedback attachment by ID and releases its file in storage,
+    which the storage sweeper deletes once no other attachment uses it.
     
     Args:
         attachment_id: UUID of the attachment to delete
@@ -121,21 +215,10 @@ def delete_feedback_attachment(attachment_id):
         except FeedbackAttachment.DoesNotExist:
             return False, f"Attachment with ID {attachment_id} not found."
         
-        # Get Supabase client
-        supabase = get_supabase_client()
-        
-        # 1. Delete file from Supabase storage
-        storage_path = attachment.supabase_storage_path
-        try:
-            # Delete from the feedback-attachments bucket
-            supabase.storage.from_("feedback-attachments").remove([storage_path])
-            logger.info(f"Deleted file {storage_path} from Supabase storage")
-        except Exception as e:
-            logger.error(f"Failed to delete file from storage: {e}")
-            # Continue with DB deletion even if storage deletion fails
-        
-        # 2. Delete attachment from database
-        attachment.delete()
+        # Queue the file and delete the row together, so neither happens without the other
+        with transaction.atomic():
+            blob_store.release_blob("feedback-attachments", attachment.supabase_storage_path)
+            attachment.delete()
         logger.info(f"Deleted attachment {attachment_id} from database")
         
         return True, None  # Success, no error
@@ -0,0 +1,512 @@
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from api.models import IngestionJob
+from api.services import document_processor, upload_sessions
+from api.utils import uploads
+from api.utils.ingestion_metrics import IngestionMetrics
+
+logger = logging.getLogger(__name__)
+
+# Worker configuration (see settings.py for the environment variables)
+WORKER_THREADS = getattr(settings, 'INGESTION_WORKER_THREADS', 1)
+WORKER_AUTOSTART = getattr(settings, 'INGESTION_WORKER_AUTOSTART', True)
+POLL_INTERVAL_SECONDS = getattr(settings, 'INGESTION_POLL_INTERVAL_SECONDS', 2)
+HEARTBEAT_SECONDS = getattr(settings, 'INGESTION_HEARTBEAT_SECONDS', 10)
+JOB_LEASE_SECONDS = getattr(settings, 'INGESTION_JOB_LEASE_SECONDS', 300)
+MAX_ATTEMPTS = getattr(settings, 'INGESTION_MAX_ATTEMPTS', 3)
+SPOOL_DIR = getattr(settings, 'INGESTION_SPOOL_DIR', None)
+SPOOL_MAX_AGE_SECONDS = getattr(settings, 'INGESTION_SPOOL_MAX_AGE_HOURS', 24) * 3600
+
+def _spool_path(job_id, file_name: str) -> str:
+    return os.path.join(SPOOL_DIR, f"{job_id}{os.path.splitext(file_name)[1].lower()}")
+
+
+def _spool_source(source, job_id, file_name: str):
+    """
+    Keeps a local copy of a queued upload for the worker: a hard link to the
+    spooled temp file when possible, otherwise a copy. Written under a temp
+    name and renamed, so a worker never sees a partial file. Failures are only
+    logged, since the worker can always download the original instead.
+    """
+    if not SPOOL_DIR:
+        return
+    target = _spool_path(job_id, file_name)
+    temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        if uploads.is_path(source):
+            try:
+                os.link(source, temp_path)
+            except OSError:  # Another filesystem, or links unsupported
+                shutil.copyfile(source, temp_path)
+        else:
+            with open(temp_path, 'wb') as spool_file:
+                spool_file.write(source)
+        os.replace(temp_path, target)
+    except OSError as e:
+        logger.warning(f"Could not keep a local copy of {file_name} for job {job_id}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _remove_spooled_copy(job):
+    if SPOOL_DIR:
+        try:
+            os.remove(_spool_path(job.id, job.file_name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove the local copy for ingestion job {job.id}: {e}")
+
+
+def purge_stale_spool():
+    """
+    Removes local copies older than INGESTION_SPOOL_MAX_AGE_HOURS, such as
+    those of jobs that a worker on another host finished. Returns how many.
+    """
+    if not SPOOL_DIR or not os.path.isdir(SPOOL_DIR):
+        return 0
+    removed = 0
+    cutoff = time.time() - SPOOL_MAX_AGE_SECONDS
+    for name in os.listdir(SPOOL_DIR):
+        path = os.path.join(SPOOL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass  # Removed by another process meanwhile
+    return removed
+
+
+_workers_lock = threading.Lock()
+_worker_threads = []
+_workers_pid = None
+
+
+def enqueue_document(file_obj, original_filename: str, standard_type_id: str):
+    """
+    Stores the original file in Supabase Storage and queues it for background ingestion.
+
+    Args:
+        file_obj: File object to process
+        original_filename: Original filename of the uploaded file
+        standard_type_id: ID of the StandardType for this document
+
+    Files whose exact bytes were ingested before are not queued: the existing
+    (or newly linked) document is returned instead. A queued file is also kept
+    in INGESTION_SPOOL_DIR, so the worker can skip downloading it again.
+
+    Returns:
+        tuple: (job, duplicate_document)
+            - job: The queued IngestionJob, or None for a duplicate upload
+            - duplicate_document: The Document the upload resolved to, or None
+    """
+    standard_type = document_processor.get_standard_type(standard_type_id)
+
+    # Hashed and streamed to storage from the spooled temp file, never read whole
+    with uploads.spooled_file(file_obj) as source:
+        content_hash = document_processor.compute_content_hash(source)
+        duplicate = document_processor.resolve_duplicate_upload(content_hash, original_filename, standard_type)
+        if duplicate is not None:
+            return None, duplicate
+
+        storage_path = document_processor.upload_original_file(source, original_filename)
+        # The copy exists before the job does, so a worker that claims it straight away finds it
+        job_id = uuid.uuid4()
+        _spool_source(source, job_id, original_filename)
+    try:
+        job = IngestionJob.objects.create(
+            id=job_id,
+            file_name=original_filename,
+            standard_type=standard_type,
+            supabase_storage_path=storage_path,
+            content_hash=content_hash
+        )
+    except Exception:
+        document_processor.remove_original_file(storage_path)
+        _remove_spooled_copy(IngestionJob(id=job_id, file_name=original_filename))
+        raise
+    purge_stale_spool()
+
+    logger.info(f"Queued ingestion job {job.id} for {original_filename}")
+    ensure_workers_started()
+    return job, None
+
+
+def enqueue_replacement(document_id, file_obj, original_filename: str):
+    """
+    Stores a revised file for a document and queues the replacement of its
+    chunks for background processing.
+
+    Returns:
+        tuple: (job, unchanged_document)
+            - job: The queued IngestionJob, or None if the file is unchanged
+            - unchanged_document: The document, when its file already has these exact bytes
+
+    Raises:
+        ValueError: If the document does not exist, the file type is unsupported
+            or the file is already stored as another document
+        ConnectionError: If the file cannot be stored
+    """
+    document = document_processor.get_replacement_target(document_id, original_filename)
+
+    with uploads.spooled_file(file_obj) as source:
+        content_hash = document_processor.compute_content_hash(source)
+        if content_hash == document.content_hash:
+            return None, document
+        document_processor.check_replacement_conflict(document, content_hash)
+        storage_path = document_processor.upload_original_file(source, original_filename)
+        job_id = uuid.uuid4()
+        _spool_source(source, job_id, original_filename)
+    try:
+        job = IngestionJob.objects.create(
+            id=job_id,
+            file_name=original_filename,
+            standard_type=document.standard_type,
+            supabase_storage_path=storage_path,
+            content_hash=content_hash,
+            replaces_document=document
+        )
+    except Exception:
+        document_processor.remove_original_file(storage_path)
+        _remove_spooled_copy(IngestionJob(id=job_id, file_name=original_filename))
+        raise
+    purge_stale_spool()
+
+    logger.info(f"Queued replacement of document {document.id} as ingestion job {job.id}")
+    ensure_workers_started()
+    return job, None
+
+
+def get_job(job_id):
+    """
+    Retrieves an ingestion job by ID.
+
+    Returns:
+        tuple: (job, error_message)
+    """
+    try:
+        return IngestionJob.objects.get(id=job_id), None
+    except IngestionJob.DoesNotExist:
+        return None, f"Ingestion job with ID {job_id} not found."
+    except Exception as e:
+        logger.exception(f"Error retrieving ingestion job {job_id}: {e}")
+        return None, f"Failed to retrieve ingestion job: {str(e)}"
+
+
+def claim_next_job(worker_id: str):
+    """
+    Claims the oldest runnable job for this worker.
+
+    Queued jobs and running jobs whose heartbeat has expired (their worker was
+    restarted or killed) are both eligible. Rows are locked with
+    SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never claim the same job.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=JOB_LEASE_SECONDS)
+
+    # Give up on orphaned jobs that have already used all their attempts
+    exhausted = IngestionJob.objects.filter(
+        status=IngestionJob.STATUS_RUNNING, heartbeat_at__lt=stale_before, attempts__gte=MAX_ATTEMPTS
+    )
+    for job in exhausted:
+        _mark_failed(job, "Worker stopped responding and the maximum number of attempts was reached.", job.locked_by)
+
+    with transaction.atomic():
+        job = (
+            IngestionJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=IngestionJob.STATUS_QUEUED) |
+                Q(status=IngestionJob.STATUS_RUNNING, heartbeat_at__lt=stale_before, attempts__lt=MAX_ATTEMPTS)
+            )
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = IngestionJob.STATUS_RUNNING
+        job.stage = 'starting'
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.heartbeat_at = now
+        job.started_at = job.started_at or now
+        job.save(update_fields=['status', 'stage', 'attempts', 'locked_by', 'heartbeat_at', 'started_at'])
+
+    logger.info(f"Worker {worker_id} claimed ingestion job {job.id} (attempt {job.attempts})")
+    return job
+
+
+class _JobHeartbeat(threading.Thread):
+    """
+    Persists the stage/progress of a running job and renews its lease.
+
+    Writes happen from this thread's own DB connection, so progress stays
+    visible to pollers while the pipeline itself is inside a transaction.
+    """
+
+    def __init__(self, job_id, worker_id: str):
+        super().__init__(name=f"ingestion-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.stage = 'starting'
+        self.progress = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def update(self, stage: str, progress: int):
+        self.stage = stage
+        self.progress = progress
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self.join()
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                self._flush()
+                self._wake.wait(HEARTBEAT_SECONDS)
+                self._wake.clear()
+        finally:
+            connection.close()
+
+    def _flush(self):
+        try:
+            IngestionJob.objects.filter(
+                id=self.job_id, status=IngestionJob.STATUS_RUNNING, locked_by=self.worker_id
+            ).update(stage=self.stage, progress=self.progress, heartbeat_at=timezone.now())
+        except Exception as e:
+            logger.error(f"Failed to record heartbeat for ingestion job {self.job_id}: {e}")
+
+
+class JobLost(Exception):
+    """The job's lease expired and another worker claimed it while this one was running it."""
+
+    def __init__(self, job_id, worker_id: str):
+        super().__init__(f"Ingestion job {job_id} is no longer held by worker {worker_id}.")
+
+
+def run_job(job, worker_id: str):
+    """
+    Runs the parse/chunk/embed/insert pipeline for a claimed job and records the outcome.
+
+    Every write of the outcome is conditional on the job still being locked by
+    this worker. If it is not (the lease expired while, say, the database was
+    unreachable, and another worker took the job over), the outcome is dropped:
+    a new document is rolled back with its ingestion transaction, and files and
+    the upload session are left to the worker that now owns the job.
+    """
+    heartbeat = _JobHeartbeat(job.id, worker_id)
+    heartbeat.start()
+    file_path, temporary = None, False
+    document_id = uuid.uuid4()
+
+    def record_completion(document_id=document_id):
+        # Runs inside the ingestion transaction, so a lost job rolls its new document (or swap) back
+        if not _record_completion(job, worker_id, document_id):
+            raise JobLost(job.id, worker_id)
+
+    try:
+        metrics = IngestionMetrics()
+        if not job.supabase_storage_path:
+            # A resumable upload: its parts are assembled and stored here instead of in the request
+            heartbeat.update('assembling', 5)
+            file_path, duplicate = upload_sessions.store_session_file(job, metrics)
+            temporary = True
+            if duplicate is not None:
+                heartbeat.stop()
+                _finish(job, worker_id, duplicate, stage='duplicate')
+                return
+            updated = IngestionJob.objects.filter(id=job.id, locked_by=worker_id).update(
+                supabase_storage_path=job.supabase_storage_path, content_hash=job.content_hash
+            )
+            if not updated:
+                document_processor.remove_original_file(job.supabase_storage_path)
+                raise JobLost(job.id, worker_id)
+        elif SPOOL_DIR and os.path.exists(_spool_path(job.id, job.file_name)):
+            # Queued on this host (or a shared spool directory): no need to download it back
+            file_path = _spool_path(job.id, job.file_name)
+        else:
+            heartbeat.update('downloading', 5)
+            with metrics.stage('download'):
+                file_path, temporary = document_processor.download_original_file(job.supabase_storage_path)
+        if job.replaces_document_id:
+            # The row lock is only taken for the final swap, inside replace_document
+            document, _ = document_processor.replace_document(
+                document=job.replaces_document,
+                source=file_path,
+                original_filename=job.file_name,
+                storage_path=job.supabase_storage_path,
+                content_hash=job.content_hash,
+                progress_callback=heartbeat.update,
+                before_commit=lambda: record_completion(job.replaces_document_id),
+                metrics=metrics
+            )
+            document_id = document.id
+        else:
+            document = document_processor.ingest_stored_document(
+                source=file_path,
+                original_filename=job.file_name,
+                standard_type=job.standard_type,
+                storage_path=job.supabase_storage_path,
+                progress_callback=heartbeat.update,
+                document_id=document_id,
+                content_hash=job.content_hash,
+                before_commit=record_completion,
+                metrics=metrics
+            )
+    except JobLost as lost:
+        heartbeat.stop()
+        logger.warning(f"{lost} Its result was discarded.")
+        return
+    except ValueError as ve:
+        # The document itself is unusable; retrying will not help
+        heartbeat.stop()
+        logger.warning(f"Ingestion job {job.id} failed validation: {ve}")
+        _mark_failed(job, str(ve), worker_id)
+        return
+    except Exception as e:
+        heartbeat.stop()
+        logger.exception(f"Ingestion job {job.id} failed on attempt {job.attempts}: {e}")
+        if job.attempts < MAX_ATTEMPTS:
+            updated = IngestionJob.objects.filter(id=job.id, locked_by=worker_id).update(
+                status=IngestionJob.STATUS_QUEUED, stage='queued', progress=0, locked_by=None,
+                error=f"Attempt {job.attempts} failed: {e}"
+            )
+            if not updated:
+                logger.warning(f"{JobLost(job.id, worker_id)} It was not requeued.")
+        else:
+            _mark_failed(job, str(e), worker_id)
+        return
+    finally:
+        if temporary:
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logger.warning(f"Could not remove downloaded copy {file_path}: {e}")
+
+    heartbeat.stop()
+    if document.id == document_id:
+        _finish(job, worker_id, document, recorded=True)
+    else:
+        # Resolved to an existing document, so nothing was committed for this job yet
+        _finish(job, worker_id, document)
+
+
+def _record_completion(job, worker_id: str, document_id, stage: str = 'completed') -> bool:
+    """Marks the job completed if this worker still holds it; returns whether it did."""
+    return bool(IngestionJob.objects.filter(id=job.id, locked_by=worker_id).update(
+        status=IngestionJob.STATUS_COMPLETED, stage=stage, progress=100, error=None,
+        document_id=document_id, locked_by=None, finished_at=timezone.now()
+    ))
+
+
+def _finish(job, worker_id: str, document, stage: str = 'completed', recorded: bool = False):
+    """
+    Completes the job (unless record_completion already did, in the ingestion
+    transaction), then tidies up its unused file and upload session.
+    """
+    if not recorded and not _record_completion(job, worker_id, document.id, stage):
+        logger.warning(f"{JobLost(job.id, worker_id)} Its result was discarded.")
+        return
+    if job.supabase_storage_path and document.supabase_storage_path != job.supabase_storage_path:
+        # The same file was ingested before or concurrently; this job's copy is unused
+        document_processor.remove_original_file(job.supabase_storage_path)
+    _remove_spooled_copy(job)
+    upload_sessions.finish_session(job, document)
+    logger.info(f"Ingestion job {job.id} completed: document {document.id}")
+
+
+def _mark_failed(job, error: str, worker_id: str):
+    """
+    Marks a job as permanently failed and removes its stored original file.
+    The upload session behind it, if any, is reopened so the client can retry.
+    Nothing happens if another worker has claimed the job in the meantime.
+    """
+    updated = IngestionJob.objects.filter(id=job.id, locked_by=worker_id).update(
+        status=IngestionJob.STATUS_FAILED, stage='failed', error=error,
+        locked_by=None, finished_at=timezone.now()
+    )
+    if not updated:
+        logger.warning(f"{JobLost(job.id, worker_id)} It was not marked failed.")
+        return
+    if job.supabase_storage_path:
+        document_processor.remove_original_file(job.supabase_storage_path)
+    _remove_spooled_copy(job)
+    upload_sessions.reopen_session(job)
+
+
+def run_worker_loop(worker_id: str, stop_event: threading.Event = None, exit_when_idle: bool = False):
+    """
+    Claims and runs jobs until stop_event is set.
+
+    Args:
+        worker_id: Identifier recorded on claimed jobs
+        stop_event: Optional event used to stop the loop
+        exit_when_idle: Return as soon as no job is available instead of polling
+    """
+    stop_event = stop_event or threading.Event()
+    logger.info(f"Ingestion worker {worker_id} started")
+    while not stop_event.is_set():
+        job = None
+        try:
+            close_old_connections()
+            job = claim_next_job(worker_id)
+            if job is not None:
+                run_job(job, worker_id)
+        except Exception as e:
+            logger.exception(f"Ingestion worker {worker_id} error: {e}")
+
+        if job is None:
+            if exit_when_idle:
+                break
+            stop_event.wait(POLL_INTERVAL_SECONDS)
+    connection.close()
+    logger.info(f"Ingestion worker {worker_id} stopped")
+
+
+def make_worker_id(index: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def start_workers(thread_count: int = None):
+    """
+    Starts the in-process pool of worker threads, once per process.
+    A forked child (e.g. a new gunicorn worker) gets a fresh pool.
+    """
+    global _workers_pid
+    with _workers_lock:
+        if _workers_pid == os.getpid() and any(t.is_alive() for t in _worker_threads):
+            return
+        _worker_threads.clear()
+        _workers_pid = os.getpid()
+        for i in range(thread_count or WORKER_THREADS):
+            thread = threading.Thread(
+                target=run_worker_loop,
+                args=(make_worker_id(i),),
+                name=f"ingestion-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            _worker_threads.append(thread)
+        logger.info(f"Started {len(_worker_threads)} ingestion worker thread(s) in process {_workers_pid}")
+
+
+def ensure_workers_started():
+    """Starts the in-process workers if autostart is enabled."""
+    if WORKER_AUTOSTART:
+        start_workers()
@@ -2,6 +2,7 @@ import os
 import json
 import re
 import logging
+import threading
 from langchain_huggingface import HuggingFaceEndpoint
 from langchain_community.llms import HuggingFacePipeline  # For local models via transformers
 from langchain.prompts import PromptTemplate
@@ -9,7 +10,7 @@ from langchain.chains import LLMChain
 from dotenv import load_dotenv
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-from .openrouter_client import get_openrouter_llm
+from .openrouter_client import get_openrouter_llm, get_pool_stats as get_openrouter_pool_stats
 from .openrouter_config import OPENROUTER_MODELS
 
 # Load environment variables
@@ -173,17 +174,80 @@ Do not include any text before or after the JSON object. Only return the JSON.
 # Cache for loaded models to avoid reloading
 _model_cache = {}
 
+# Process-wide registry of ready LLM instances, keyed by (provider, model name).
+# Instances are shared by all threads; a forked child builds its own.
+_instances = {}
+_instance_locks = {}
+_instances_lock = threading.Lock()
+_instances_pid = os.getpid()
+_instance_stats = {'hits': 0, 'builds': 0, 'build_failures': 0}
+
+def _reset_instances_after_fork():
+    """Drops instances inherited from the parent, whose HTTP sessions hold the parent's sockets."""
+    global _instances_lock, _instances_pid
+    _instances_lock = threading.Lock()  # Another thread may have held it at fork time
+    _instances.clear()
+    _instance_locks.clear()
+    _instances_pid = os.getpid()
+    _instance_stats.update(hits=0, builds=0, build_failures=0)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_instances_after_fork)
+
 def get_llm_instance(model_name: str):
     """
-    Gets an instance of the specified LLM with fallback mechanism.
+    Gets the shared instance of the specified LLM, building it on first use.
+    Concurrent first requests for the same model wait for a single build.
+    """
+    if model_name not in AVAILABLE_MODELS:
+        raise ValueError(f"Model '{model_name}' is not configured.")
+    if _instances_pid != os.getpid():  # Safety net in case the at-fork hook did not run
+        _reset_instances_after_fork()
+
+    key = (AVAILABLE_MODELS[model_name]["provider"], model_name)
+    llm = _instances.get(key)
+    if llm is not None:
+        with _instances_lock:
+            _instance_stats['hits'] += 1
+        return llm
+
+    with _instances_lock:
+        build_lock = _instance_locks.setdefault(key, threading.Lock())
+    with build_lock:  # Per model, so a slow build does not hold up other models
+        llm = _instances.get(key)
+        if llm is None:
+            try:
+                llm = _build_llm_instance(model_name)
+            except Exception:
+                with _instances_lock:
+                    _instance_stats['build_failures'] += 1
+                raise
+            with _instances_lock:
+                _instances[key] = llm
+                _instance_stats['builds'] += 1
+        else:
+            with _instances_lock:
+                _instance_stats['hits'] += 1
+    return llm
+
+def get_llm_stats() -> dict:
+    """Returns LLM instance reuse and OpenRouter connection reuse counters for this process."""
+    with _instances_lock:
+        instances = {
+            'pid': os.getpid(),
+            'instances': sorted(f"{provider}:{name}" for provider, name in _instances),
+            **_instance_stats,
+        }
+    return {'instances': instances, 'openrouter': get_openrouter_pool_stats()}
+
+def _build_llm_instance(model_name: str):
+    """
+    Builds an instance of the specified LLM with fallback mechanism.
     
     First tries OpenRouter if USE_OPENROUTER is True,
     then tries HuggingFace API if USE_HUGGINGFACE_API is True,
     then falls back to local model if available.
     """
-    if model_name not in AVAILABLE_MODELS:
-        raise ValueError(f"Model '{model_name}' is not configured.")
-    
     model_info = AVAILABLE_MODELS[model_name]
     provider = model_info["provider"]
     
@@ -1,12 +1,82 @@
 import json
 import logging
+import os
+import threading
 import requests
-from openai import OpenAI
+from django.conf import settings
+from openai import DefaultHttpxClient, OpenAI
 from typing import Any, Dict, List, Optional, Union
+from api.utils import http_pool
 from .openrouter_config import OPENROUTER_BASE_URL, OPENROUTER_API_KEY, OPENROUTER_HEADERS, OPENROUTER_MODELS
 
 logger = logging.getLogger(__name__)
 
+# Connection pool shared by every OpenAI client of this process (see settings.py for the environment variables)
+POOL_MAX_CONNECTIONS = getattr(settings, 'LLM_POOL_MAX_CONNECTIONS', 20)
+POOL_MAX_KEEPALIVE = getattr(settings, 'LLM_POOL_MAX_KEEPALIVE', 10)
+KEEPALIVE_EXPIRY_SECONDS = getattr(settings, 'LLM_KEEPALIVE_EXPIRY_SECONDS', 120)
+HTTP2_ENABLED = http_pool.http2_available(getattr(settings, 'LLM_HTTP2', True))
+
+_registry_lock = threading.Lock()
+_http_client = None
+_clients = {}  # (base_url, api_key) -> OpenAI
+_clients_pid = os.getpid()
+
+pool_stats = http_pool.PoolStats(
+    max_connections=POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=POOL_MAX_KEEPALIVE,
+    keepalive_expiry_seconds=KEEPALIVE_EXPIRY_SECONDS,
+    http2=HTTP2_ENABLED,
+)
+
+
+def _reset_after_fork():
+    """Drops clients inherited from the parent. They are not closed: their sockets belong to the parent."""
+    global _registry_lock, _http_client, _clients_pid
+    _registry_lock = threading.Lock()  # Another thread may have held it at fork time
+    _http_client = None
+    _clients.clear()
+    _clients_pid = os.getpid()
+    pool_stats.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_openai_client(base_url: str = OPENROUTER_BASE_URL, api_key: str = OPENROUTER_API_KEY) -> OpenAI:
+    """
+    Returns the process's shared OpenAI client for an endpoint, building it on first use.
+    All clients send requests over one keep-alive connection pool (HTTP/2 when available),
+    so a generation does not pay for client setup or a TLS handshake.
+    """
+    global _http_client
+    if _clients_pid != os.getpid():  # Safety net in case the at-fork hook did not run
+        _reset_after_fork()
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            if _http_client is None:
+                # DefaultHttpxClient keeps the SDK's timeouts and redirect handling
+                _http_client = DefaultHttpxClient(
+                    http2=HTTP2_ENABLED,
+                    limits=http_pool.pool_limits(POOL_MAX_CONNECTIONS, POOL_MAX_KEEPALIVE, KEEPALIVE_EXPIRY_SECONDS),
+                    event_hooks=http_pool.tracing_hooks(pool_stats),
+                )
+            client = OpenAI(base_url=base_url, api_key=api_key, http_client=_http_client)
+            _clients[key] = client
+            pool_stats.increment(clients_built=1)
+    return client
+
+
+def get_pool_stats() -> dict:
+    """Returns connection reuse counters for this process's OpenAI clients."""
+    return pool_stats.as_dict(clients=len(_clients))
+
 class OpenRouterLLM:
     """Simple wrapper for OpenRouter models."""
     
@@ -31,15 +101,10 @@ class OpenRouterLLM:
             model_id = self.model_config["model_id"]
             
             # Log request details for debugging (excluding API key)
-            logger.debug(f"OpenRouter request: model={model_id}, base_url={OPENROUTER_BASE_URL}, api_key={OPENROUTER_API_KEY}")
-            
+            logger.debug(f"OpenRouter request: model={model_id}, base_url={OPENROUTER_BASE_URL}")
 
-            # Use OpenAI client for better handling
-            client = OpenAI(
-                base_url=OPENROUTER_BASE_URL,
-                api_key=OPENROUTER_API_KEY,
-                ##default_headers=OPENROUTER_HEADERS  # Set default headers here
-            )
+            # Shared client: connections to OpenRouter are kept alive between calls
+            client = get_openai_client()
             
             # Create the completion
             completion = client.chat.completions.create(
@@ -1,4 +1,5 @@
 from api.models import DocumentChunk
+from api.utils import minhash
 from api.utils.embeddings import embed_text
 from pgvector.django import CosineDistance # Or L2Distance, InnerProduct
 import logging
@@ -7,10 +8,30 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_SIMILARITY_THRESHOLD = 0.75 # Adjust based on experimentation (Cosine similarity: higher is better)
 DEFAULT_TOP_K = 5 # Number of chunks to retrieve
+DEDUPE_CANDIDATE_FACTOR = 3 # Extra candidates fetched so dropping near-duplicates does not shrink top-k
 
-def retrieve_relevant_chunks(query: str, top_k: int = DEFAULT_TOP_K, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+def _drop_near_duplicates(chunks, top_k: int):
+    """Keeps the best-ranked chunk of each group of near-duplicates (by MinHash signature)."""
+    selected = []
+    for chunk in chunks:
+        if chunk.minhash is not None and any(
+            other.minhash is not None
+            and minhash.similarity(chunk.minhash, other.minhash) >= minhash.NEAR_DUPLICATE_THRESHOLD
+            for other in selected
+        ):
+            continue
+        selected.append(chunk)
+        if len(selected) == top_k:
+            break
+    return selected
+
+def retrieve_relevant_chunks(query: str, top_k: int = DEFAULT_TOP_K, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                             dedupe: bool = True):
     """
     Embeds the query and searches for similar document chunks in the database.
+    With dedupe, chunks collapsed onto a canonical chunk are skipped and
+    near-duplicates among the results are dropped, so copies of the same
+    guideline text do not fill the top-k.
     """
     try:
         query_embedding = embed_text(query)
@@ -26,7 +47,13 @@ def retrieve_relevant_chunks(query: str, top_k: int = DEFAULT_TOP_K, similarity_
             distance=CosineDistance('embedding', query_embedding)
         ).filter(
             distance__lte=(1 - similarity_threshold) # Convert similarity threshold to max distance
-        ).order_by('distance')[:top_k]
+        ).order_by('distance')
+
+        if dedupe:
+            results = results.filter(canonical_chunk__isnull=True)
+            results = _drop_near_duplicates(results[:top_k * DEDUPE_CANDIDATE_FACTOR], top_k)
+        else:
+            results = results[:top_k]
 
         if not results:
             logger.info(f"No relevant chunks found for query '{query[:50]}...' with threshold {similarity_threshold}")
@@ -0,0 +1,219 @@
+"""
+Deferred deletion of storage objects.
+
+Deleting a document, attachment or complaint only records its file in the
+StorageDeletion outbox, in the same transaction as the row delete, so the
+API answers without a storage round trip and a failed storage call can
+never leave a file behind. The sweeper claims due rows, skips paths that a
+row still references (a linked duplicate, or a re-upload of the same file),
+deletes the rest with one batched call per bucket, and retries failures
+with exponential backoff.
+"""
+import logging
+import os
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from api.models import Complaint, Document, FeedbackAttachment, IngestionJob, StorageDeletion, StoredBlob, UploadPart
+from api.utils import download_cache, signed_urls
+from api.utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Sweeper configuration (see settings.py for the environment variables)
+SWEEPER_AUTOSTART = getattr(settings, 'STORAGE_GC_AUTOSTART', True)
+SWEEP_INTERVAL_SECONDS = getattr(settings, 'STORAGE_GC_INTERVAL_SECONDS', 30)
+BATCH_SIZE = getattr(settings, 'STORAGE_GC_BATCH_SIZE', 100)
+BASE_BACKOFF_SECONDS = getattr(settings, 'STORAGE_GC_BASE_BACKOFF_SECONDS', 30)
+MAX_BACKOFF_SECONDS = getattr(settings, 'STORAGE_GC_MAX_BACKOFF_SECONDS', 3600)
+CLAIM_LEASE_SECONDS = 300  # A sweep that dies mid-batch releases its rows after this long
+
+DOCUMENTS_BUCKET = "medical-documents"
+ATTACHMENTS_BUCKET = "feedback-attachments"
+
+_sweeper_lock = threading.Lock()
+_sweeper_thread = None
+_sweeper_pid = None
+
+
+def referenced_paths(bucket: str, paths=None) -> set:
+    """
+    Returns the storage paths in a bucket that rows still point at, limited to
+    paths when given (otherwise every referenced path, for reconciliation).
+    """
+    if bucket == DOCUMENTS_BUCKET:
+        querysets = [
+            (Document.objects.all(), 'supabase_storage_path'),
+            (IngestionJob.objects.filter(
+                status__in=[IngestionJob.STATUS_QUEUED, IngestionJob.STATUS_RUNNING]
+            ), 'supabase_storage_path'),
+            (Complaint.objects.exclude(file_upload_path__isnull=True), 'file_upload_path'),
+            (UploadPart.objects.all(), 'storage_path'),
+        ]
+    elif bucket == ATTACHMENTS_BUCKET:
+        querysets = [(FeedbackAttachment.objects.all(), 'supabase_storage_path')]
+    else:
+        raise ValueError(f"Unknown storage bucket '{bucket}'.")
+    querysets.append((StoredBlob.objects.filter(bucket=bucket), 'storage_path'))
+
+    found = set()
+    for queryset, field in querysets:
+        if paths is not None:
+            queryset = queryset.filter(**{f"{field}__in": list(paths)})
+        found.update(queryset.values_list(field, flat=True))
+    return found
+
+
+def enqueue_deletion(bucket: str, paths):
+    """
+    Records storage objects for deletion by the sweeper. Call it inside the
+    transaction that deletes the owning rows, so both commit or neither does.
+    Paths already waiting in the outbox are left as they are.
+    """
+    paths = [path for path in dict.fromkeys(paths) if path]
+    if not paths:
+        return
+    now = timezone.now()
+    StorageDeletion.objects.bulk_create(
+        [StorageDeletion(bucket=bucket, storage_path=path, next_attempt_at=now) for path in paths],
+        ignore_conflicts=True
+    )
+    # Cached copies and signed URLs go now; a path that is still referenced is simply re-cached on its next download
+    for path in paths:
+        download_cache.invalidate(bucket, path)
+        signed_urls.invalidate(bucket, path)
+    ensure_sweeper_started()
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0)))
+
+
+def claim_due_deletions(batch_size: int = None) -> list:
+    """
+    Claims up to batch_size due outbox rows by pushing their next attempt past
+    the claim lease. Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    concurrent sweepers never work on the same rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            StorageDeletion.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size or BATCH_SIZE]
+        )
+        if rows:
+            StorageDeletion.objects.filter(id__in=[row.id for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+            )
+    return rows
+
+
+def sweep(batch_size: int = None) -> dict:
+    """
+    Runs one batch: deletes the claimed objects that nothing references any
+    more and reschedules the ones storage failed to delete.
+
+    Returns:
+        dict: Counts of deleted, skipped (still referenced) and failed objects
+    """
+    stats = {'deleted': 0, 'skipped': 0, 'failed': 0}
+    by_bucket = {}
+    for row in claim_due_deletions(batch_size):
+        by_bucket.setdefault(row.bucket, []).append(row)
+
+    for bucket, rows in by_bucket.items():
+        try:
+            in_use = referenced_paths(bucket, [row.storage_path for row in rows])
+        except ValueError as e:
+            _reschedule(rows, str(e))
+            stats['failed'] += len(rows)
+            continue
+        skipped = [row for row in rows if row.storage_path in in_use]
+        pending = [row for row in rows if row.storage_path not in in_use]
+        if skipped:
+            StorageDeletion.objects.filter(id__in=[row.id for row in skipped]).delete()
+            stats['skipped'] += len(skipped)
+        if not pending:
+            continue
+        try:
+            get_storage().delete_many(bucket, [row.storage_path for row in pending])
+        except Exception as e:
+            logger.error(f"Failed to delete {len(pending)} object(s) from {bucket}: {e}")
+            _reschedule(pending, str(e))
+            stats['failed'] += len(pending)
+            continue
+        StorageDeletion.objects.filter(id__in=[row.id for row in pending]).delete()
+        stats['deleted'] += len(pending)
+
+    if any(stats.values()):
+        logger.info(
+            f"Storage sweep: {stats['deleted']} deleted, {stats['skipped']} still referenced, "
+            f"{stats['failed']} failed"
+        )
+    return stats
+
+
+def _reschedule(rows, error: str):
+    now = timezone.now()
+    for row in rows:
+        attempts = row.attempts + 1
+        StorageDeletion.objects.filter(id=row.id).update(
+            attempts=attempts, next_attempt_at=now + _backoff(attempts), last_error=error[:2000]
+        )
+
+
+def get_outbox_stats() -> dict:
+    """Summarises the outbox for the system statistics endpoint."""
+    totals = StorageDeletion.objects.aggregate(pending=Count('id'), oldest=Min('created_at'))
+    return {
+        'pending': totals['pending'],
+        'retrying': StorageDeletion.objects.filter(attempts__gt=0).count(),
+        'oldest_created_at': totals['oldest'],
+    }
+
+
+def run_sweeper_loop(stop_event: threading.Event = None, exit_when_idle: bool = False):
+    """
+    Sweeps the outbox until stop_event is set. Full batches are followed
+    straight away by the next one; otherwise the loop sleeps for the interval.
+    """
+    stop_event = stop_event or threading.Event()
+    logger.info("Storage sweeper started")
+    while not stop_event.is_set():
+        stats = None
+        try:
+            close_old_connections()
+            stats = sweep()
+        except Exception as e:
+            logger.exception(f"Storage sweeper error: {e}")
+
+        if stats is None or sum(stats.values()) < BATCH_SIZE:
+            if exit_when_idle:
+                break
+            stop_event.wait(SWEEP_INTERVAL_SECONDS)
+    connection.close()
+    logger.info("Storage sweeper stopped")
+
+
+def start_sweeper():
+    """
+    Starts the in-process sweeper thread, once per process.
+    A forked child (e.g. a new gunicorn worker) starts its own.
+    """
+    global _sweeper_thread, _sweeper_pid
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid() and _sweeper_thread is not None and _sweeper_thread.is_alive():
+            return
+        _sweeper_pid = os.getpid()
+        _sweeper_thread = threading.Thread(target=run_sweeper_loop, name="storage-sweeper", daemon=True)
+        _sweeper_thread.start()
+
+
+def ensure_sweeper_started():
+    """Starts the in-process sweeper if autostart is enabled."""
+    if SWEEPER_AUTOSTART:
+        start_sweeper()
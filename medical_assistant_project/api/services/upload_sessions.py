@@ -0,0 +1,374 @@
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api.models import IngestionJob, UploadPart, UploadSession
+from api.services import document_processor, storage_gc
+from api.utils import uploads
+from api.utils.storage import StorageObjectNotFound, get_storage
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = ['.pdf', '.docx']
+MIN_PART_SIZE_BYTES = 1024 * 1024  # Keeps the number of part objects per session reasonable
+PART_SUFFIX = '.part'
+# Parts live in storage rather than on one server's disk, so any app server or worker can use them
+PARTS_BUCKET = document_processor.DOCUMENTS_BUCKET
+PARTS_PREFIX = 'upload-sessions'
+
+
+def _part_storage_path(session_id, part_number: int) -> str:
+    # A new path per attempt, so a re-sent part never overwrites an object that is being read
+    return f"{PARTS_PREFIX}/{session_id}/{part_number:06d}-{uuid.uuid4().hex}{PART_SUFFIX}"
+
+
+def _release_parts(parts):
+    """Deletes part rows and queues their objects for the storage sweeper. Call inside a transaction."""
+    storage_gc.enqueue_deletion(PARTS_BUCKET, parts.values_list('storage_path', flat=True))
+    parts.delete()
+
+
+def expected_part_size(session, part_number: int) -> int:
+    """Every part is part_size bytes except the last, which holds the remainder."""
+    if part_number < session.total_parts:
+        return session.part_size
+    return session.total_size - (session.total_parts - 1) * session.part_size
+
+
+def create_session(file_name: str, standard_type_id, total_size, part_size=None, content_hash: str = None):
+    """
+    Starts a resumable upload.
+
+    Args:
+        file_name: Original filename of the document
+        standard_type_id: ID of the StandardType for this document
+        total_size: Size of the whole file in bytes
+        part_size: Requested part size in bytes (defaults to UPLOAD_PART_SIZE_BYTES)
+        content_hash: Optional SHA-256 hex digest of the whole file, verified on completion
+
+    Returns:
+        UploadSession: The new session, with part_size and total_parts fixed
+
+    Raises:
+        ValueError: If the file type, sizes or standard type are invalid
+        UploadTooLarge: If total_size exceeds RESUMABLE_UPLOAD_MAX_BYTES
+    """
+    ext = os.path.splitext(file_name or '')[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type '{ext}'. Only PDF and DOCX allowed.")
+    try:
+        total_size = int(total_size)
+        part_size = int(part_size or settings.UPLOAD_PART_SIZE_BYTES)
+    except (TypeError, ValueError):
+        raise ValueError("total_size and part_size must be integers.")
+    if total_size <= 0:
+        raise ValueError("total_size must be greater than zero.")
+    if total_size > settings.RESUMABLE_UPLOAD_MAX_BYTES:
+        raise uploads.UploadTooLarge(
+            f"File exceeds the maximum upload size of {settings.RESUMABLE_UPLOAD_MAX_BYTES // (1024 * 1024)} MB."
+        )
+    if not MIN_PART_SIZE_BYTES <= part_size <= settings.UPLOAD_PART_MAX_BYTES:
+        raise ValueError(
+            f"part_size must be between {MIN_PART_SIZE_BYTES} and {settings.UPLOAD_PART_MAX_BYTES} bytes."
+        )
+    if content_hash is not None:
+        content_hash = content_hash.strip().lower()
+        if len(content_hash) != 64 or any(c not in '0123456789abcdef' for c in content_hash):
+            raise ValueError("sha256 must be a 64-character hex digest.")
+
+    standard_type = document_processor.get_standard_type(standard_type_id)
+    purge_expired_sessions()
+
+    part_size = min(part_size, total_size)
+    session = UploadSession.objects.create(
+        file_name=file_name,
+        standard_type=standard_type,
+        total_size=total_size,
+        part_size=part_size,
+        total_parts=math.ceil(total_size / part_size),
+        content_hash=content_hash,
+        expires_at=timezone.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    )
+    logger.info(f"Started upload session {session.id} for {file_name}: {session.total_parts} part(s) of {part_size} bytes")
+    return session
+
+
+def get_session(session_id):
+    """
+    Retrieves an upload session by ID.
+
+    Returns:
+        tuple: (session, error_message)
+    """
+    try:
+        return UploadSession.objects.get(id=session_id), None
+    except UploadSession.DoesNotExist:
+        return None, f"Upload session with ID {session_id} not found."
+    except Exception as e:
+        logger.exception(f"Error retrieving upload session {session_id}: {e}")
+        return None, f"Failed to retrieve upload session: {str(e)}"
+
+
+def _get_open_session(session_id):
+    session, error = get_session(session_id)
+    if error:
+        raise ValueError(error)
+    if session.status != UploadSession.STATUS_OPEN:
+        raise ValueError(f"Upload session {session_id} is {session.status} and no longer accepts changes.")
+    return session
+
+
+def received_parts(session) -> list:
+    """Returns the sorted numbers of the parts that are stored (only complete parts are recorded)."""
+    return list(session.parts.order_by('part_number').values_list('part_number', flat=True))
+
+
+def store_part(session_id, part_number: int, stream, content_length):
+    """
+    Stores one part of an upload, replacing any earlier attempt at the same part.
+
+    The body is streamed to a local temp file and checked, then stored under a
+    path of its own. Only then is the part recorded, with the session row
+    locked, so a retried or concurrent upload of the same part never leaves a
+    half-written part behind and the replaced object is queued for deletion.
+
+    Args:
+        session_id: UUID of the upload session
+        part_number: 1-based part number
+        stream: File-like object to read the part from (the request body)
+        content_length: Declared length of the body
+
+    Returns:
+        dict: part_number, size and sha256 of the stored part
+
+    Raises:
+        ValueError: If the session is not open, or the part number or size is wrong
+        ConnectionError: If the part cannot be stored
+    """
+    session = _get_open_session(session_id)
+    if not 1 <= part_number <= session.total_parts:
+        raise ValueError(f"Part number must be between 1 and {session.total_parts}.")
+    expected = expected_part_size(session, part_number)
+    try:
+        content_length = int(content_length or 0)
+    except ValueError:
+        content_length = 0
+    if content_length != expected:
+        raise ValueError(f"Part {part_number} must be exactly {expected} bytes; got {content_length}.")
+
+    handle, temp_path = tempfile.mkstemp(suffix=PART_SUFFIX, dir=getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None))
+    digest = hashlib.sha256()
+    size = 0
+    storage_path = _part_storage_path(session.id, part_number)
+    try:
+        with os.fdopen(handle, 'wb') as part_file:
+            while size <= expected:
+                block = stream.read(min(uploads.COPY_BLOCK_SIZE, expected + 1 - size))
+                if not block:
+                    break
+                part_file.write(block)
+                digest.update(block)
+                size += len(block)
+        if size != expected:
+            raise ValueError(f"Part {part_number} must be exactly {expected} bytes; received {size}.")
+        try:
+            get_storage().put(PARTS_BUCKET, storage_path, temp_path)
+        except Exception as e:
+            logger.error(f"Failed to store part {part_number} of upload session {session.id}: {e}")
+            raise ConnectionError("Failed to upload to storage.") from e
+    finally:
+        os.remove(temp_path)
+
+    with transaction.atomic():
+        still_open = UploadSession.objects.select_for_update().filter(
+            id=session.id, status=UploadSession.STATUS_OPEN
+        ).first() is not None
+        if still_open:
+            _release_parts(UploadPart.objects.filter(session_id=session.id, part_number=part_number))
+            UploadPart.objects.create(
+                session_id=session.id, part_number=part_number, size=size,
+                sha256=digest.hexdigest(), storage_path=storage_path
+            )
+            UploadSession.objects.filter(id=session.id).update(
+                expires_at=timezone.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+            )
+    if not still_open:
+        # Completed or aborted while the part was being stored
+        storage_gc.enqueue_deletion(PARTS_BUCKET, [storage_path])
+        raise ValueError(f"Upload session {session_id} no longer accepts changes.")
+    return {'part_number': part_number, 'size': size, 'sha256': digest.hexdigest()}
+
+
+def _assemble(session, target_path: str) -> str:
+    """Streams the parts from storage into target_path and returns the SHA-256 of the result."""
+    parts = list(session.parts.order_by('part_number').values_list('part_number', 'storage_path'))
+    if [part_number for part_number, _ in parts] != list(range(1, session.total_parts + 1)):
+        raise ValueError(f"Parts of upload session {session.id} are missing.")
+    storage = get_storage()
+    digest = hashlib.sha256()
+    with open(target_path, 'wb') as target:
+        for part_number, storage_path in parts:
+            try:
+                for block in storage.read_blocks(PARTS_BUCKET, storage_path):
+                    target.write(block)
+                    digest.update(block)
+            except StorageObjectNotFound:
+                raise ValueError(f"Part {part_number} of upload session {session.id} is missing from storage.")
+    return digest.hexdigest()
+
+
+def complete_session(session_id):
+    """
+    Checks that every part has arrived and queues an ingestion job for the
+    upload. Assembling, checksumming and storing the file happen in the
+    ingestion worker (see store_session_file), so the request returns at once.
+
+    Returns:
+        IngestionJob: The queued job; the session stays 'completing' until it finishes
+
+    Raises:
+        ValueError: If the session is not open or parts are missing
+    """
+    with transaction.atomic():
+        try:
+            session = UploadSession.objects.select_for_update().get(id=session_id)
+        except UploadSession.DoesNotExist:
+            raise ValueError(f"Upload session with ID {session_id} not found.")
+        if session.status != UploadSession.STATUS_OPEN:
+            raise ValueError(f"Upload session {session_id} is {session.status} and cannot be completed.")
+        missing = sorted(set(range(1, session.total_parts + 1)) - set(received_parts(session)))
+        if missing:
+            shown = ', '.join(str(n) for n in missing[:20])
+            raise ValueError(f"Upload session {session_id} is missing {len(missing)} part(s): {shown}.")
+
+        job = IngestionJob.objects.create(file_name=session.file_name, standard_type=session.standard_type)
+        session.status = UploadSession.STATUS_COMPLETING
+        session.job = job
+        session.expires_at = timezone.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+        session.save(update_fields=['status', 'job', 'expires_at'])
+
+    logger.info(f"Upload session {session.id} complete; queued ingestion job {job.id}")
+    return job
+
+
+def store_session_file(job, metrics):
+    """
+    Called by the ingestion worker for a job queued by complete_session:
+    assembles the parts, checks the result against the client's checksum and
+    stores it, setting the storage path and hash on the job (the caller saves
+    them while it still holds the job). Assembly is
+    timed as the 'hash' stage, since the parts are hashed as they are copied.
+
+    Returns:
+        tuple: (assembled_path, duplicate_document)
+            - assembled_path: Local temp copy of the file; the caller removes it
+            - duplicate_document: The Document the upload resolved to, or None
+              if the file was stored and still needs ingesting
+
+    Raises:
+        ValueError: If the session or its parts are gone or the checksum does not match
+        ConnectionError: If a part cannot be read or the file cannot be stored
+    """
+    session = UploadSession.objects.filter(job_id=job.id).first()
+    if session is None:
+        raise ValueError(f"No upload session belongs to ingestion job {job.id}.")
+    handle, assembled_path = tempfile.mkstemp(
+        suffix=os.path.splitext(session.file_name)[1].lower(), dir=getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None)
+    )
+    os.close(handle)
+    try:
+        with metrics.stage('hash'):
+            content_hash = _assemble(session, assembled_path)
+        if session.content_hash and content_hash != session.content_hash:
+            raise ValueError(
+                f"Assembled file checksum {content_hash} does not match the expected {session.content_hash}."
+            )
+
+        duplicate = document_processor.resolve_duplicate_upload(content_hash, session.file_name, job.standard_type)
+        if duplicate is not None:
+            return assembled_path, duplicate
+
+        with metrics.stage('upload'):
+            storage_path = document_processor.upload_original_file(assembled_path, session.file_name)
+    except BaseException:
+        os.remove(assembled_path)
+        raise
+    job.supabase_storage_path = storage_path
+    job.content_hash = content_hash
+    return assembled_path, None
+
+
+def finish_session(job, document):
+    """Marks the session behind a finished job as completed and deletes its parts."""
+    session = UploadSession.objects.filter(job_id=job.id).first()
+    if session is None:
+        return
+    with transaction.atomic():
+        UploadSession.objects.filter(id=session.id).update(
+            status=UploadSession.STATUS_COMPLETED, document=document, completed_at=timezone.now()
+        )
+        _release_parts(session.parts.all())
+    logger.info(f"Completed upload session {session.id}: document {document.id}")
+
+
+def reopen_session(job):
+    """
+    Reopens the session behind a failed job with its parts kept, so the client
+    can re-send parts or retry completion.
+    """
+    session = UploadSession.objects.filter(job_id=job.id, status=UploadSession.STATUS_COMPLETING).first()
+    if session is None:
+        return
+    UploadSession.objects.filter(id=session.id).update(status=UploadSession.STATUS_OPEN)
+    logger.info(f"Reopened upload session {session.id} after ingestion job {job.id} failed")
+
+
+def abort_session(session_id):
+    """
+    Cancels an upload and deletes its stored parts.
+
+    Returns:
+        tuple: (success, error_message)
+    """
+    with transaction.atomic():
+        updated = UploadSession.objects.filter(id=session_id, status=UploadSession.STATUS_OPEN).update(
+            status=UploadSession.STATUS_ABORTED
+        )
+        if updated:
+            _release_parts(UploadPart.objects.filter(session_id=session_id))
+    if not updated:
+        session, error = get_session(session_id)
+        if error:
+            return False, error
+        return False, f"Upload session {session_id} is {session.status} and cannot be aborted."
+    logger.info(f"Aborted upload session {session_id}")
+    return True, None
+
+
+def purge_expired_sessions():
+    """
+    Deletes expired, unfinished sessions and their parts. Sessions whose job
+    is still queued or running are kept until the worker has assembled them.
+    Returns how many were removed.
+    """
+    expired = list(
+        UploadSession.objects.filter(
+            status__in=[UploadSession.STATUS_OPEN, UploadSession.STATUS_COMPLETING, UploadSession.STATUS_ABORTED],
+            expires_at__lt=timezone.now()
+        ).exclude(
+            status=UploadSession.STATUS_COMPLETING,
+            job__status__in=[IngestionJob.STATUS_QUEUED, IngestionJob.STATUS_RUNNING]
+        ).values_list('id', flat=True)
+    )
+    if expired:
+        with transaction.atomic():
+            _release_parts(UploadPart.objects.filter(session_id__in=expired))
+            UploadSession.objects.filter(id__in=expired).delete()
+        logger.info(f"Purged {len(expired)} expired upload session(s)")
+    return len(expired)
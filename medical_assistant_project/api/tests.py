@@ -1,3 +1,324 @@
-from django.test import TestCase
+import io
+import json
+import re
+import struct
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.test import SimpleTestCase
+from api.models import DocumentChunk
+from api.utils import boilerplate, chunk_insert, minhash, storage, zip_export
+from api.utils.boilerplate import BoilerplateStripper
+from api.utils.token_chunker import TokenChunker
 
-# Create your tests here.
+
+class ParseRangeTests(SimpleTestCase):
+    """storage._parse_range against a 1000-byte object."""
+
+    SIZE = 1000
+
+    def parse(self, header):
+        return storage._parse_range(header, self.SIZE)
+
+    def test_no_or_foreign_header_serves_whole_object(self):
+        self.assertIsNone(self.parse(None))
+        self.assertIsNone(self.parse(''))
+        self.assertIsNone(self.parse('items=0-10'))
+
+    def test_multiple_ranges_serve_whole_object(self):
+        self.assertIsNone(self.parse('bytes=0-10,20-30'))
+
+    def test_malformed_range_is_ignored(self):
+        self.assertIsNone(self.parse('bytes=a-b'))
+        self.assertIsNone(self.parse('bytes=10-x'))
+
+    def test_closed_range(self):
+        self.assertEqual(self.parse('bytes=0-99'), (0, 99))
+        self.assertEqual(self.parse('bytes=0-0'), (0, 0))
+
+    def test_open_ended_range(self):
+        self.assertEqual(self.parse('bytes=500-'), (500, 999))
+
+    def test_end_past_size_is_clamped(self):
+        self.assertEqual(self.parse('bytes=900-5000'), (900, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(self.parse('bytes=-100'), (900, 999))
+        self.assertEqual(self.parse('bytes=-5000'), (0, 999))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertEqual(self.parse('bytes=1000-'), 'unsatisfiable')
+        self.assertEqual(self.parse('bytes=5-2'), 'unsatisfiable')
+        self.assertEqual(self.parse('bytes=-0'), 'unsatisfiable')
+
+
+def _read_copy_fields(row: bytes) -> list:
+    """Splits one binary COPY row into its field payloads (None for NULL)."""
+    (count,) = struct.unpack_from('>h', row)
+    position, fields = 2, []
+    for _ in range(count):
+        (length,) = struct.unpack_from('>i', row, position)
+        position += 4
+        if length == -1:
+            fields.append(None)
+        else:
+            fields.append(row[position:position + length])
+            position += length
+    assert position == len(row), "Trailing bytes after the last field"
+    return fields
+
+
+class ChunkInsertEncodingTests(SimpleTestCase):
+    """Binary COPY encoding used by chunk_insert."""
+
+    def test_vector(self):
+        encoded = chunk_insert._encode_vector([1.0, -2.5, 0.0])
+        self.assertEqual(encoded, struct.pack('>hh', 3, 0) + struct.pack('>fff', 1.0, -2.5, 0.0))
+
+    def test_jsonb(self):
+        encoded = chunk_insert._encode_jsonb({'page': 2, 'title': 'Überblick'})
+        self.assertEqual(encoded[:1], b'\x01')
+        self.assertEqual(json.loads(encoded[1:].decode('utf-8')), {'page': 2, 'title': 'Überblick'})
+
+    def test_timestamptz(self):
+        epoch = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(chunk_insert._encode_timestamptz(epoch), struct.pack('>q', 0))
+        self.assertEqual(
+            chunk_insert._encode_timestamptz(epoch + timedelta(days=1, seconds=1, microseconds=5)),
+            struct.pack('>q', 86_401_000_005)
+        )
+        self.assertEqual(
+            chunk_insert._encode_timestamptz(epoch - timedelta(microseconds=1)), struct.pack('>q', -1)
+        )
+
+    def test_row_matches_columns(self):
+        chunk = DocumentChunk(
+            id=uuid.uuid4(), document_id=uuid.uuid4(), chunk_text='Hand hygiene',
+            embedding=[0.5, 0.25], metadata={'page': 1}, minhash=b'\x01\x02'
+        )
+        created_at = datetime(2000, 1, 1, 0, 0, 1, tzinfo=dt_timezone.utc)
+        fields = _read_copy_fields(chunk_insert._encode_row(chunk, created_at))
+        self.assertEqual(len(fields), len(chunk_insert._COLUMNS))
+        values = dict(zip(chunk_insert._COLUMNS, fields))
+        self.assertEqual(values['id'], chunk.id.bytes)
+        self.assertEqual(values['document_id'], chunk.document_id.bytes)
+        self.assertEqual(values['chunk_text'], 'Hand hygiene'.encode('utf-8'))
+        self.assertEqual(values['embedding'], chunk_insert._encode_vector([0.5, 0.25]))
+        self.assertEqual(values['metadata'], chunk_insert._encode_jsonb({'page': 1}))
+        self.assertEqual(values['minhash'], b'\x01\x02')
+        self.assertIsNone(values['canonical_chunk_id'])
+        self.assertEqual(values['created_at'], struct.pack('>q', 1_000_000))
+
+    def test_linked_chunk_has_null_embedding(self):
+        canonical_id = uuid.uuid4()
+        chunk = DocumentChunk(
+            id=uuid.uuid4(), document_id=uuid.uuid4(), chunk_text='x',
+            embedding=None, metadata=None, minhash=None, canonical_chunk_id=canonical_id
+        )
+        values = dict(zip(chunk_insert._COLUMNS, _read_copy_fields(
+            chunk_insert._encode_row(chunk, datetime.now(dt_timezone.utc))
+        )))
+        self.assertIsNone(values['embedding'])
+        self.assertIsNone(values['metadata'])
+        self.assertEqual(values['canonical_chunk_id'], canonical_id.bytes)
+
+    def test_copy_stream_framing(self):
+        data = b''.join(chunk_insert._iter_copy_data([], datetime.now(dt_timezone.utc)))
+        self.assertTrue(data.startswith(b'PGCOPY\n\xff\r\n\x00'))
+        self.assertEqual(data, chunk_insert._COPY_HEADER + struct.pack('>h', -1))
+
+
+class MinHashTests(SimpleTestCase):
+
+    TEXT = (
+        "Staff must clean their hands before and after every patient contact, after removing gloves, "
+        "and after touching the patient's surroundings. Alcohol-based hand rub is preferred unless hands "
+        "are visibly soiled, in which case soap and water must be used. Hand hygiene compliance is audited "
+        "monthly on every ward and the results are reported to the infection prevention committee."
+    )
+
+    def test_signature_is_deterministic_and_sized(self):
+        signature = minhash.compute_signature(self.TEXT)
+        self.assertEqual(len(signature), minhash.NUM_PERMUTATIONS * 4)
+        self.assertEqual(signature, minhash.compute_signature(self.TEXT))
+
+    def test_case_and_punctuation_do_not_matter(self):
+        self.assertEqual(
+            minhash.compute_signature(self.TEXT),
+            minhash.compute_signature(self.TEXT.upper().replace(',', ' ').replace('.', ' '))
+        )
+
+    def test_near_duplicate_is_similar(self):
+        edited = self.TEXT.replace('monthly', 'quarterly')
+        similarity = minhash.similarity(minhash.compute_signature(self.TEXT), minhash.compute_signature(edited))
+        self.assertGreaterEqual(similarity, minhash.NEAR_DUPLICATE_THRESHOLD)
+        self.assertLess(similarity, 1.0)
+
+    def test_unrelated_text_is_not_similar(self):
+        other = "Fire doors must be kept closed at all times and checked weekly by the estates team for damage."
+        similarity = minhash.similarity(minhash.compute_signature(self.TEXT), minhash.compute_signature(other))
+        self.assertLess(similarity, 0.2)
+
+    def test_band_keys(self):
+        signature = minhash.compute_signature(self.TEXT)
+        keys = minhash.band_keys(signature)
+        self.assertEqual(len(keys), minhash.LSH_BANDS)
+        self.assertEqual([band for band, _ in keys], list(range(minhash.LSH_BANDS)))
+        self.assertEqual(b''.join(data for _, data in keys), signature)
+
+    def test_near_duplicates_share_a_band(self):
+        edited = self.TEXT.replace('monthly', 'quarterly')
+        keys = set(minhash.band_keys(minhash.compute_signature(self.TEXT)))
+        self.assertTrue(keys & set(minhash.band_keys(minhash.compute_signature(edited))))
+
+
+class _WhitespaceTokenizer:
+    """Stands in for a fast tokenizer: one token per run of non-space characters."""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, verbose=True):
+        return {'offset_mapping': [match.span() for match in re.finditer(r'\S+', text)]}
+
+
+class TokenChunkerTests(SimpleTestCase):
+
+    def chunk(self, pages, max_tokens=10, overlap_tokens=2):
+        return list(TokenChunker(_WhitespaceTokenizer(), max_tokens, overlap_tokens).chunk_pages(pages))
+
+    def test_overlap_must_be_under_half_of_max_tokens(self):
+        with self.assertRaises(ValueError):
+            TokenChunker(_WhitespaceTokenizer(), 10, 5)
+
+    def test_offsets_point_into_page_text(self):
+        text = ' '.join(f"w{i}" for i in range(35))
+        chunks = self.chunk([(1, text)])
+        self.assertGreater(len(chunks), 1)
+        for page_number, chunk_text, span in chunks:
+            self.assertEqual(page_number, 1)
+            self.assertEqual(chunk_text, text[span['start_offset']:span['end_offset']])
+            self.assertEqual(span['token_count'], len(chunk_text.split()))
+            self.assertLessEqual(span['token_count'], 10)
+        self.assertEqual(chunks[0][2]['start_offset'], 0)
+        self.assertEqual(chunks[-1][2]['end_offset'], len(text))
+
+    def test_chunks_overlap_within_a_page(self):
+        text = ' '.join(f"w{i}" for i in range(35))
+        chunks = self.chunk([(1, text)])
+        for (_, previous, _), (_, current, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(previous.split()[-2:], current.split()[:2])
+
+    def test_cuts_prefer_sentence_ends(self):
+        text = "one two three four five six seven. eight nine ten eleven twelve"
+        first = self.chunk([(1, text)])[0][1]
+        self.assertTrue(first.endswith('seven.'))
+
+    def test_first_chunk_of_a_page_carries_the_previous_tail(self):
+        chunks = self.chunk([(1, "alpha beta gamma delta"), (2, "epsilon zeta eta")])
+        page_number, chunk_text, span = chunks[-1]
+        self.assertEqual(page_number, 2)
+        self.assertEqual(chunk_text, "gamma delta\nepsilon zeta eta")
+        self.assertEqual(span['overlap_prefix_chars'], len("gamma delta\n"))
+        self.assertEqual(span['overlap_prefix_tokens'], 2)
+        self.assertEqual(span['token_count'], 3)
+        self.assertEqual(chunk_text[span['overlap_prefix_chars']:], "epsilon zeta eta"[span['start_offset']:span['end_offset']])
+
+    def test_blank_pages_are_skipped(self):
+        chunks = self.chunk([(1, "alpha beta"), (2, "   \n"), (3, "gamma")])
+        self.assertEqual([page for page, _, _ in chunks], [1, 3])
+        self.assertEqual(chunks[-1][1], "alpha beta\ngamma")
+
+    def test_edit_leaves_later_pages_alone(self):
+        pages = [(1, "a b c d e f g h"), (2, "i j k l m n o p q r s t"), (3, "u v w x y z aa bb cc dd ee")]
+        edited = [(1, "a b c d e f g h"), (2, "i j k changed m n o p q r s t"), (3, pages[2][1])]
+        on_page_3 = lambda chunks: [chunk for chunk in chunks if chunk[0] == 3]
+        self.assertEqual(on_page_3(self.chunk(pages)), on_page_3(self.chunk(edited)))
+
+
+class BoilerplateStripperTests(SimpleTestCase):
+
+    BODIES = ["Wash hands.", "Wear gloves.", "Clean surfaces.", "Report incidents.", "Dispose of sharps.", "Audit wards."]
+
+    def pages(self, count):
+        return [
+            (number, f"Infection Control Policy\n{self.BODIES[number - 1]}\nPage {number} of {count}")
+            for number in range(1, count + 1)
+        ]
+
+    def test_repeated_header_and_footer_are_removed(self):
+        stripper = BoilerplateStripper()
+        result = list(stripper.strip(self.pages(5)))
+        self.assertEqual(result[0], (1, "Wash hands."))
+        self.assertEqual([number for number, _ in result], [1, 2, 3, 4, 5])
+        self.assertEqual(stripper.lines_removed, 10)
+
+    def test_short_documents_are_left_alone(self):
+        pages = self.pages(boilerplate.BOILERPLATE_MIN_PAGES - 1)
+        stripper = BoilerplateStripper()
+        self.assertEqual(list(stripper.strip(pages)), pages)
+        self.assertEqual(stripper.lines_removed, 0)
+
+    def test_body_lines_are_kept_even_if_repeated(self):
+        pages = [
+            (number, f"Header\n{word} one\n{word} two\nRepeated body line\n{word} three\n{word} four\nFooter")
+            for number, word in enumerate(['alpha', 'beta', 'gamma', 'delta'], start=1)
+        ]
+        result = list(BoilerplateStripper().strip(pages))
+        self.assertEqual(result[0][1], "alpha one\nalpha two\nRepeated body line\nalpha three\nalpha four")
+
+    def test_pages_after_the_sample_are_cleaned(self):
+        with mock.patch.object(boilerplate, 'BOILERPLATE_SAMPLE_PAGES', 3):
+            result = list(BoilerplateStripper().strip(self.pages(6)))
+        self.assertEqual(result[5], (6, "Audit wards."))
+
+    def test_normalize_line(self):
+        self.assertEqual(boilerplate.normalize_line("  Page 3   of 40 "), "page # of #")
+
+
+class ZipExportTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.backend = storage.LocalStorage(self.root.name)
+        self.backend.put('attachments', 'a/report.pdf', b'%PDF-1.4 report')
+        self.backend.put('attachments', 'b/notes.txt', b'notes')
+        patcher = mock.patch.object(storage, 'get_storage', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def archive(self, entries):
+        return zipfile.ZipFile(io.BytesIO(b''.join(zip_export.stream_zip(entries, workers=2))))
+
+    def test_entries_in_order(self):
+        archive = self.archive([
+            ('attachments', 'a/report.pdf', 'report.pdf'),
+            ('attachments', 'b/notes.txt', 'notes.txt'),
+        ])
+        self.assertEqual(archive.namelist(), ['report.pdf', 'notes.txt'])
+        self.assertEqual(archive.read('report.pdf'), b'%PDF-1.4 report')
+        self.assertEqual(archive.getinfo('report.pdf').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo('notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertIsNone(archive.testzip())
+
+    def test_missing_object_is_listed_in_errors_entry(self):
+        archive = self.archive([
+            ('attachments', 'a/report.pdf', 'report.pdf'),
+            ('attachments', 'gone/missing.pdf', 'missing.pdf'),
+            ('attachments', 'b/notes.txt', 'notes.txt'),
+        ])
+        self.assertEqual(archive.namelist(), ['report.pdf', 'notes.txt', zip_export.ERRORS_ENTRY])
+        errors = archive.read(zip_export.ERRORS_ENTRY).decode('utf-8')
+        self.assertIn('missing.pdf', errors)
+        self.assertNotIn('report.pdf', errors)
+
+    def test_no_errors_entry_when_everything_is_included(self):
+        archive = self.archive([('attachments', 'b/notes.txt', 'notes.txt')])
+        self.assertNotIn(zip_export.ERRORS_ENTRY, archive.namelist())
+
+    def test_unique_name(self):
+        used = set()
+        self.assertEqual(
+            [zip_export.unique_name(name, used) for name in ['a.pdf', 'a.pdf', 'a.pdf', 'b']],
+            ['a.pdf', 'a (2).pdf', 'a (3).pdf', 'b']
+        )
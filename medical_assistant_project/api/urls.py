@@ -2,6 +2,11 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DocumentUploadView,
+    IngestionJobView,
+    DocumentIngestionStatsView,
+    UploadSessionView,
+    UploadSessionPartView,
+    UploadSessionCompleteView,
     ContentGenerationView,
     GeneratedContentViewSet,
     AvailableModelsView,
@@ -22,7 +27,8 @@ from .views import (
     UserListView,
     SimpleChatbotMessageView,
     SimpleChatbotConversationView,
-    SimpleChatbotHealthView
+    SimpleChatbotHealthView,
+    SystemStatsView
 )
 
 router = DefaultRouter()
@@ -44,8 +50,16 @@ urlpatterns = [
     path('', include(router.urls)), # Include ViewSet URLs
     # Document management endpoints
     path('documents/', DocumentUploadView.as_view(), name='document-list'),
+    path('documents/ingestion-stats/', DocumentIngestionStatsView.as_view(), name='document-ingestion-stats'),
     path('documents/<uuid:document_id>/', DocumentUploadView.as_view(), name='document-detail'),
     path('documents/<uuid:document_id>/download/', DocumentDownloadView.as_view(), name='document-download'),
+    path('ingestion-jobs/<uuid:job_id>/', IngestionJobView.as_view(), name='ingestion-job-detail'),
+
+    # Resumable upload endpoints
+    path('uploads/', UploadSessionView.as_view(), name='upload-session-create'),
+    path('uploads/<uuid:session_id>/', UploadSessionView.as_view(), name='upload-session-detail'),
+    path('uploads/<uuid:session_id>/parts/<int:part_number>/', UploadSessionPartView.as_view(), name='upload-session-part'),
+    path('uploads/<uuid:session_id>/complete/', UploadSessionCompleteView.as_view(), name='upload-session-complete'),
 
     # Audit question endpoints
     path('audit-questions/', AuditQuestionListView.as_view(), name='audit-question-list'),
@@ -68,4 +82,7 @@ urlpatterns = [
 
     # User management endpoint
     path('users/', UserListView.as_view(), name='user-list'),
+
+    # Operational statistics endpoint
+    path('system/stats/', SystemStatsView.as_view(), name='system-stats'),
 ]
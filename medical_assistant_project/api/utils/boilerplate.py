@@ -0,0 +1,84 @@
+"""
+Removal of repeated page headers, footers and page numbers.
+
+Exported PDFs repeat the same running header, footer, confidentiality notice
+and page number on every page. Left in, these lines end up in almost every
+chunk. The stripper counts how often each line occurs near the top or bottom
+of the first pages of a document and drops the lines that occur on most of them.
+"""
+import os
+import re
+from collections import Counter
+
+BOILERPLATE_SAMPLE_PAGES = int(os.getenv("BOILERPLATE_SAMPLE_PAGES", "20"))  # Pages read before deciding
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))  # Shorter documents are left alone
+BOILERPLATE_MIN_FRACTION = float(os.getenv("BOILERPLATE_MIN_FRACTION", "0.5"))  # Share of sampled pages a line must appear on
+BOILERPLATE_EDGE_LINES = int(os.getenv("BOILERPLATE_EDGE_LINES", "3"))  # Lines at the top and bottom of a page considered
+
+_DIGITS = re.compile(r'\d+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_line(line: str) -> str:
+    """Normalizes a line so 'Page 3 of 40' and 'Page 4 of 40' count as the same line."""
+    return _WHITESPACE.sub(' ', _DIGITS.sub('#', line)).strip().lower()
+
+
+def _edge_indexes(line_count: int) -> set:
+    # Never more than half the page from each end, so short pages keep their body
+    edge = min(BOILERPLATE_EDGE_LINES, line_count // 2)
+    return set(range(edge)) | set(range(line_count - edge, line_count))
+
+
+class BoilerplateStripper:
+    """
+    Strips repeated header/footer lines from a stream of (page_number, text) pages.
+
+    The first BOILERPLATE_SAMPLE_PAGES pages are buffered to count line
+    frequencies; after that pages stream straight through, so memory stays
+    bounded regardless of document length. lines_removed is final once the
+    stream has been consumed.
+    """
+
+    def __init__(self):
+        self.boilerplate = set()
+        self.lines_removed = 0
+
+    def _learn(self, pages: list):
+        if len(pages) < BOILERPLATE_MIN_PAGES:
+            return
+        counts = Counter()
+        for _, text in pages:
+            lines = text.splitlines()
+            edge_lines = {normalize_line(lines[i]) for i in _edge_indexes(len(lines))}
+            counts.update(line for line in edge_lines if line)
+        threshold = max(BOILERPLATE_MIN_PAGES, len(pages) * BOILERPLATE_MIN_FRACTION)
+        self.boilerplate = {line for line, count in counts.items() if count >= threshold}
+
+    def _clean(self, text: str) -> str:
+        if not self.boilerplate or not text:
+            return text
+        lines = text.splitlines()
+        edges = _edge_indexes(len(lines))
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edges and normalize_line(line) in self.boilerplate:
+                self.lines_removed += 1
+            else:
+                kept.append(line)
+        return "\n".join(kept)
+
+    def strip(self, pages):
+        """Yields (page_number, text) with boilerplate lines removed."""
+        pages = iter(pages)
+        sample = []
+        for page in pages:
+            sample.append(page)
+            if len(sample) >= BOILERPLATE_SAMPLE_PAGES:
+                break
+        self._learn(sample)
+
+        for page_number, text in sample:
+            yield page_number, self._clean(text)
+        for page_number, text in pages:
+            yield page_number, self._clean(text)
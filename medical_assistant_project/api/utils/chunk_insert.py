@@ -0,0 +1,189 @@
+"""
+Fast insertion of DocumentChunk rows.
+
+The default path streams rows into Postgres with COPY ... FROM STDIN in
+binary format, so embeddings travel as packed float32 values instead of as
+text inside one giant ORM-built INSERT. batched execute_values and plain
+bulk_create remain available as fallbacks.
+"""
+import io
+import json
+import logging
+import os
+import struct
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+from api.models import DocumentChunk
+from api.utils import minhash
+
+logger = logging.getLogger(__name__)
+
+# copy | values | orm
+CHUNK_INSERT_METHOD = os.getenv("CHUNK_INSERT_METHOD", "copy").lower()
+
+_COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+_COPY_HEADER = _COPY_SIGNATURE + struct.pack('>ii', 0, 0)  # flags, header extension length
+_COPY_TRAILER = struct.pack('>h', -1)
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+# Columns written for every chunk, in COPY order
+_COLUMNS = ['id', 'document_id', 'chunk_text', 'embedding', 'metadata', 'minhash', 'canonical_chunk_id', 'created_at']
+
+
+def _field(data: bytes) -> bytes:
+    return struct.pack('>i', len(data)) + data
+
+
+def _null_field() -> bytes:
+    return struct.pack('>i', -1)
+
+
+def _encode_vector(embedding) -> bytes:
+    # pgvector binary format: int16 dimensions, int16 unused, float32 values (big-endian)
+    values = np.asarray(embedding, dtype='>f4')
+    return struct.pack('>hh', values.shape[0], 0) + values.tobytes()
+
+
+def _encode_jsonb(value) -> bytes:
+    # jsonb binary format: version byte 1 followed by the JSON text
+    return b'\x01' + json.dumps(value).encode('utf-8')
+
+
+def _encode_timestamptz(value: datetime) -> bytes:
+    delta = value - _PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return struct.pack('>q', micros)
+
+
+def _encode_row(chunk, created_at) -> bytes:
+    fields = [
+        _field(chunk.id.bytes),
+        _field(chunk.document_id.bytes),
+        _field(chunk.chunk_text.encode('utf-8')),
+        _field(_encode_vector(chunk.embedding)) if chunk.embedding is not None else _null_field(),
+        _field(_encode_jsonb(chunk.metadata)) if chunk.metadata is not None else _null_field(),
+        _field(bytes(chunk.minhash)) if chunk.minhash is not None else _null_field(),
+        _field(chunk.canonical_chunk_id.bytes) if chunk.canonical_chunk_id is not None else _null_field(),
+        _field(_encode_timestamptz(created_at)),
+    ]
+    return struct.pack('>h', len(fields)) + b''.join(fields)
+
+
+def _iter_copy_data(chunks, created_at):
+    yield _COPY_HEADER
+    for chunk in chunks:
+        yield _encode_row(chunk, created_at)
+    yield _COPY_TRAILER
+
+
+class _IterStream(io.RawIOBase):
+    """Read-only file object over an iterator of bytes, so COPY data is produced as it is sent."""
+
+    def __init__(self, iterator):
+        self._iterator = iterator
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._iterator)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _table_and_columns():
+    table = connection.ops.quote_name(DocumentChunk._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(c) for c in _COLUMNS)
+    return table, columns
+
+
+def _copy_insert(chunks, created_at):
+    table, columns = _table_and_columns()
+    sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT binary)"
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):  # psycopg2
+            raw_cursor.copy_expert(sql, _IterStream(_iter_copy_data(chunks, created_at)))
+        else:  # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                for block in _iter_copy_data(chunks, created_at):
+                    copy.write(block)
+
+
+def _values_insert(chunks, created_at, batch_size):
+    table, columns = _table_and_columns()
+    rows = [
+        (
+            str(chunk.id), str(chunk.document_id), chunk.chunk_text,
+            '[' + ','.join(map(str, chunk.embedding)) + ']' if chunk.embedding is not None else None,
+            json.dumps(chunk.metadata) if chunk.metadata is not None else None,
+            bytes(chunk.minhash) if chunk.minhash is not None else None,
+            str(chunk.canonical_chunk_id) if chunk.canonical_chunk_id is not None else None,
+            created_at,
+        )
+        for chunk in chunks
+    ]
+    template = "(%s, %s, %s, %s::vector, %s::jsonb, %s, %s, %s)"
+    with connection.cursor() as cursor:
+        try:
+            from psycopg2.extras import execute_values
+        except ImportError:
+            cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES {template}", rows)
+        else:
+            execute_values(
+                cursor.cursor, f"INSERT INTO {table} ({columns}) VALUES %s", rows,
+                template=template, page_size=batch_size
+            )
+
+
+def insert_chunks(chunks: list, method: str = None, batch_size: int = 500) -> int:
+    """
+    Inserts unsaved DocumentChunk instances, inside the caller's transaction.
+
+    Args:
+        chunks: Unsaved DocumentChunk instances with document, chunk_text, embedding and metadata set
+            (embedding may be None for chunks linked to a canonical chunk); a missing MinHash
+            signature is computed from chunk_text
+        method: 'copy' (binary COPY), 'values' (batched execute_values) or 'orm' (bulk_create)
+        batch_size: Rows per statement for the 'values' and 'orm' methods
+
+    Returns:
+        int: Number of rows inserted
+    """
+    if not chunks:
+        return 0
+    for chunk in chunks:
+        if chunk.minhash is None:
+            chunk.minhash = minhash.compute_signature(chunk.chunk_text)
+
+    method = method or CHUNK_INSERT_METHOD
+    if connection.vendor != 'postgresql':
+        method = 'orm'
+
+    created_at = timezone.now()
+    if method == 'copy':
+        try:
+            # Savepoint so a failed COPY can fall back without aborting the outer transaction
+            with transaction.atomic():
+                _copy_insert(chunks, created_at)
+            return len(chunks)
+        except Exception as e:
+            logger.warning(f"COPY insert of {len(chunks)} chunks failed, falling back to execute_values: {e}")
+            method = 'values'
+
+    if method == 'values':
+        _values_insert(chunks, created_at, batch_size)
+        return len(chunks)
+
+    DocumentChunk.objects.bulk_create(chunks, batch_size=batch_size)
+    return len(chunks)
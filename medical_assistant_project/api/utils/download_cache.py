@@ -0,0 +1,220 @@
+"""
+Size-bounded on-disk cache of downloaded storage objects.
+
+The same documents are downloaded many times a day. The first full download
+of an object is written to DOWNLOAD_CACHE_DIR as it is streamed to the client;
+later downloads (including range requests) are served from the local copy with
+FileResponse/sendfile. Entries are keyed by bucket, storage path and content
+hash, so a replaced file never matches a stale copy; objects without a content
+hash are never cached. The least recently used entries are evicted once the
+cache grows past DOWNLOAD_CACHE_MAX_BYTES.
+
+Each process keeps its own LRU index, rebuilt from the files' modification
+times at startup (a hit touches the file). With several gunicorn workers
+sharing the directory the size bound is therefore approximate, and a file
+evicted by another worker is simply treated as a miss.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from api.utils import storage
+
+CACHE_DIR = getattr(settings, 'DOWNLOAD_CACHE_DIR', None)
+MAX_BYTES = getattr(settings, 'DOWNLOAD_CACHE_MAX_BYTES', 0)
+MAX_OBJECT_BYTES = getattr(settings, 'DOWNLOAD_CACHE_MAX_OBJECT_BYTES', 100 * 1024 * 1024)
+FILL_PREFIX = '.fill-'
+STALE_FILL_SECONDS = 3600  # Younger temp files may belong to a fill still running in another worker
+
+logger = logging.getLogger(__name__)
+
+
+def _path_key(bucket: str, storage_path: str) -> str:
+    return hashlib.sha256(f"{bucket}/{storage_path}".encode()).hexdigest()
+
+
+class DownloadCache:
+
+    def __init__(self, root: str, max_bytes: int, max_object_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # cache file path -> size, least recently used first
+        self._size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'bytes_served': 0, 'bytes_filled': 0, 'evictions': 0}
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Rebuilds the LRU index from the files already on disk, oldest first."""
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                if name.startswith(FILL_PREFIX):
+                    if stat.st_mtime < time.time() - STALE_FILL_SECONDS:
+                        os.remove(path)  # Left behind by an interrupted fill
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._size += size
+        self._evict()
+
+    def _entry_path(self, bucket: str, storage_path: str, content_hash: str) -> str:
+        # One directory per object, so invalidation removes every content version at once
+        return os.path.join(self.root, _path_key(bucket, storage_path), content_hash)
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits. Call with the lock held (or during init)."""
+        while self._size > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def open(self, bucket: str, storage_path: str, content_hash: str):
+        """Returns an open file for a cached object (marking it recently used), or None on a miss."""
+        if not content_hash:
+            return None
+        path = self._entry_path(bucket, storage_path, content_hash)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                if path in self._entries:  # Evicted by another process
+                    self._size -= self._entries.pop(path)
+            return None
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            else:
+                self._entries[path] = os.fstat(file.fileno()).st_size
+                self._size += self._entries[path]
+        try:
+            os.utime(path)  # Keeps the LRU order across restarts
+        except OSError:
+            pass
+        return file
+
+    def tee(self, bucket: str, storage_path: str, content_hash: str, chunks, length: int = None):
+        """
+        Passes the chunks of a full download through unchanged while writing
+        them to a temp file, which is renamed into the cache once the last
+        chunk has been handed on. Objects over max_object_bytes, short reads,
+        clients that stop reading and cache disk errors leave the cache as it
+        was; the download itself is never affected. Objects without a content
+        hash are passed through uncached.
+        """
+        if not content_hash or (length is not None and length > self.max_object_bytes):
+            yield from chunks
+            return
+        path = self._entry_path(bucket, storage_path, content_hash)
+        temp_file = temp_path = None
+        try:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=FILL_PREFIX)
+                temp_file = os.fdopen(handle, 'wb')
+            except OSError as e:  # A full or unwritable cache disk must not break downloads
+                logger.error(f"Failed to cache {storage_path}: {e}")
+            for chunk in chunks:
+                if temp_file is not None:
+                    try:
+                        temp_file.write(chunk)
+                        if temp_file.tell() > self.max_object_bytes:  # No Content-Length was sent
+                            temp_file.close()
+                            temp_file = None
+                    except OSError as e:
+                        logger.error(f"Failed to cache {storage_path}: {e}")
+                        temp_file.close()
+                        temp_file = None
+                yield chunk
+            if temp_file is not None:
+                size = temp_file.tell()
+                temp_file.close()
+                temp_file = None
+                if length is None or size == length:
+                    os.replace(temp_path, path)
+                    temp_path = None
+                    self._add(path, size)
+        finally:
+            if temp_file is not None:
+                temp_file.close()
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _add(self, path: str, size: int):
+        with self._lock:
+            if path in self._entries:
+                self._size -= self._entries.pop(path)
+            self._entries[path] = size
+            self._size += size
+            self.stats['bytes_filled'] += size
+            self._evict()
+
+    def record(self, hit: bool, bytes_served: int = 0):
+        with self._lock:
+            self.stats['hits' if hit else 'misses'] += 1
+            self.stats['bytes_served'] += bytes_served
+
+    def invalidate(self, bucket: str, storage_path: str):
+        """Drops every cached version of an object."""
+        directory = os.path.join(self.root, _path_key(bucket, storage_path))
+        with self._lock:
+            for path in [path for path in self._entries if os.path.dirname(path) == directory]:
+                self._size -= self._entries.pop(path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None,
+                **self.stats,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process's download cache, or None when it is disabled
+    (DOWNLOAD_CACHE_MAX_BYTES is 0, or files already live on local storage).
+    """
+    global _cache
+    if not MAX_BYTES or not CACHE_DIR or storage.STORAGE_BACKEND == 'local':
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DownloadCache(CACHE_DIR, MAX_BYTES, MAX_OBJECT_BYTES)
+    return _cache
+
+
+def invalidate(bucket: str, storage_path: str):
+    """Removes an object from the cache, if caching is enabled."""
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(bucket, storage_path)
+
+
+def get_cache_stats() -> dict:
+    cache = get_cache()
+    return cache.as_dict() if cache is not None else {'enabled': False}
@@ -0,0 +1,166 @@
+"""
+Streaming downloads of storage objects.
+
+Files are passed to the client block by block instead of being loaded into
+memory first. Range, If-Range and If-None-Match are handed to the storage
+backend, which answers with 206/304/416 itself; its Content-Length and
+Content-Range are passed back to the client, so PDF viewers can seek and
+browsers can revalidate cached copies. Whole files from local storage or the
+download cache are returned as open files, which the WSGI server can send
+with sendfile().
+
+When the file's content hash is known, it is the ETag, whether the file comes
+from the cache or from storage; If-None-Match and If-Range are then checked
+against it here rather than by the backend. Otherwise the backend's own ETag
+is passed through, and the file is not cached.
+"""
+import logging
+import httpx
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from api.utils import download_cache
+from api.utils.storage import StorageObjectNotFound, get_storage, open_file_stream
+
+FORWARDED_REQUEST_HEADERS = {
+    'HTTP_RANGE': 'Range',
+    'HTTP_IF_RANGE': 'If-Range',
+    'HTTP_IF_NONE_MATCH': 'If-None-Match',
+}
+PASSED_RESPONSE_HEADERS = ['Content-Length', 'Content-Range', 'ETag', 'Last-Modified']
+
+logger = logging.getLogger(__name__)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def _iter_stream(stream):
+    try:
+        yield from stream.chunks
+    finally:
+        stream.close()
+
+
+def _content_etag(content_hash: str):
+    return f'"{content_hash}"' if content_hash else None
+
+
+def _forwarded_headers(request, etag: str = None) -> dict:
+    """
+    Request headers for the storage backend. With an ETag of our own, the
+    backend cannot judge the client's validators, so If-None-Match (already
+    answered) is dropped and an If-Range ETag is resolved here.
+    """
+    headers = {'Accept-Encoding': 'identity'}  # Bytes are passed through as stored, so lengths and ranges hold
+    for meta_key, header in FORWARDED_REQUEST_HEADERS.items():
+        value = request.META.get(meta_key)
+        if value:
+            headers[header] = value
+    if ',' in headers.get('Range', ''):
+        # Multi-range requests get the whole file, which HTTP allows
+        del headers['Range']
+        headers.pop('If-Range', None)
+    if etag:
+        headers.pop('If-None-Match', None)
+        if_range = headers.get('If-Range', '')
+        if if_range.startswith(('"', 'W/')):
+            del headers['If-Range']
+            if if_range != etag:
+                headers.pop('Range', None)  # The client's copy is stale: send the whole object
+    return headers
+
+
+def _open_cached(request, bucket: str, storage_path: str, content_hash: str, method: str):
+    """
+    Opens the object from the download cache. Returns None when the cache is
+    off, does not hold the object or the object has no content hash.
+    """
+    cache = download_cache.get_cache()
+    if cache is None or not content_hash:
+        return None
+    file = cache.open(bucket, storage_path, content_hash)
+    if file is None:
+        cache.record(hit=False)
+        return None
+    stream = open_file_stream(file, _forwarded_headers(request), method, etag=_content_etag(content_hash))
+    cache.record(hit=True, bytes_served=int(stream.headers.get('Content-Length', 0)) if stream.status_code in (200, 206) else 0)
+    return stream
+
+
+def _cache_while_streaming(stream, bucket: str, storage_path: str, content_hash: str):
+    """
+    Copies a full download from storage into the download cache as the client
+    receives it, so a miss costs no extra wait. Range requests, other partial
+    answers and objects without a content hash are not cached.
+    """
+    cache = download_cache.get_cache()
+    if cache is None or not content_hash or stream.status_code != 200 or stream.chunks is None:
+        return
+    length = {name.lower(): value for name, value in stream.headers.items()}.get('content-length')
+    stream.chunks = cache.tee(bucket, storage_path, content_hash, stream.chunks, int(length) if length else None)
+
+
+def stream_storage_object(request, bucket: str, storage_path: str, file_name: str, content_type: str,
+                          content_hash: str = None):
+    """
+    Returns a response that streams a storage object to the client, from the
+    download cache when possible.
+
+    Raises:
+        StorageObjectNotFound: If storage has no object at storage_path
+        ConnectionError: If storage cannot be reached or answers with an error
+    """
+    method = 'HEAD' if request.method == 'HEAD' else 'GET'
+    etag = _content_etag(content_hash)
+    if etag and _etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    try:
+        stream = _open_cached(request, bucket, storage_path, content_hash, method)
+        if stream is None:
+            headers = _forwarded_headers(request, etag)
+            stream = get_storage().open_stream(bucket, storage_path, headers, method=method)
+            if method == 'GET' and 'Range' not in headers:
+                _cache_while_streaming(stream, bucket, storage_path, content_hash)
+    except httpx.HTTPError as e:
+        raise ConnectionError(f"Failed to reach storage: {e}") from e
+    upstream_headers = {name.lower(): value for name, value in stream.headers.items()}
+    if etag:
+        upstream_headers['etag'] = etag  # The same ETag for cache hits and misses
+
+    if stream.status_code == 304 or (
+        stream.status_code == 200 and _etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), upstream_headers.get('etag'))
+    ):
+        stream.close()
+        response = HttpResponseNotModified()
+        if 'etag' in upstream_headers:
+            response['ETag'] = upstream_headers['etag']
+        return response
+
+    if stream.status_code == 416:
+        stream.close()
+        response = HttpResponse(status=416)
+        if 'content-range' in upstream_headers:
+            response['Content-Range'] = upstream_headers['content-range']
+        return response
+
+    if method == 'HEAD':
+        stream.close()
+        response = HttpResponse(status=stream.status_code, content_type=content_type)
+    elif stream.chunks is None and stream.file is not None:
+        response = FileResponse(stream.file, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(_iter_stream(stream), status=stream.status_code, content_type=content_type)
+    for header in PASSED_RESPONSE_HEADERS:
+        if header.lower() in upstream_headers:
+            response[header] = upstream_headers[header.lower()]
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
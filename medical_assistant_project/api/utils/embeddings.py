@@ -1,5 +1,6 @@
 from langchain_huggingface import HuggingFaceEmbeddings
 import os
+import threading
 
 # Configure the embedding model (ensure dimensions match models.py VectorField)
 # Make sure the model is downloaded or accessible
@@ -25,13 +26,30 @@ def get_embedding_model():
 
 # Singleton pattern to avoid reloading the model repeatedly
 embedding_model_instance = None
+_embedding_model_lock = threading.Lock()  # Ingestion threads may request the model concurrently
 
 def get_cached_embedding_model():
     global embedding_model_instance
     if embedding_model_instance is None:
-        embedding_model_instance = get_embedding_model()
+        with _embedding_model_lock:
+            if embedding_model_instance is None:
+                embedding_model_instance = get_embedding_model()
     return embedding_model_instance
 
+# The tokenizer alone is enough to size chunks, so it is loaded without the model
+tokenizer_instance = None
+_tokenizer_lock = threading.Lock()
+
+def get_cached_tokenizer():
+    """Returns the embedding model's fast tokenizer (used for token-aware chunking)."""
+    global tokenizer_instance
+    if tokenizer_instance is None:
+        with _tokenizer_lock:
+            if tokenizer_instance is None:
+                from transformers import AutoTokenizer
+                tokenizer_instance = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+    return tokenizer_instance
+
 def embed_text(text: str) -> list[float]:
     """Generates embedding for a single text string."""
     model = get_cached_embedding_model()
@@ -0,0 +1,102 @@
+"""
+Helpers shared by the process-wide pooled HTTP clients (Supabase storage,
+OpenRouter).
+
+Connection reuse is measured with httpcore trace events: a request that
+emits 'connection.connect_tcp.complete' opened a new connection, any other
+request reused a pooled one.
+"""
+import importlib.util
+import os
+import threading
+import time
+import httpx
+
+
+def http2_available(enabled: bool) -> bool:
+    """HTTP/2 is used when enabled in settings and the h2 package is installed."""
+    return bool(enabled) and importlib.util.find_spec('h2') is not None
+
+
+def pool_limits(max_connections: int, max_keepalive: int, keepalive_expiry: float) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+
+class PoolStats:
+    """Counters for requests made through one family of pooled clients in this process."""
+
+    def __init__(self, **pool_settings):
+        self.pool_settings = pool_settings
+        self.after_fork()
+
+    def after_fork(self):
+        """Starts from zero with a new lock, which another thread may have held at fork time."""
+        self._lock = threading.Lock()
+        self.clients_built = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.connect_seconds = 0.0
+        self.errors = 0
+
+    def increment(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self, **extra) -> dict:
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                **extra,
+                'clients_built': self.clients_built,
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(0, self.requests - self.new_connections),
+                'reuse_ratio': round(1 - self.new_connections / self.requests, 3) if self.requests else None,
+                'tls_handshakes': self.tls_handshakes,
+                'connect_ms_total': round(self.connect_seconds * 1000, 1),
+                'errors': self.errors,
+                'pool': dict(self.pool_settings),
+            }
+
+
+class _ConnectionTrace:
+    """httpcore trace callback for one request; records whether it had to connect."""
+
+    def __init__(self, stats: PoolStats):
+        self.stats = stats
+        self.connect_started = None
+
+    def __call__(self, event_name: str, info: dict):
+        if event_name == 'connection.connect_tcp.started':
+            self.connect_started = time.perf_counter()
+        elif event_name == 'connection.connect_tcp.complete':
+            self.stats.increment(new_connections=1)
+        elif event_name == 'connection.start_tls.complete':
+            self.stats.increment(tls_handshakes=1)
+        if event_name in ('connection.connect_tcp.complete', 'connection.start_tls.complete') and self.connect_started:
+            now = time.perf_counter()
+            self.stats.increment(connect_seconds=now - self.connect_started)
+            self.connect_started = now
+
+
+def tracing_hooks(stats: PoolStats, event_hooks: dict = None) -> dict:
+    """Returns event_hooks extended with the hooks that count requests, connections and 5xx errors."""
+    def trace_request(request: httpx.Request):
+        stats.increment(requests=1)
+        request.extensions['trace'] = _ConnectionTrace(stats)
+
+    def count_errors(response: httpx.Response):
+        if response.status_code >= 500:
+            stats.increment(errors=1)
+
+    event_hooks = event_hooks or {}
+    return {
+        'request': [*event_hooks.get('request', []), trace_request],
+        'response': [*event_hooks.get('response', []), count_errors],
+    }
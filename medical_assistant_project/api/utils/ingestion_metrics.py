@@ -0,0 +1,91 @@
+"""
+Per-stage timing and size counters for document ingestion.
+
+Ingestion is streamed, so stages interleave: pulling a chunk pulls pages,
+and embedding and insertion alternate batch by batch. Stages are therefore
+timed with a stack. Time spent in a nested stage (e.g. parsing while the
+chunker asks for the next page) is subtracted from its parent, so every
+second is attributed to exactly one stage.
+
+CPU time is process CPU time (time.process_time), because the embedding
+model computes on its own native threads. Parallel PDF extraction runs in
+child processes, and its CPU time is not included.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ['download', 'hash', 'upload', 'parse', 'chunk', 'embed', 'insert', 'upload_wait']
+
+
+class IngestionMetrics:
+    """Collects wall/CPU time per stage plus size counters for one ingestion run."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self._stack = []
+        self._lock = threading.Lock()  # The background upload records from its own thread
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        frame = {'child_wall': 0.0, 'child_cpu': 0.0}
+        self._stack.append(frame)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]['child_wall'] += wall
+                self._stack[-1]['child_cpu'] += cpu
+            self.record(name, wall - frame['child_wall'], cpu - frame['child_cpu'])
+
+    def record(self, name: str, wall_seconds: float, cpu_seconds: float = None):
+        """Adds time to a stage directly (for work timed outside the calling thread)."""
+        with self._lock:
+            totals = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+            totals['wall'] += wall_seconds
+            if cpu_seconds is not None:
+                totals['cpu'] += cpu_seconds
+
+    def add(self, name: str, amount: int = 1):
+        """Increments a size counter (pages, characters, chunks, tokens, bytes)."""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def timed_iter(self, iterable, name: str):
+        """Wraps an iterator so the time spent producing each item is attributed to a stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self) -> dict:
+        """Returns the metrics in the JSON shape stored in Document.metadata['ingestion']."""
+        with self._lock:
+            return {
+                'total_wall_ms': round((time.perf_counter() - self._started) * 1000, 1),
+                'stages': {
+                    name: {'wall_ms': round(totals['wall'] * 1000, 1), 'cpu_ms': round(totals['cpu'] * 1000, 1)}
+                    for name, totals in self.stages.items()
+                },
+                'counts': dict(self.counts),
+            }
+
+
+def percentile(values: list, fraction: float):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
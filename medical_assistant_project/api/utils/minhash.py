@@ -0,0 +1,65 @@
+"""
+MinHash signatures and LSH banding for near-duplicate chunk detection.
+
+Each chunk is reduced to the set of its word 5-shingles, and the signature
+keeps the minimum of NUM_PERMUTATIONS independent hash functions over that
+set. The fraction of equal positions in two signatures estimates the Jaccard
+similarity of the chunks. Signatures are 64 uint32 values, stored as 256 bytes.
+
+For lookup, a signature is cut into LSH_BANDS bands. Chunks that share any
+band are candidate duplicates and are then checked against the full signature.
+With 16 bands of 4 rows, pairs around 0.5 similarity have even odds of being
+candidates and pairs above 0.8 are almost always found.
+"""
+import hashlib
+import re
+import numpy as np
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_WORDS = 5
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity at which chunks count as duplicates
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+# Fixed seed: signatures must be comparable across processes and deployments
+_random = np.random.RandomState(20240501)
+_PERM_A = _random.randint(1, (1 << 31) - 1, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _random.randint(0, (1 << 31) - 1, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r'\w+')
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+
+def compute_signature(text: str) -> bytes:
+    """Returns the MinHash signature of text as NUM_PERMUTATIONS little-endian uint32 values."""
+    hashes = _shingle_hashes(text)
+    # (a * x + b) mod p for every permutation/shingle pair; a, x < 2**32 so the product fits in uint64
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype('<u4').tobytes()
+
+
+def _as_array(signature) -> np.ndarray:
+    return np.frombuffer(bytes(signature), dtype='<u4')
+
+
+def similarity(signature_a, signature_b) -> float:
+    """Estimated Jaccard similarity of the chunks behind two signatures."""
+    return float(np.mean(_as_array(signature_a) == _as_array(signature_b)))
+
+
+def band_keys(signature) -> list:
+    """Returns one hashable key per LSH band; chunks sharing any key are candidate duplicates."""
+    data = bytes(signature)
+    band_size = len(data) // LSH_BANDS
+    return [(band, data[band * band_size:(band + 1) * band_size]) for band in range(LSH_BANDS)]
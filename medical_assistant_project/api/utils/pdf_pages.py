@@ -0,0 +1,106 @@
+"""
+Parallel PDF page extraction.
+
+This module is deliberately free of Django imports: the process pool uses the
+forkserver/spawn start method, so worker processes import only this module and
+the PDF libraries instead of the whole web application.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pypdf import PdfReader
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_pid = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_page_count(path: str, backend: str) -> int:
+    """Returns the number of pages in the PDF at path."""
+    if backend == 'pymupdf':
+        with fitz.open(path) as pdf:
+            return pdf.page_count
+    return len(PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, end: int, backend: str) -> list:
+    """
+    Extracts text for pages [start, end) of the PDF at path.
+    Runs inside a pool worker, which opens the shared file itself.
+
+    Returns:
+        list: (page_number, text) tuples, page numbers starting at 1
+    """
+    pages = []
+    if backend == 'pymupdf':
+        with fitz.open(path) as pdf:
+            for index in range(start, end):
+                pages.append((index + 1, pdf[index].get_text()))
+    else:
+        reader = PdfReader(path)
+        for index in range(start, end):
+            pages.append((index + 1, reader.pages[index].extract_text() or ""))
+    return pages
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Returns the process-wide extraction pool, rebuilding it after a fork or resize."""
+    global _pool, _pool_pid, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or _pool_workers != workers:
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.shutdown(wait=False)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_pid = os.getpid()
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def iter_pages_parallel(path: str, page_count: int, backend: str, workers: int, pages_per_task: int):
+    """
+    Yields (page_number, text) for every page of the PDF at path, extracting
+    page ranges concurrently in a process pool. Pages are yielded in document
+    order as soon as their range is done, and only a few ranges are in flight
+    at once so memory stays bounded.
+    """
+    pool = _get_pool(workers)
+    ranges = deque(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    in_flight = deque()
+    max_in_flight = workers * 2
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_in_flight:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(extract_page_range, path, start, end, backend))
+            yield from in_flight.popleft().result()
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,87 @@
+"""
+Cached signed storage URLs for redirect-mode downloads.
+
+A signed URL lets the browser fetch an object straight from object
+storage, so the bytes never pass through a Django worker. Signing is a
+network call, so URLs are cached per object and handed out again until
+SIGNED_URL_REFRESH_MARGIN_SECONDS before they expire; a client that gets
+a cached URL always has at least that long to start its download.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from api.utils.storage import get_storage
+
+SIGNED_URL_TTL_SECONDS = getattr(settings, 'SIGNED_URL_TTL_SECONDS', 300)
+REFRESH_MARGIN_SECONDS = getattr(settings, 'SIGNED_URL_REFRESH_MARGIN_SECONDS', 60)
+CACHE_SIZE = getattr(settings, 'SIGNED_URL_CACHE_SIZE', 1024)
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # (bucket, storage_path, file_name) -> (url, expires_at epoch seconds)
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _sign(bucket: str, storage_path: str, file_name: str) -> str:
+    try:
+        return get_storage().sign(bucket, storage_path, SIGNED_URL_TTL_SECONDS, download_name=file_name)
+    except ConnectionError:
+        raise
+    except Exception as e:
+        raise ConnectionError(f"Failed to sign storage URL for {storage_path}: {e}") from e
+
+
+def get_signed_url(bucket: str, storage_path: str, file_name: str):
+    """
+    Returns a signed download URL for an object, reusing a cached one while it has
+    more than the refresh margin left.
+
+    Returns:
+        tuple: (url, expires_at) where expires_at is an aware datetime
+
+    Raises:
+        ConnectionError: If storage cannot sign the URL
+    """
+    key = (bucket, storage_path, file_name)
+    now = time.time()
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[1] - REFRESH_MARGIN_SECONDS > now:
+            _cache.move_to_end(key)
+            _stats['hits'] += 1
+            return cached[0], datetime.fromtimestamp(cached[1], tz=dt_timezone.utc)
+
+    # Signed outside the lock; two threads missing at once both sign, which is harmless
+    url = _sign(bucket, storage_path, file_name)
+    expires_at = now + SIGNED_URL_TTL_SECONDS
+    with _lock:
+        _stats['misses'] += 1
+        _cache[key] = (url, expires_at)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return url, datetime.fromtimestamp(expires_at, tz=dt_timezone.utc)
+
+
+def invalidate(bucket: str, storage_path: str):
+    """Drops the cached URLs of an object that was deleted or replaced, under every file name."""
+    with _lock:
+        for key in [key for key in _cache if key[0] == bucket and key[1] == storage_path]:
+            del _cache[key]
+
+
+def seconds_until_refresh(expires_at: datetime) -> int:
+    """How long a client may reuse a URL before the cache would hand out a fresh one."""
+    return max(0, int(expires_at.timestamp() - time.time() - REFRESH_MARGIN_SECONDS))
+
+
+def get_cache_stats() -> dict:
+    with _lock:
+        return {
+            'entries': len(_cache),
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'ttl_seconds': SIGNED_URL_TTL_SECONDS,
+            'refresh_margin_seconds': REFRESH_MARGIN_SECONDS,
+        }
@@ -0,0 +1,362 @@
+"""
+Object storage backends.
+
+Services store and fetch files through get_storage() instead of calling
+Supabase directly. STORAGE_BACKEND selects the implementation:
+
+- 'supabase' (default): Supabase Storage over the pooled HTTP session.
+- 'local': a directory tree under LOCAL_STORAGE_ROOT, one folder per bucket.
+  Writes land in a temp file that is renamed into place, so readers never see
+  a partial object. Full reads are served from open files, which the WSGI
+  server can send with sendfile(). On-prem deployments use it to skip the
+  network hop, and benchmarks use it to run offline.
+
+Objects are addressed by (bucket, path). Uploads take a source as produced by
+api.utils.uploads (bytes, or the path of a file on disk).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+from email.utils import formatdate
+from django.conf import settings
+from api.utils import uploads
+
+STORAGE_BACKEND = getattr(settings, 'STORAGE_BACKEND', 'supabase')
+LOCAL_STORAGE_ROOT = getattr(settings, 'LOCAL_STORAGE_ROOT', None)
+STREAM_CHUNK_SIZE = 64 * 1024
+LIST_PAGE_SIZE = 1000
+
+
+class StorageObjectNotFound(Exception):
+    """Raised when the file referenced by a database row is missing from storage."""
+
+
+class ObjectStream:
+    """
+    An HTTP-style answer for a stored object: a status code, response headers,
+    and either an open file (for full reads from local storage) or a chunk
+    iterator. close() must be called if the body is not consumed.
+    """
+
+    def __init__(self, status_code: int, headers: dict, chunks=None, file=None, on_close=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.chunks = chunks
+        self.file = file
+        self._on_close = on_close
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self._on_close is not None:
+            self._on_close()
+
+
+class StorageBackend:
+    """Interface implemented by every storage backend."""
+
+    supports_signed_urls = False
+
+    def put(self, bucket: str, path: str, source, content_type: str = 'application/octet-stream'):
+        """Stores a source (bytes or a file path) at path, streaming files from disk."""
+        raise NotImplementedError
+
+    def fetch_to_path(self, bucket: str, path: str):
+        """
+        Makes the object available as a file on disk without holding it in memory.
+        The object is streamed block by block into a temp file under FILE_UPLOAD_TEMP_DIR.
+
+        Returns:
+            tuple: (file_path, temporary) where the caller must delete file_path when temporary is True
+
+        Raises:
+            StorageObjectNotFound: If there is no object at path
+        """
+        temp_file = tempfile.NamedTemporaryFile(
+            suffix=os.path.splitext(path)[1], delete=False, dir=getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None)
+        )
+        try:
+            with temp_file:
+                for chunk in self.read_blocks(bucket, path):
+                    temp_file.write(chunk)
+        except BaseException:
+            os.remove(temp_file.name)
+            raise
+        return temp_file.name, True
+
+    def read_blocks(self, bucket: str, path: str):
+        """
+        Yields the whole object block by block, without holding it in memory.
+
+        Raises:
+            StorageObjectNotFound: If there is no object at path
+        """
+        stream = self.open_stream(bucket, path, {'Accept-Encoding': 'identity'})
+        try:
+            if stream.status_code != 200:
+                raise ConnectionError(f"Storage returned HTTP {stream.status_code} for {path}.")
+            chunks = stream.chunks
+            if chunks is None:
+                chunks = iter(lambda: stream.file.read(STREAM_CHUNK_SIZE), b'')
+            yield from chunks
+        finally:
+            stream.close()
+
+    def open_stream(self, bucket: str, path: str, request_headers: dict = None, method: str = 'GET') -> ObjectStream:
+        """
+        Opens an object for a client download. Range, If-Range and If-None-Match in
+        request_headers are honoured, answering 206, 304 or 416 like an HTTP server.
+
+        Raises:
+            StorageObjectNotFound: If there is no object at path
+        """
+        raise NotImplementedError
+
+    def delete(self, bucket: str, path: str):
+        self.delete_many(bucket, [path])
+
+    def delete_many(self, bucket: str, paths: list):
+        """Deletes several objects; paths that do not exist are ignored."""
+        raise NotImplementedError
+
+    def exists(self, bucket: str, path: str) -> bool:
+        raise NotImplementedError
+
+    def list_objects(self, bucket: str):
+        """Yields (path, size, modified_at) for every object in a bucket; modified_at is an aware datetime or None."""
+        raise NotImplementedError
+
+    def sign(self, bucket: str, path: str, expires_in: int, download_name: str = None) -> str:
+        """Returns a URL that downloads the object directly, valid for expires_in seconds."""
+        raise NotImplementedError(f"{type(self).__name__} does not support signed URLs")
+
+
+class SupabaseStorage(StorageBackend):
+    supports_signed_urls = True
+
+    def _bucket(self, bucket: str):
+        from api.utils.supabase_client import get_supabase_client
+        return get_supabase_client().storage.from_(bucket)
+
+    def put(self, bucket, path, source, content_type='application/octet-stream'):
+        with uploads.open_source(source) as payload:
+            self._bucket(bucket).upload(path=path, file=payload, file_options={"content-type": content_type})
+
+    def open_stream(self, bucket, path, request_headers=None, method='GET'):
+        from api.utils.supabase_client import open_object_stream
+        upstream = open_object_stream(bucket, path, request_headers, method=method)
+        if upstream.status_code >= 400 and upstream.status_code != 416:
+            body = upstream.read() if method == 'GET' else b''
+            upstream.close()
+            # Storage reports missing objects as 404, or as 400 with a not_found error
+            if upstream.status_code == 404 or b'not_found' in body or b'not found' in body.lower():
+                raise StorageObjectNotFound(f"File {path} not found in storage.")
+            raise ConnectionError(f"Storage returned HTTP {upstream.status_code} for {path}.")
+        chunks = upstream.iter_raw(STREAM_CHUNK_SIZE) if method == 'GET' else None
+        return ObjectStream(upstream.status_code, dict(upstream.headers), chunks=chunks, on_close=upstream.close)
+
+    def delete_many(self, bucket, paths):
+        if paths:
+            self._bucket(bucket).remove(list(paths))
+
+    def exists(self, bucket, path):
+        try:
+            self.open_stream(bucket, path, method='HEAD').close()
+            return True
+        except StorageObjectNotFound:
+            return False
+
+    def list_objects(self, bucket, prefix=''):
+        # Listing is per folder and paginated; folders are the entries without an id
+        offset = 0
+        while True:
+            entries = self._bucket(bucket).list(prefix or None, {'limit': LIST_PAGE_SIZE, 'offset': offset})
+            for entry in entries:
+                path = f"{prefix}/{entry['name']}" if prefix else entry['name']
+                if entry.get('id') is None:
+                    yield from self.list_objects(bucket, path)
+                else:
+                    modified = entry.get('updated_at') or entry.get('created_at')
+                    yield (
+                        path,
+                        (entry.get('metadata') or {}).get('size'),
+                        datetime.fromisoformat(modified.replace('Z', '+00:00')) if modified else None,
+                    )
+            if len(entries) < LIST_PAGE_SIZE:
+                return
+            offset += LIST_PAGE_SIZE
+
+    def sign(self, bucket, path, expires_in, download_name=None):
+        options = {'download': download_name} if download_name else None
+        result = self._bucket(bucket).create_signed_url(path, expires_in, options=options)
+        url = result.get('signedURL') or result.get('signedUrl')
+        if not url:
+            raise ConnectionError(f"Storage returned no signed URL for {path}.")
+        return url
+
+
+def _parse_range(range_header: str, size: int):
+    """
+    Parses a single 'bytes=' range against an object size.
+    Returns (start, end) inclusive, None to serve the whole object, or 'unsatisfiable'.
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    start_text, _, end_text = range_header[len('bytes='):].strip().partition('-')
+    try:
+        if not start_text:  # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None  # Malformed ranges are ignored
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(file, start: int, length: int):
+    file.seek(start)
+    remaining = length
+    while remaining > 0:
+        block = file.read(min(STREAM_CHUNK_SIZE, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
+
+def open_file_stream(file, request_headers: dict = None, method: str = 'GET', etag: str = None) -> ObjectStream:
+    """
+    Answers a download from an open local file like an HTTP server would:
+    200 with the file itself, 206 for a single byte range, 304 when
+    If-None-Match matches, 416 for an unsatisfiable range. The ETag is
+    derived from the file's identity unless one is given.
+    """
+    request_headers = request_headers or {}
+    stat = os.fstat(file.fileno())
+    if etag is None:
+        etag = '"' + hashlib.md5(f"{stat.st_ino}-{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest() + '"'
+    headers = {'ETag': etag, 'Last-Modified': formatdate(stat.st_mtime, usegmt=True)}
+
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip().removeprefix('W/') for t in if_none_match.split(',')]):
+        file.close()
+        return ObjectStream(304, headers)
+
+    byte_range = _parse_range(request_headers.get('Range'), stat.st_size)
+    if_range = request_headers.get('If-Range')
+    if byte_range is not None and if_range and if_range not in (etag, headers['Last-Modified']):
+        byte_range = None  # The client's copy is stale: send the whole object
+    if byte_range == 'unsatisfiable':
+        file.close()
+        headers['Content-Range'] = f"bytes */{stat.st_size}"
+        return ObjectStream(416, headers)
+
+    if byte_range is None:
+        headers['Content-Length'] = str(stat.st_size)
+        if method == 'HEAD':
+            file.close()
+            return ObjectStream(200, headers)
+        return ObjectStream(200, headers, file=file)
+
+    start, end = byte_range
+    headers['Content-Length'] = str(end - start + 1)
+    headers['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+    if method == 'HEAD':
+        file.close()
+        return ObjectStream(206, headers)
+    return ObjectStream(206, headers, chunks=_iter_file_range(file, start, end - start + 1), file=file)
+
+
+class LocalStorage(StorageBackend):
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, bucket: str, path: str) -> str:
+        full_path = os.path.abspath(os.path.join(self.root, bucket, path))
+        if not full_path.startswith(os.path.join(self.root, bucket) + os.sep):
+            raise ValueError(f"Storage path {path} escapes bucket {bucket}.")
+        return full_path
+
+    def put(self, bucket, path, source, content_type='application/octet-stream'):
+        target = self._path(bucket, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.upload-')
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                if not uploads.is_path(source):
+                    temp_file.write(source)
+            if uploads.is_path(source):
+                shutil.copyfile(source, temp_path)  # Copied in the kernel (sendfile) on Linux
+            os.replace(temp_path, target)  # Atomic: readers see the old object or the whole new one
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def fetch_to_path(self, bucket, path):
+        # The stored file itself; the caller only reads it
+        full_path = self._path(bucket, path)
+        if not os.path.isfile(full_path):
+            raise StorageObjectNotFound(f"File {path} not found in storage.")
+        return full_path, False
+
+    def open_stream(self, bucket, path, request_headers=None, method='GET'):
+        try:
+            file = open(self._path(bucket, path), 'rb')
+        except FileNotFoundError:
+            raise StorageObjectNotFound(f"File {path} not found in storage.")
+        return open_file_stream(file, request_headers, method)
+
+    def delete_many(self, bucket, paths):
+        for path in paths:
+            try:
+                os.remove(self._path(bucket, path))
+            except FileNotFoundError:
+                pass
+
+    def exists(self, bucket, path):
+        return os.path.isfile(self._path(bucket, path))
+
+    def list_objects(self, bucket):
+        bucket_root = os.path.join(self.root, bucket)
+        for directory, _, names in os.walk(bucket_root):
+            for name in names:
+                if name.startswith('.upload-'):
+                    continue  # A write still in progress
+                full_path = os.path.join(directory, name)
+                stat = os.stat(full_path)
+                yield (
+                    os.path.relpath(full_path, bucket_root).replace(os.sep, '/'),
+                    stat.st_size,
+                    datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc),
+                )
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Returns the configured storage backend, created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND == 'local':
+                    if not LOCAL_STORAGE_ROOT:
+                        raise ValueError("LOCAL_STORAGE_ROOT must be set when STORAGE_BACKEND is 'local'.")
+                    _backend = LocalStorage(LOCAL_STORAGE_ROOT)
+                elif STORAGE_BACKEND == 'supabase':
+                    _backend = SupabaseStorage()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'. Use 'supabase' or 'local'.")
+    return _backend
@@ -1,21 +1,133 @@
+"""
+Process-wide Supabase clients.
+
+Clients are built once per process and shared by all threads, so storage
+uploads, downloads and deletes reuse keep-alive HTTP connections instead of
+constructing a client and doing a TLS handshake per call. The storage
+session is built here, with an httpx transport whose connection pool is sized
+from settings (SUPABASE_POOL_*), through the hooks supabase and storage3 use to
+construct their clients (see requirements.txt for the versions). After a
+fork (e.g. gunicorn workers created from a preloaded master) the child
+discards the parent's clients and builds its own, since sockets must not be
+shared between processes.
+
+Connection reuse is counted with the tracing hooks from api.utils.http_pool.
+"""
+import logging
 import os
-from supabase import create_client, Client
+import threading
+from urllib.parse import quote
+import httpx
+from django.conf import settings
+from storage3 import SyncStorageClient
+from storage3.constants import DEFAULT_TIMEOUT as DEFAULT_STORAGE_TIMEOUT
+from storage3.utils import SyncClient as StorageSession
+from supabase import Client
+from api.utils import http_pool
+
+logger = logging.getLogger(__name__)
+
+POOL_MAX_CONNECTIONS = getattr(settings, 'SUPABASE_POOL_MAX_CONNECTIONS', 20)
+POOL_MAX_KEEPALIVE = getattr(settings, 'SUPABASE_POOL_MAX_KEEPALIVE', 10)
+KEEPALIVE_EXPIRY_SECONDS = getattr(settings, 'SUPABASE_KEEPALIVE_EXPIRY_SECONDS', 60)
+HTTP2_ENABLED = http_pool.http2_available(getattr(settings, 'SUPABASE_HTTP2', True))
+
+_registry_lock = threading.Lock()
+_clients = {}
+_clients_pid = os.getpid()
+
+pool_stats = http_pool.PoolStats(
+    max_connections=POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=POOL_MAX_KEEPALIVE,
+    keepalive_expiry_seconds=KEEPALIVE_EXPIRY_SECONDS,
+    http2=HTTP2_ENABLED,
+)
+
+
+class _PooledStorageClient(SyncStorageClient):
+    """Storage client whose session has a sized keep-alive pool and the tracing hooks."""
+    transport = None
+
+    def _create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        limits = http_pool.pool_limits(POOL_MAX_CONNECTIONS, POOL_MAX_KEEPALIVE, KEEPALIVE_EXPIRY_SECONDS)
+        self.transport = httpx.HTTPTransport(http2=HTTP2_ENABLED, limits=limits, verify=bool(verify), proxy=proxy)
+        return StorageSession(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=self.transport,
+            limits=limits,
+            event_hooks=http_pool.tracing_hooks(pool_stats),
+        )
+
+
+class _PooledClient(Client):
+    """Supabase client that builds its storage client (also when it is rebuilt) with the pooled session."""
+
+    @staticmethod
+    def _init_storage_client(storage_url, headers, storage_client_timeout=DEFAULT_STORAGE_TIMEOUT, verify=True, proxy=None):
+        return _PooledStorageClient(storage_url, headers, storage_client_timeout, verify, proxy)
+
+
+def _reset_after_fork():
+    """Drops clients inherited from the parent. They are not closed: their sockets belong to the parent."""
+    global _registry_lock, _clients_pid
+    _registry_lock = threading.Lock()  # Another thread may have held it at fork time
+    _clients.clear()
+    _clients_pid = os.getpid()
+    pool_stats.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_client(kind: str, key_env: str, key_label: str) -> Client:
+    if _clients_pid != os.getpid():  # Safety net in case the at-fork hook did not run
+        _reset_after_fork()
+    client = _clients.get(kind)
+    if client is not None:
+        return client
+    with _registry_lock:
+        client = _clients.get(kind)
+        if client is None:
+            url: str = os.environ.get("SUPABASE_URL")
+            key: str = os.environ.get(key_env)
+            if not url or not key:
+                raise ValueError(f"Supabase URL or {key_label} not found in environment variables.")
+            client = _PooledClient.create(supabase_url=url, supabase_key=key)
+            if not isinstance(client.storage, _PooledStorageClient) or client.storage.transport is None:
+                # Without this, every storage call would silently use storage3's default pool
+                raise RuntimeError(
+                    "The installed supabase/storage3 no longer build the storage session through "
+                    "_init_storage_client/_create_session; check the versions pinned in requirements.txt."
+                )
+            _clients[kind] = client
+            pool_stats.increment(clients_built=1)
+    return client
+
 
 def get_supabase_client() -> Client:
-    """Initializes and returns the Supabase client using service role."""
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_SERVICE_KEY") # Use service key for backend operations
-    if not url or not key:
-        raise ValueError("Supabase URL or Service Key not found in environment variables.")
-    return create_client(url, key)
+    """Returns the shared Supabase client using service role, building it on first use."""
+    return _get_client('service', "SUPABASE_SERVICE_KEY", "Service Key")  # Use service key for backend operations
+
 
 def get_supabase_anon_client() -> Client:
-    """Initializes and returns the Supabase client using anon key (for public access if needed)."""
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_ANON_KEY")
-    if not url or not key:
-        raise ValueError("Supabase URL or Anon Key not found in environment variables.")
-    return create_client(url, key)
-
-# You can add helper functions here for upload/download if desired
-# e.g., upload_to_storage, download_from_storage
\ No newline at end of file
+    """Returns the shared Supabase client using anon key (for public access if needed)."""
+    return _get_client('anon', "SUPABASE_ANON_KEY", "Anon Key")
+
+
+def get_pool_stats() -> dict:
+    """Returns connection reuse counters for this process's Supabase clients."""
+    return pool_stats.as_dict(clients=sorted(_clients))
+
+
+def open_object_stream(bucket: str, storage_path: str, headers: dict = None, method: str = 'GET') -> httpx.Response:
+    """
+    Requests a storage object on the pooled session without reading its body.
+    The caller iterates the response (iter_raw) and must close it.
+    """
+    session = get_supabase_client().storage.session
+    request = session.build_request(method, f"object/{bucket}/{quote(storage_path)}", headers=headers or {})
+    return session.send(request, stream=True)
@@ -0,0 +1,125 @@
+"""
+Token-aware chunking sized by the embedding model's own tokenizer.
+
+all-MiniLM-L6-v2 reads at most 256 tokens ([CLS] and [SEP] included) and
+silently truncates the rest, so a chunk limit in characters either wastes the
+window or loses text. Each page is tokenized once with a fast tokenizer, and
+its character offsets are used to cut chunks of at most max_tokens tokens in
+a single forward pass. Cuts prefer a paragraph break, then a sentence end,
+then any whitespace, and a chunk never starts in the middle of a word.
+"""
+
+# Boundary quality of the gap before a token; higher is a better place to cut
+_HARD_CUT = 0
+_WORD = 1
+_SENTENCE = 2
+_PARAGRAPH = 3
+_SENTENCE_END = '.!?;:'
+
+
+class TokenChunker:
+    """
+    Splits a stream of (page_number, text) pages into chunks.
+
+    Yields (page_number, chunk_text, span), where span has the page-relative
+    character offsets 'start_offset' and 'end_offset' of the chunk and its
+    'token_count', the tokens between those offsets (excluding [CLS]/[SEP]). For
+    context across page breaks, the first chunk of a page is prefixed with the last
+    overlap_tokens of the previous page (fewer if that page is short). In that case
+    span['overlap_prefix_chars'] gives the prefix length, and
+    chunk_text[overlap_prefix_chars:] == page_text[start_offset:end_offset].
+    The prefix's tokens are reported separately in span['overlap_prefix_tokens']
+    rather than in token_count, since they were already counted on their own
+    page; they do count against max_tokens.
+
+    Chunking restarts on every page, so an edit to one page leaves the chunks of
+    pages further on alone, but not those of the following page: its first chunk
+    carries the edited page's tail, and if that tail's token count changes, the
+    first chunk's end moves and the later cuts on that page move with it.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int):
+        if overlap_tokens >= max_tokens // 2:
+            raise ValueError("overlap_tokens must be less than half of max_tokens.")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _offsets(self, text: str) -> list:
+        # verbose=False: whole pages are longer than the model window, which is expected here
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return encoding['offset_mapping']
+
+    @staticmethod
+    def _boundaries(text: str, offsets: list) -> list:
+        """Returns the boundary quality of the gap before each token."""
+        quality = [_PARAGRAPH]
+        for index in range(1, len(offsets)):
+            previous_end, start = offsets[index - 1][1], offsets[index][0]
+            gap = text[previous_end:start]
+            if not gap:
+                quality.append(_HARD_CUT)
+            elif '\n\n' in gap or ('\n' in gap and text[previous_end - 1:previous_end] in _SENTENCE_END):
+                quality.append(_PARAGRAPH)
+            elif '\n' in gap or text[previous_end - 1:previous_end] in _SENTENCE_END:
+                quality.append(_SENTENCE)
+            else:
+                quality.append(_WORD)
+        return quality
+
+    def _cut(self, quality: list, start: int, limit: int) -> int:
+        """Picks the end of a chunk starting at token start, at most limit tokens long."""
+        hard_end = start + limit
+        if hard_end >= len(quality):
+            return len(quality)
+        # Only the back half of the window is searched, so chunks stay reasonably full
+        floor = start + max(limit // 2, 1)
+        best, best_quality = hard_end, quality[hard_end]
+        for index in range(hard_end, floor - 1, -1):
+            if quality[index] > best_quality:
+                best, best_quality = index, quality[index]
+                if best_quality == _PARAGRAPH:
+                    break
+        return best
+
+    @staticmethod
+    def _overlap_start(quality: list, end: int, overlap: int, floor: int) -> int:
+        """Returns the token overlap tokens back from end, moved forward to the start of a word."""
+        index = max(end - overlap, floor)
+        while index < end - 1 and quality[index] == _HARD_CUT:
+            index += 1
+        return index
+
+    def chunk_pages(self, pages):
+        prefix = ''
+        prefix_tokens = 0
+        for page_number, text in pages:
+            if not text or text.isspace():
+                continue
+            offsets = self._offsets(text)
+            if not offsets:
+                continue
+            quality = self._boundaries(text, offsets)
+
+            start = 0
+            while start < len(offsets):
+                # A prefix and its joining newline take their share of the first chunk's budget
+                limit = self.max_tokens - (prefix_tokens + 1 if prefix else 0)
+                end = self._cut(quality, start, limit)
+                start_char, end_char = offsets[start][0], offsets[end - 1][1]
+                span = {'start_offset': start_char, 'end_offset': end_char, 'token_count': end - start}
+                chunk = text[start_char:end_char]
+                if prefix:
+                    span['overlap_prefix_chars'] = len(prefix) + 1
+                    span['overlap_prefix_tokens'] = prefix_tokens
+                    chunk = f"{prefix}\n{chunk}"
+                    prefix, prefix_tokens = '', 0
+                yield page_number, chunk, span
+                if end >= len(offsets):
+                    break
+                start = max(self._overlap_start(quality, end, self.overlap_tokens, start + 1), start + 1)
+
+            # The tail of this page leads into the first chunk of the next one
+            tail_start = self._overlap_start(quality, len(offsets), self.overlap_tokens, 0)
+            prefix = text[offsets[tail_start][0]:offsets[-1][1]]
+            prefix_tokens = len(offsets) - tail_start
@@ -0,0 +1,118 @@
+"""
+Helpers for handling uploaded files without reading them into memory.
+
+Django already spools uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE to a
+temp file. The helpers here keep them there: services work with a "source",
+which is the path of a file on disk for large uploads and plain bytes for
+small ones. A source is streamed to storage from an open file, hashed in
+blocks and parsed through a memory map, so the file is never held in memory
+as a whole.
+"""
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from django.conf import settings
+
+COPY_BLOCK_SIZE = 1024 * 1024
+# Allowance for multipart boundaries and form fields when checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds its size limit; views answer with 413."""
+
+
+def _limit_error(max_bytes: int) -> UploadTooLarge:
+    return UploadTooLarge(f"File exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB.")
+
+
+def check_request_size(request, max_bytes: int):
+    """
+    Rejects a request whose declared Content-Length is over the limit.
+    Call this before touching request.FILES, so the body is never read.
+    """
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise _limit_error(max_bytes)
+
+
+def check_file_size(file_obj, max_bytes: int):
+    """Rejects a single uploaded file that is over the limit."""
+    if file_obj.size is not None and file_obj.size > max_bytes:
+        raise _limit_error(max_bytes)
+
+
+def is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+@contextmanager
+def spooled_file(file_obj, suffix: str = ''):
+    """
+    Yields the content of an uploaded (or opened) file as a source: its path
+    when it is already on disk, its bytes when it is small, and otherwise the
+    path of a temp file it is copied to block by block.
+    """
+    if hasattr(file_obj, 'temporary_file_path'):  # Django TemporaryUploadedFile
+        yield file_obj.temporary_file_path()
+        return
+    name = getattr(file_obj, 'name', None)
+    if isinstance(file_obj, io.BufferedReader) and isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
+    size = getattr(file_obj, 'size', None)
+    if size is not None and size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        yield file_obj.read()
+        return
+
+    temp_file = tempfile.NamedTemporaryFile(suffix=suffix, delete=False, dir=settings.FILE_UPLOAD_TEMP_DIR)
+    try:
+        with temp_file:
+            shutil.copyfileobj(file_obj, temp_file, COPY_BLOCK_SIZE)
+        yield temp_file.name
+    finally:
+        os.remove(temp_file.name)
+
+
+@contextmanager
+def open_source(source):
+    """Yields what to hand to a storage upload: the bytes, or an open file that is streamed."""
+    if is_path(source):
+        with open(source, 'rb') as file_handle:
+            yield file_handle
+    else:
+        yield source
+
+
+@contextmanager
+def mapped_source(source):
+    """Yields a seekable, read-only file object over a source: a memory map for files on disk."""
+    if is_path(source):
+        with open(source, 'rb') as file_handle, mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+    else:
+        yield io.BytesIO(source)
+
+
+def source_size(source) -> int:
+    """Returns the size of a source in bytes."""
+    return os.path.getsize(source) if is_path(source) else len(source)
+
+
+def hash_source(source) -> str:
+    """Returns the SHA-256 hex digest of a source, reading files in blocks."""
+    digest = hashlib.sha256()
+    if is_path(source):
+        with open(source, 'rb') as file_handle:
+            for block in iter(lambda: file_handle.read(COPY_BLOCK_SIZE), b''):
+                digest.update(block)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
@@ -0,0 +1,158 @@
+"""
+Streaming ZIP archives of storage objects.
+
+The archive is written entry by entry while it is sent: zipfile writes to a
+sink that is drained after every block, using data descriptors because the
+output cannot seek. Nothing is assembled on disk or in memory. A small pool
+of threads fetches the next few objects while the current one is written;
+each object reaches the writer through a bounded queue, so memory stays at
+about workers x PREFETCH_CHUNKS x STREAM_CHUNK_SIZE whatever the archive size.
+
+Objects that cannot be fetched are left out, and a final _errors.txt entry
+lists them, since the 200 status has already been sent by then.
+"""
+import io
+import logging
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from api.utils import storage
+
+PREFETCH_CHUNKS = 16  # Blocks buffered per object being fetched
+PUT_TIMEOUT_SECONDS = 1  # How often a blocked fetcher checks whether the download was abandoned
+# Already-compressed formats are stored as they are; deflating them again only costs CPU
+STORED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.gz', '.docx', '.xlsx', '.pptx', '.mp4', '.mp3'}
+ERRORS_ENTRY = '_errors.txt'
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class _Sink(io.RawIOBase):
+    """A write-only, unseekable file that collects what zipfile writes until drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def unique_name(name: str, used: set) -> str:
+    """Returns name, or 'stem (2).ext' and so on if an earlier entry already took it."""
+    candidate = name
+    stem, extension = os.path.splitext(name)
+    counter = 2
+    while candidate in used:
+        candidate = f"{stem} ({counter}){extension}"
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+
+def _fetch(bucket: str, storage_path: str, blocks: queue.Queue, cancelled: threading.Event):
+    """Copies an object into blocks, ending with _END or the exception that stopped it."""
+    def put(item) -> bool:
+        while not cancelled.is_set():
+            try:
+                blocks.put(item, timeout=PUT_TIMEOUT_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        stream = storage.get_storage().open_stream(bucket, storage_path, {'Accept-Encoding': 'identity'})
+        try:
+            if stream.status_code != 200:
+                raise ConnectionError(f"Storage returned HTTP {stream.status_code} for {storage_path}.")
+            chunks = stream.chunks
+            if chunks is None:  # Backends on local disk hand over the open file
+                chunks = iter(lambda: stream.file.read(storage.STREAM_CHUNK_SIZE), b'')
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        finally:
+            stream.close()
+        put(_END)
+    except Exception as e:
+        put(e)
+
+
+def stream_zip(entries, workers: int = 4):
+    """
+    Yields a ZIP archive of storage objects block by block.
+
+    Args:
+        entries: List of (bucket, storage_path, archive_name) tuples, in archive order
+        workers: Number of objects fetched concurrently
+    """
+    sink = _Sink()
+    cancelled = threading.Event()
+    workers = max(1, min(workers, len(entries) or 1))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip-export')
+    pending = deque()
+    next_index = 0
+    failures = []
+
+    def schedule():
+        nonlocal next_index
+        while len(pending) < workers and next_index < len(entries):
+            bucket, storage_path, _ = entries[next_index]
+            blocks = queue.Queue(maxsize=PREFETCH_CHUNKS)
+            executor.submit(_fetch, bucket, storage_path, blocks, cancelled)
+            pending.append(blocks)
+            next_index += 1
+
+    try:
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for bucket, storage_path, name in entries:
+                schedule()
+                blocks = pending.popleft()
+                item = blocks.get()
+                if isinstance(item, Exception):
+                    logger.error(f"Left {storage_path} out of ZIP export: {item}")
+                    failures.append(f"{name}: {item}")
+                    continue
+
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = (
+                    zipfile.ZIP_STORED if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                )
+                with archive.open(info, 'w', force_zip64=True) as entry:  # Sizes are unknown until the end
+                    while item is not _END:
+                        if isinstance(item, Exception):
+                            logger.error(f"ZIP export of {storage_path} stopped part way: {item}")
+                            failures.append(f"{name}: incomplete, {item}")
+                            break
+                        entry.write(item)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                        item = blocks.get()
+                data = sink.drain()  # The entry's data descriptor
+                if data:
+                    yield data
+
+            if failures:
+                archive.writestr(ERRORS_ENTRY, "Files that could not be included:\n" + "\n".join(failures) + "\n")
+        yield sink.drain()
+    finally:
+        # Also reached when the client disconnects: stop fetchers blocked on a full queue
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
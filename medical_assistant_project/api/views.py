@@ -26,13 +26,21 @@ from .serializers import (
     FeedbackAttachmentSerializer,
     AuditQuestionGenerationRequestSerializer,
     ComplaintSerializer,
+    IngestionJobSerializer,
+    UploadSessionSerializer,
 )
-from .services import document_processor, rag_retriever, llm_engine, validator, feedback_processor, complaint_service
+from .services import document_processor, rag_retriever, llm_engine, validator, feedback_processor, complaint_service, ingestion_jobs, upload_sessions, storage_gc, blob_store
 from .services.validator import VALIDATION_MODEL_NAME
+from .utils import uploads, supabase_client, downloads, signed_urls, download_cache, zip_export
+from .utils.storage import get_storage
 import logging
 import re
 import json
+from django.db import transaction
 from django.db.models import Q
+from django.conf import settings
+from django.urls import reverse
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
 logger = logging.getLogger(__name__)
@@ -43,15 +51,29 @@ class ServiceUnavailable(APIException):
     default_detail = 'Service temporarily unavailable, try again later.'
     default_code = 'service_unavailable'
 
+def _upload_too_large(error):
+    return Response({"error": str(error)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
 class DocumentUploadView(views.APIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, *args, **kwargs):
+        try:
+            # Checked before request.FILES is touched, so an oversized body is never read
+            uploads.check_request_size(request, settings.DOCUMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+
         file_obj = request.FILES.get('file')
         standard_type_id = request.data.get('standard_type_id')
 
         if not file_obj:
             return Response({"error": "File not provided."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # A chunked request has no Content-Length, so the file itself is checked too
+            uploads.check_file_size(file_obj, settings.DOCUMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
         if not standard_type_id:
             return Response({"error": "Standard type ID not provided."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -63,24 +85,30 @@ class DocumentUploadView(views.APIView):
              return Response({"error": f"Unsupported file type '{ext}'. Only PDF and DOCX allowed."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            doc_instance = document_processor.process_and_store_document(
+            # Store the original and queue parsing/embedding for the background workers
+            job, duplicate = ingestion_jobs.enqueue_document(
                 file_obj=file_obj,
                 original_filename=file_obj.name,
                 standard_type_id=standard_type_id
             )
-            serializer = DocumentSerializer(doc_instance)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            if duplicate is not None:
+                # Identical file already ingested; nothing was stored or queued
+                response_data = DocumentSerializer(duplicate).data
+                response_data['duplicate'] = True
+                return Response(response_data, status=status.HTTP_200_OK)
+            response_data = IngestionJobSerializer(job).data
+            response_data['status_url'] = request.build_absolute_uri(
+                reverse('ingestion-job-detail', kwargs={'job_id': job.id})
+            )
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
         except ValueError as ve:
             logger.warning(f"Document processing validation error: {ve}")
             return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
         except ConnectionError as ce:
              logger.error(f"Document processing connection error: {ce}")
              raise ServiceUnavailable(f"Storage connection error: {ce}")
-        except RuntimeError as re:
-             logger.error(f"Document processing runtime error: {re}")
-             raise ServiceUnavailable(f"Processing error: {re}")
         except Exception as e:
-            logger.exception("Unexpected error during document upload and processing.")
+            logger.exception("Unexpected error during document upload.")
             return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def get(self, request, document_id=None, *args, **kwargs):
@@ -94,6 +122,51 @@ class DocumentUploadView(views.APIView):
         else:
             return self.get_all_documents(request)
 
+    def put(self, request, document_id, *args, **kwargs):
+        """
+        Replace a document with a revised version of its file. The file is stored and the
+        replacement queued: 202 with the ingestion job, or 200 if the file is unchanged.
+        Unchanged chunks keep their embeddings; only new or changed chunks are embedded.
+        """
+        try:
+            uploads.check_request_size(request, settings.DOCUMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response({"error": "File not provided."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            uploads.check_file_size(file_obj, settings.DOCUMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+
+        try:
+            job, unchanged = ingestion_jobs.enqueue_replacement(
+                document_id=document_id,
+                file_obj=file_obj,
+                original_filename=file_obj.name
+            )
+            if unchanged is not None:
+                response_data = DocumentSerializer(unchanged).data
+                response_data['unchanged'] = True
+                return Response(response_data, status=status.HTTP_200_OK)
+            response_data = IngestionJobSerializer(job).data
+            response_data['status_url'] = request.build_absolute_uri(
+                reverse('ingestion-job-detail', kwargs={'job_id': job.id})
+            )
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
+        except ValueError as ve:
+            logger.warning(f"Document replacement validation error: {ve}")
+            status_code = status.HTTP_404_NOT_FOUND if "not found" in str(ve) else status.HTTP_400_BAD_REQUEST
+            return Response({"error": str(ve)}, status=status_code)
+        except ConnectionError as ce:
+            logger.error(f"Document replacement connection error: {ce}")
+            raise ServiceUnavailable(f"Storage connection error: {ce}")
+        except Exception as e:
+            logger.exception("Unexpected error during document replacement.")
+            return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     def delete(self, request, document_id, *args, **kwargs):
         """
         Delete a document by ID, including its file in storage and related chunks.
@@ -123,6 +196,150 @@ class DocumentUploadView(views.APIView):
             return Response({"error": error}, status=status_code)
         return Response(document_data, status=status.HTTP_200_OK)
 
+class DocumentIngestionStatsView(views.APIView):
+    """
+    API endpoint reporting p50/p95 ingestion time per pipeline stage over recent uploads.
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats, error = document_processor.get_ingestion_stats(limit=limit)
+        if error:
+            return Response({"error": error}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(stats, status=status.HTTP_200_OK)
+
+class IngestionJobView(views.APIView):
+    """
+    API endpoint for polling the status of a background document ingestion job.
+    """
+    def get(self, request, job_id, *args, **kwargs):
+        """
+        Returns the stage, progress percentage and any error of an ingestion job.
+        """
+        # Make sure queued jobs are picked up even if this process has not received an upload yet
+        ingestion_jobs.ensure_workers_started()
+
+        job, error = ingestion_jobs.get_job(job_id)
+        if error:
+            status_code = status.HTTP_404_NOT_FOUND if "not found" in error else status.HTTP_500_INTERNAL_SERVER_ERROR
+            return Response({"error": error}, status=status_code)
+        return Response(IngestionJobSerializer(job).data, status=status.HTTP_200_OK)
+
+def _upload_session_data(request, session):
+    """Serializes an upload session along with the parts the client still has to send."""
+    response_data = UploadSessionSerializer(session).data
+    received = upload_sessions.received_parts(session)
+    response_data['received_parts'] = received
+    response_data['missing_parts'] = sorted(set(range(1, session.total_parts + 1)) - set(received))
+    response_data['part_url_template'] = request.build_absolute_uri(
+        reverse('upload-session-part', kwargs={'session_id': session.id, 'part_number': 1})
+    ).replace('/parts/1/', '/parts/{part_number}/')
+    return response_data
+
+class UploadSessionView(views.APIView):
+    """
+    API endpoint for resumable uploads of large documents: start a session, PUT its
+    numbered parts (in any order, retrying any that fail), then complete it.
+    """
+    parser_classes = (JSONParser,)
+
+    def post(self, request, *args, **kwargs):
+        """
+        Starts an upload session for a file of the given size.
+        """
+        try:
+            session = upload_sessions.create_session(
+                file_name=request.data.get('file_name'),
+                standard_type_id=request.data.get('standard_type_id'),
+                total_size=request.data.get('total_size'),
+                part_size=request.data.get('part_size'),
+                content_hash=request.data.get('sha256')
+            )
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.exception("Unexpected error starting upload session.")
+            return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(_upload_session_data(request, session), status=status.HTTP_201_CREATED)
+
+    def get(self, request, session_id, *args, **kwargs):
+        """
+        Returns the session with the parts received so far, so an interrupted client can resume.
+        """
+        session, error = upload_sessions.get_session(session_id)
+        if error:
+            status_code = status.HTTP_404_NOT_FOUND if "not found" in error else status.HTTP_500_INTERNAL_SERVER_ERROR
+            return Response({"error": error}, status=status_code)
+        return Response(_upload_session_data(request, session), status=status.HTTP_200_OK)
+
+    def delete(self, request, session_id, *args, **kwargs):
+        """
+        Aborts the session and deletes the parts uploaded so far.
+        """
+        success, error = upload_sessions.abort_session(session_id)
+        if error:
+            status_code = status.HTTP_404_NOT_FOUND if "not found" in error else status.HTTP_409_CONFLICT
+            return Response({"error": error}, status=status_code)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadSessionPartView(views.APIView):
+    """
+    API endpoint for uploading one part of a resumable upload as the raw request body.
+    """
+    def put(self, request, session_id, part_number, *args, **kwargs):
+        """
+        Stores a part. Re-sending a part replaces it, so failed parts can simply be retried.
+        """
+        try:
+            # The body is streamed to disk; request.data is never parsed
+            part = upload_sessions.store_part(
+                session_id=session_id,
+                part_number=part_number,
+                stream=request.stream,
+                content_length=request.META.get('CONTENT_LENGTH')
+            )
+        except ValueError as ve:
+            status_code = status.HTTP_404_NOT_FOUND if "not found" in str(ve) else status.HTTP_400_BAD_REQUEST
+            return Response({"error": str(ve)}, status=status_code)
+        except ConnectionError as ce:
+            logger.error(f"Upload part connection error: {ce}")
+            raise ServiceUnavailable(f"Storage connection error: {ce}")
+        except Exception as e:
+            logger.exception(f"Unexpected error storing part {part_number} of upload session {session_id}.")
+            return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(part, status=status.HTTP_200_OK)
+
+class UploadSessionCompleteView(views.APIView):
+    """
+    API endpoint for completing a resumable upload and queueing it for ingestion.
+    """
+    def post(self, request, session_id, *args, **kwargs):
+        """
+        Queues an ingestion job for the upload and returns it with 202. The worker
+        assembles, checks and stores the file, so large uploads never tie up the request.
+        """
+        try:
+            job = upload_sessions.complete_session(session_id)
+        except ValueError as ve:
+            logger.warning(f"Upload session completion error: {ve}")
+            status_code = status.HTTP_404_NOT_FOUND if "not found" in str(ve) else status.HTTP_400_BAD_REQUEST
+            return Response({"error": str(ve)}, status=status_code)
+        except Exception as e:
+            logger.exception("Unexpected error completing upload session.")
+            return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        ingestion_jobs.ensure_workers_started()
+        response_data = IngestionJobSerializer(job).data
+        response_data['status_url'] = request.build_absolute_uri(
+            reverse('ingestion-job-detail', kwargs={'job_id': job.id})
+        )
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
 class ContentGenerationView(views.APIView):
     def post(self, request, *args, **kwargs):
         serializer = ContentGenerationRequestSerializer(data=request.data)
@@ -468,26 +685,63 @@ class MedicalStandardCompareView(views.APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+DOWNLOAD_MODES = ('proxy', 'redirect', 'url')
+
+def _serve_download(request, file_info):
+    """
+    Serves a stored file in the requested mode (?mode=, default DOWNLOAD_DEFAULT_MODE):
+    streamed through this worker, or as a cached signed storage URL (302 or JSON).
+    """
+    mode = request.query_params.get('mode') or settings.DOWNLOAD_DEFAULT_MODE
+    if mode not in DOWNLOAD_MODES:
+        return Response(
+            {"error": f"Invalid mode '{mode}'. Use one of: {', '.join(DOWNLOAD_MODES)}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if mode != 'proxy' and not get_storage().supports_signed_urls:
+        mode = 'proxy'  # Local storage has no URL of its own; its files are always served from here
+    try:
+        if mode != 'proxy':
+            url, expires_at = signed_urls.get_signed_url(
+                file_info['bucket'], file_info['storage_path'], file_info['file_name']
+            )
+            if mode == 'redirect':
+                response = HttpResponseRedirect(url)
+            else:
+                response = Response({'url': url, 'expires_at': expires_at}, status=status.HTTP_200_OK)
+            # Browsers may reuse the answer as long as the cache would hand out the same URL
+            response['Cache-Control'] = f"private, max-age={signed_urls.seconds_until_refresh(expires_at)}"
+            return response
+        return downloads.stream_storage_object(
+            request,
+            bucket=file_info['bucket'],
+            storage_path=file_info['storage_path'],
+            file_name=file_info['file_name'],
+            content_type=file_info['content_type'],
+            content_hash=file_info.get('content_hash')
+        )
+    except downloads.StorageObjectNotFound as e:
+        return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except ConnectionError as ce:
+        logger.error(f"Download connection error: {ce}")
+        raise ServiceUnavailable(f"Storage connection error: {ce}")
+
 class DocumentDownloadView(views.APIView):
     """
     API endpoint for downloading document files.
     """
     def get(self, request, document_id, *args, **kwargs):
         """
-        Downloads a document file from Supabase storage.
+        Streams a document file from Supabase storage, honouring Range and If-None-Match,
+        or points the client to a signed storage URL (?mode=redirect or ?mode=url).
         """
-        file_content, file_name, content_type, error = document_processor.download_document(document_id)
+        file_info, error = document_processor.get_document_file(document_id)
 
         if error:
             status_code = status.HTTP_404_NOT_FOUND if "not found" in error else status.HTTP_500_INTERNAL_SERVER_ERROR
             return Response({"error": error}, status=status_code)
 
-        # Create Django response with file content
-        from django.http import HttpResponse
-        response = HttpResponse(file_content, content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-
-        return response
+        return _serve_download(request, file_info)
 
 class AuditQuestionGeneratorView(views.APIView):
     """
@@ -711,6 +965,23 @@ class FeedbackMethodViewSet(viewsets.ModelViewSet):
     queryset = FeedbackMethod.objects.all()
     serializer_class = FeedbackMethodSerializer
 
+def _attachments_zip_response(feedback_queryset, archive_name: str, single_feedback: bool = False):
+    """
+    Streams the attachments of the given feedback entries as a ZIP archive.
+    """
+    entries, error = feedback_processor.get_attachment_export(feedback_queryset, single_feedback=single_feedback)
+    if error:
+        status_code = status.HTTP_400_BAD_REQUEST if "Too many" in error else status.HTTP_500_INTERNAL_SERVER_ERROR
+        return Response({"error": error}, status=status_code)
+    if not entries:
+        return Response({"error": "No attachments found."}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(
+        zip_export.stream_zip(entries, workers=settings.ATTACHMENT_EXPORT_WORKERS), content_type='application/zip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{archive_name}"'
+    return response
+
 class FeedbackViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing patient feedback.
@@ -739,12 +1010,33 @@ class FeedbackViewSet(viewsets.ModelViewSet):
             return FeedbackListSerializer
         return FeedbackSerializer
 
+    def perform_destroy(self, instance):
+        """
+        Deletes the feedback with its attachments (by cascade), releasing the attachment files for the storage sweeper.
+        """
+        with transaction.atomic():
+            for storage_path in instance.attachments.values_list('supabase_storage_path', flat=True):
+                blob_store.release_blob("feedback-attachments", storage_path)
+            instance.delete()
+
     def create(self, request, *args, **kwargs):
         """
         Create a new feedback entry with optional file attachments.
         """
+        try:
+            # Checked before request.FILES is touched, so an oversized body is never read
+            uploads.check_request_size(request, settings.FEEDBACK_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+
         # Extract files from request
         files = request.FILES.getlist('attachments')
+        try:
+            # A chunked request has no Content-Length, so each file is checked too
+            for file in files:
+                uploads.check_file_size(file, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
 
         # Create serializer with data
         serializer = self.get_serializer(data=request.data)
@@ -753,20 +1045,16 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         # Save feedback instance
         feedback = serializer.save()
 
-        # Process attachments if any
-        if files:
-            for file in files:
-                try:
-                    feedback_processor.process_and_store_attachment(file, feedback)
-                except Exception as e:
-                    logger.error(f"Error processing attachment: {e}")
-                    # Continue with other attachments even if one fails
+        # Store attachments concurrently; files that fail are reported without failing the feedback
+        _, attachment_errors = feedback_processor.store_attachments(files, feedback)
 
         # Return the created feedback with updated serializer that includes attachments
         serializer = self.get_serializer(feedback)
 
         # Enhanced response for chatbot integration
         response_data = serializer.data
+        if attachment_errors:
+            response_data['attachment_errors'] = attachment_errors
         response_data['chatbot_context'] = {
             'confirmation_message': f"Thank you for your feedback! Your submission has been recorded with reference number {feedback.reference_number}",
             'reference_number': feedback.reference_number,
@@ -793,10 +1081,18 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         Add an attachment to an existing feedback entry.
         """
         feedback = self.get_object()
+        try:
+            uploads.check_request_size(request, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
         file = request.FILES.get('file')
 
         if not file:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            uploads.check_file_size(file, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
 
         try:
             attachment = feedback_processor.process_and_store_attachment(file, feedback)
@@ -806,6 +1102,23 @@ class FeedbackViewSet(viewsets.ModelViewSet):
             logger.error(f"Error adding attachment: {e}")
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['get'], url_path='export-attachments')
+    def export_attachments(self, request, pk=None):
+        """
+        Download all attachments of a feedback entry as one ZIP archive, streamed as it is built.
+        """
+        feedback = self.get_object()
+        return _attachments_zip_response(Feedback.objects.filter(id=feedback.id), f"{feedback.reference_number}-attachments.zip", single_feedback=True)
+
+    @action(detail=False, methods=['get'], url_path='export-attachments')
+    def export_filtered_attachments(self, request):
+        """
+        Download the attachments of every feedback entry matching the list filters as one ZIP archive,
+        with a folder per reference number.
+        """
+        feedback_queryset = self.filter_queryset(self.get_queryset())
+        return _attachments_zip_response(feedback_queryset, f"feedback-attachments-{timezone.now():%Y%m%d-%H%M%S}.zip")
+
     @action(detail=True, methods=['delete'])
     def remove_attachment(self, request, pk=None):
         """
@@ -828,20 +1141,16 @@ class FeedbackAttachmentDownloadView(views.APIView):
     """
     def get(self, request, attachment_id, *args, **kwargs):
         """
-        Downloads a feedback attachment file from Supabase storage.
+        Streams a feedback attachment file from Supabase storage, honouring Range and If-None-Match,
+        or points the client to a signed storage URL (?mode=redirect or ?mode=url).
         """
-        file_content, file_name, content_type, error = feedback_processor.get_feedback_attachment(attachment_id)
+        file_info, error = feedback_processor.get_feedback_attachment(attachment_id)
 
         if error:
             status_code = status.HTTP_404_NOT_FOUND if "not found" in error else status.HTTP_500_INTERNAL_SERVER_ERROR
             return Response({"error": error}, status=status_code)
 
-        # Create Django response with file content
-        from django.http import HttpResponse
-        response = HttpResponse(file_content, content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-
-        return response
+        return _serve_download(request, file_info)
 
 
 class ComplaintView(views.APIView):
@@ -874,8 +1183,18 @@ class ComplaintView(views.APIView):
         """
         Create a new complaint.
         """
+        try:
+            uploads.check_request_size(request, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+
         # Handle file upload if present
         file_obj = request.FILES.get('file_upload')
+        if file_obj:
+            try:
+                uploads.check_file_size(file_obj, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+            except uploads.UploadTooLarge as e:
+                return _upload_too_large(e)
         file_upload_path = None
 
         if file_obj:
@@ -910,6 +1229,8 @@ class ComplaintView(views.APIView):
             }
 
             return Response(response_data, status=status.HTTP_201_CREATED)
+        if file_upload_path:
+            complaint_service.release_complaint_file(file_upload_path)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def patch(self, request, complaint_id, *args, **kwargs):
@@ -921,8 +1242,20 @@ class ComplaintView(views.APIView):
         except Complaint.DoesNotExist:
             return Response({"error": "Complaint not found"}, status=status.HTTP_404_NOT_FOUND)
 
+        try:
+            uploads.check_request_size(request, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+        except uploads.UploadTooLarge as e:
+            return _upload_too_large(e)
+
         # Handle file upload if present
         file_obj = request.FILES.get('file_upload')
+        if file_obj:
+            try:
+                uploads.check_file_size(file_obj, settings.ATTACHMENT_UPLOAD_MAX_BYTES)
+            except uploads.UploadTooLarge as e:
+                return _upload_too_large(e)
+        file_upload_path = None
+        previous_path = complaint.file_upload_path
         if file_obj:
             # Upload new file to Supabase storage
             file_upload_path, error = complaint_service.upload_complaint_file(file_obj, file_obj.name)
@@ -936,7 +1269,12 @@ class ComplaintView(views.APIView):
         serializer = ComplaintSerializer(complaint, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            if file_upload_path and previous_path:
+                # The replaced file is no longer used by this complaint
+                complaint_service.release_complaint_file(previous_path)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        if file_upload_path:
+            complaint_service.release_complaint_file(file_upload_path)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, complaint_id, *args, **kwargs):
@@ -1127,4 +1465,24 @@ class SimpleChatbotHealthView(views.APIView):
             return Response({
                 'status': 'unhealthy',
                 'error': str(e)
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
\ No newline at end of file
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+class SystemStatsView(views.APIView):
+    """
+    API endpoint reporting connection pool usage of this worker process and the storage deletion outbox.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the Supabase storage connection reuse, signed URL cache, download cache and LLM client reuse counters. Counters are per process,
+        so with several gunicorn workers each response describes the worker that served it. The storage deletion
+        outbox and blob counts are shared by all processes.
+        """
+        return Response({
+            'supabase': supabase_client.get_pool_stats(),
+            'signed_urls': signed_urls.get_cache_stats(),
+            'download_cache': download_cache.get_cache_stats(),
+            'storage_deletions': storage_gc.get_outbox_stats(),
+            'blobs': blob_store.get_blob_stats(),
+            'llm': llm_engine.get_llm_stats()
+        }, status=status.HTTP_200_OK)
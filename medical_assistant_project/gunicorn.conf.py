@@ -0,0 +1,17 @@
+"""
+Gunicorn settings, loaded automatically when gunicorn is started from this
+directory (as the Dockerfile does).
+
+Background threads (ingestion workers, storage sweeper) are started here, in
+each worker process once it has loaded the app, rather than from
+AppConfig.ready(): ready() also runs for migrate, shell, tests and scripts,
+and in a --preload master before it forks.
+"""
+
+
+def post_worker_init(worker):
+    from api.services import ingestion_jobs, storage_gc
+    # Queued jobs and jobs left behind by a restart are picked up without waiting for the next upload
+    ingestion_jobs.ensure_workers_started()
+    # Likewise for deletions already due in the outbox
+    storage_gc.ensure_sweeper_started()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/stable/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 # Note: `load_dotenv` is imported conditionally later
 import dj_database_url
@@ -126,6 +127,8 @@ else: # Stricter for production
 
 
 CORS_ALLOW_CREDENTIALS = True
+# Let browser clients (e.g. PDF viewers) read the headers of streamed, range-capable downloads
+CORS_EXPOSE_HEADERS = ['Content-Disposition', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag']
 
 ROOT_URLCONF = 'medical_assistant_project.urls'
 
@@ -219,6 +222,40 @@ if APP_ENV == 'production' and not all([SUPABASE_URL, SUPABASE_ANON_KEY, SUPABAS
     # raise ValueError("Supabase URL/Keys missing in production environment.") # Uncomment if strictly required
 elif APP_ENV == 'development' and not all([SUPABASE_URL, SUPABASE_ANON_KEY, SUPABASE_SERVICE_KEY]):
     print("INFO: Supabase environment variables (URL, ANON_KEY, SERVICE_KEY) are not fully set for development (from .env or OS env).")
+# Object storage backend: 'supabase' (default) or 'local' (files under LOCAL_STORAGE_ROOT, e.g. on-prem or offline benchmarks)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')
+LOCAL_STORAGE_ROOT = os.getenv('LOCAL_STORAGE_ROOT') or os.path.join(BASE_DIR, 'storage')
+# Storage HTTP connection pool, shared by all threads of a process (see api/utils/supabase_client.py)
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '20'))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '10'))
+# Idle connections are kept open this long; httpx's default of 5 s drops them between most requests
+SUPABASE_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY_SECONDS', '60'))
+SUPABASE_HTTP2 = os.getenv('SUPABASE_HTTP2', 'True').lower() in ('true', '1', 't')
+# LLM API connection pool, shared by all OpenAI clients of a process (see api/services/openrouter_client.py).
+# Generations are spaced further apart than storage calls, so idle connections are kept longer.
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '20'))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '10'))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', '120'))
+LLM_HTTP2 = os.getenv('LLM_HTTP2', 'True').lower() in ('true', '1', 't')
+# Download endpoints either stream files through Django ('proxy') or send clients to a signed
+# storage URL ('redirect' answers 302, 'url' answers JSON). Clients can pick per request with ?mode=.
+DOWNLOAD_DEFAULT_MODE = os.getenv('DOWNLOAD_DEFAULT_MODE', 'proxy')
+SIGNED_URL_TTL_SECONDS = int(os.getenv('SIGNED_URL_TTL_SECONDS', '300'))
+# Cached signed URLs are reused until this long before they expire
+SIGNED_URL_REFRESH_MARGIN_SECONDS = int(os.getenv('SIGNED_URL_REFRESH_MARGIN_SECONDS', '60'))
+SIGNED_URL_CACHE_SIZE = int(os.getenv('SIGNED_URL_CACHE_SIZE', '1024'))
+# Proxied downloads are cached on local disk (LRU, per-process index). DOWNLOAD_CACHE_MAX_MB=0 disables the cache.
+DOWNLOAD_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'download-cache')
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_MB', '512')) * 1024 * 1024
+DOWNLOAD_CACHE_MAX_OBJECT_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_OBJECT_MB', '100')) * 1024 * 1024
+# Deleted rows queue their files in the StorageDeletion outbox; a sweeper thread deletes them in batches.
+# Set STORAGE_GC_AUTOSTART=False when running `manage.py run_storage_sweeper` as a separate process.
+STORAGE_GC_AUTOSTART = os.getenv('STORAGE_GC_AUTOSTART', 'True').lower() in ('true', '1', 't')
+STORAGE_GC_INTERVAL_SECONDS = float(os.getenv('STORAGE_GC_INTERVAL_SECONDS', '30'))
+STORAGE_GC_BATCH_SIZE = int(os.getenv('STORAGE_GC_BATCH_SIZE', '100'))
+# Failed deletes are retried after BASE * 2^(attempts - 1) seconds, capped at MAX
+STORAGE_GC_BASE_BACKOFF_SECONDS = int(os.getenv('STORAGE_GC_BASE_BACKOFF_SECONDS', '30'))
+STORAGE_GC_MAX_BACKOFF_SECONDS = int(os.getenv('STORAGE_GC_MAX_BACKOFF_SECONDS', '3600'))
 
 # Hugging Face Configuration
 HUGGINGFACEHUB_API_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
@@ -229,6 +266,44 @@ if not HUGGINGFACEHUB_API_TOKEN:
         print("INFO: HUGGINGFACEHUB_API_TOKEN not set in .env/environment for development.")
 
 
+# --- Document Ingestion Settings ---
+# Uploads are stored and queued as IngestionJob rows; worker threads claim and process them.
+# Set INGESTION_WORKER_AUTOSTART=False when running `manage.py run_ingestion_worker` as a separate process.
+INGESTION_WORKER_THREADS = int(os.getenv('INGESTION_WORKER_THREADS', '1'))
+INGESTION_WORKER_AUTOSTART = os.getenv('INGESTION_WORKER_AUTOSTART', 'True').lower() in ('true', '1', 't')
+INGESTION_POLL_INTERVAL_SECONDS = float(os.getenv('INGESTION_POLL_INTERVAL_SECONDS', '2'))
+INGESTION_HEARTBEAT_SECONDS = float(os.getenv('INGESTION_HEARTBEAT_SECONDS', '10'))
+# A running job whose heartbeat is older than this is assumed orphaned (e.g. worker restart) and re-claimed.
+INGESTION_JOB_LEASE_SECONDS = int(os.getenv('INGESTION_JOB_LEASE_SECONDS', '300'))
+INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', '3'))
+# Queued uploads also keep their spooled file here, so a worker on the same host (or sharing the
+# directory) parses it without downloading the original back from storage. Copies older than
+# INGESTION_SPOOL_MAX_AGE_HOURS are removed; a job whose copy is gone downloads it instead.
+INGESTION_SPOOL_DIR = os.getenv('INGESTION_SPOOL_DIR') or os.path.join(os.getenv('FILE_UPLOAD_TEMP_DIR') or tempfile.gettempdir(), 'ingestion-spool')
+INGESTION_SPOOL_MAX_AGE_HOURS = float(os.getenv('INGESTION_SPOOL_MAX_AGE_HOURS', '24'))
+
+# --- File Upload Settings ---
+# Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temp file and streamed/parsed from disk.
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', str(2_621_440)))  # 2.5 MB (Django default)
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR') or None  # None uses the system temp dir
+# Requests over these limits are rejected with 413 before their body is read.
+DOCUMENT_UPLOAD_MAX_BYTES = int(os.getenv('DOCUMENT_UPLOAD_MAX_MB', '50')) * 1024 * 1024
+ATTACHMENT_UPLOAD_MAX_BYTES = int(os.getenv('ATTACHMENT_UPLOAD_MAX_MB', '20')) * 1024 * 1024
+# A feedback submission can carry several attachments; this caps the request as a whole.
+FEEDBACK_UPLOAD_MAX_BYTES = int(os.getenv('FEEDBACK_UPLOAD_MAX_MB', '100')) * 1024 * 1024
+# Feedback attachments submitted together are uploaded on up to this many threads per request.
+ATTACHMENT_UPLOAD_WORKERS = int(os.getenv('ATTACHMENT_UPLOAD_WORKERS', '4'))
+# ZIP exports of feedback attachments fetch this many files ahead and refuse more than ATTACHMENT_EXPORT_MAX_FILES files.
+ATTACHMENT_EXPORT_WORKERS = int(os.getenv('ATTACHMENT_EXPORT_WORKERS', '4'))
+ATTACHMENT_EXPORT_MAX_FILES = int(os.getenv('ATTACHMENT_EXPORT_MAX_FILES', '1000'))
+# Resumable uploads (/api/uploads/): parts are kept in the documents bucket (upload-sessions/) until the
+# session completes, so every app server and ingestion worker can reach them.
+RESUMABLE_UPLOAD_MAX_BYTES = int(os.getenv('RESUMABLE_UPLOAD_MAX_MB', '500')) * 1024 * 1024
+UPLOAD_PART_SIZE_BYTES = int(os.getenv('UPLOAD_PART_SIZE_MB', '8')) * 1024 * 1024  # Default when the client does not pick one
+UPLOAD_PART_MAX_BYTES = int(os.getenv('UPLOAD_PART_MAX_MB', '32')) * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', '24'))  # Extended whenever a part arrives
+
+
 # --- Django REST Framework Settings ---
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny',],